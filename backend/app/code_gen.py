@@ -1,42 +1,74 @@
-"""Utility functions for generating unique identifiers used across the app."""
+"""Random identifiers for the documents the app creates.
 
+IDs are not checked for availability before use. A document is inserted under
+a fresh random ID and, in the rare case that the ID is taken, the unique
+``_id`` index rejects it and another one is tried. Creating a document thus
+costs a single write, and ``id_stats`` reports how often IDs collide.
+"""
+
+from collections import Counter
 from random import choice
 from string import ascii_lowercase, ascii_uppercase, digits
+from typing import Any
+
+from pymongo.errors import DuplicateKeyError
 
-from backend.app.db import db
-from backend.app.services.game_service import decks, games
+# Alphabet and length of the IDs of each kind of document
+ID_FORMATS = {
+    "game": (ascii_uppercase + digits, 6),
+    "aigame": (digits, 6),
+    "deck": (digits, 10),
+    "user": (ascii_lowercase + digits, 8),
+}
+# Taken IDs tried in a row before giving up on inserting a document
+ID_MAX_ATTEMPTS = 20
 
-users = db.users
-aigames = db.aigames
+allocated: Counter[str] = Counter()
+collisions: Counter[str] = Counter()
 
 
-async def generate_game_code():
-    """Generate a unique six character alphanumeric game code."""
-    while True:
-        code = "".join(choice(ascii_uppercase + digits) for _ in range(6))
-        if not await games.find_one({"_id": code}):
-            return code
+def new_id(kind: str) -> str:
+    """Generate a random ID of the given kind, which may already be taken."""
+    alphabet, length = ID_FORMATS[kind]
+    return "".join(choice(alphabet) for _ in range(length))
 
 
-async def generate_aigame_code():
-    """Generate a unique six digit code for an AI game."""
-    while True:
-        code = "".join(choice(digits) for _ in range(6))
-        if not await aigames.find_one({"_id": code}):
-            return code
+def _is_id_collision(error: DuplicateKeyError) -> bool:
+    details = error.details or {}
+    if "keyPattern" in details:
+        return "_id" in details["keyPattern"]
+    # Servers that do not name the key mention the index in the message.
+    message = details.get("errmsg", "")
+    return not message or "_id_" in message
 
 
-async def generate_deck_id():
-    """Generate a unique ten digit deck identifier."""
-    while True:
-        deck_id = "".join(choice(digits) for _ in range(10))
-        if not await decks.find_one({"_id": deck_id}):
-            return deck_id
+async def insert_with_new_id(collection: Any, document: dict[str, Any], kind: str):
+    """
+    Insert a document under a new random ID of the given kind and return
+    the ID. Duplicates of other unique keys are raised as usual.
+    """
+    for _ in range(ID_MAX_ATTEMPTS):
+        document["_id"] = new_id(kind)
+        try:
+            await collection.insert_one(document)
+        except DuplicateKeyError as err:
+            if not _is_id_collision(err):
+                raise
+            collisions[kind] += 1
+            continue
+        allocated[kind] += 1
+        return document["_id"]
+    raise RuntimeError(f"No free {kind} ID found in {ID_MAX_ATTEMPTS} attempts")
 
 
-async def generate_user_id():
-    """Generate a unique eight character alphanumeric user identifier."""
-    while True:
-        user_id = "".join(choice(ascii_lowercase + digits) for _ in range(8))
-        if not await users.find_one({"_id": user_id}):
-            return user_id
+def id_stats() -> dict[str, dict[str, Any]]:
+    """Report, for each kind of ID, how many were handed out and collided."""
+    return {
+        kind: {
+            "allocated": allocated[kind],
+            "collisions": collisions[kind],
+            "collision_rate": collisions[kind]
+            / max(allocated[kind] + collisions[kind], 1),
+        }
+        for kind in ID_FORMATS
+    }
@@ -6,10 +6,60 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(config("ACCESS_TOKEN_EXPIRE_MINUTES"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(config("REFRESH_TOKEN_EXPIRE_DAYS"))
 GEMINI_API_KEY = config("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = config("GEMINI_MODEL_NAME")
+# "memory" for a single backend worker, "mongo" to share games between workers
+GAME_BUS = config("GAME_BUS", default="memory")
+# Threads that hash and check passwords; more logins than this at once queue up
+PASSWORD_HASH_WORKERS = int(config("PASSWORD_HASH_WORKERS", default=2))
+# bcrypt cost factor; hashes made with another one are redone on the next login
+BCRYPT_ROUNDS = int(config("BCRYPT_ROUNDS", default=12))
 
 GALLERY_PAGE_SIZE = 50
+# Gallery searches whose number of matching decks is kept per worker, and
+# seconds before each number is counted again
+GALLERY_COUNT_CACHE_SIZE = 256
+GALLERY_COUNT_TTL = 60
+# Gallery responses kept per worker, and seconds each is served before it is
+# read again; deck changes made by the same worker drop them right away
+GALLERY_CACHE_SIZE = 256
+GALLERY_CACHE_TTL = 30
+# Whether gallery search also matches the words of decks, not only their
+# names and tags, and seconds between rebuilds of each worker's search index
+GALLERY_SEARCH_INDEX_WORDS = config(
+    "GALLERY_SEARCH_INDEX_WORDS", default=False, cast=bool
+)
+GALLERY_SEARCH_REBUILD_SECONDS = 300
 DEFAULT_REASON_MESSAGE = "No reason provided"
 
+# Seconds between write-behind flushes of live game state to the database
+GAME_FLUSH_INTERVAL = 0.5
+# Messages buffered per game WebSocket before a slow client is resynced
+WS_SEND_QUEUE_SIZE = 32
+# Resyncs in a row after which a client that keeps falling behind is dropped
+WS_MAX_RESYNCS = 3
+# Seconds a worker keeps owning a game after it stopped renewing the lease
+GAME_LEASE_SECONDS = 10
+# Users resolved from access tokens kept per worker, and seconds each is trusted
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 30
+# Profile deck listings kept per worker, and seconds each is served
+PROFILE_CACHE_SIZE = 1024
+PROFILE_CACHE_TTL = 30
+# Stored word lists kept per worker; they never change, so they never expire
+WORD_LIST_CACHE_SIZE = 256
+# Seconds before a worker notices access tokens revoked on another worker
+TOKEN_REVOCATION_POLL_SECONDS = 5
+# Seconds finished games stay in the live collections; their results are
+# archived to the game history, which is what is read afterwards
+FINISHED_GAME_TTL = 60 * 60
+# Seconds after its last change that an unfinished game is deleted as abandoned
+ABANDONED_GAME_TTL = 24 * 60 * 60
+# Seconds the events of a game are kept for consumers that read them late
+GAME_EVENTS_TTL = 7 * 24 * 60 * 60
+# Game events read from the database at once, and seconds a consumer that has
+# caught up waits before looking for events written by other workers
+GAME_EVENTS_PAGE_SIZE = 100
+GAME_EVENTS_POLL_SECONDS = 1
+
 system_instructions = """
 You are the **Alias Oracle**, a specialized AI language model. Your sole and absolute
 purpose is to generate one single, brilliant, descriptive sentence to explain a given
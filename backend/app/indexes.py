@@ -0,0 +1,126 @@
+"""Indexes the application's queries rely on, created at startup.
+
+Every collection the services filter or sort on other than by ``_id`` has its
+indexes declared in ``INDEXES``. ``ensure_indexes`` creates the ones that are
+missing when a worker starts, and ``index_report`` compares what the database
+has against the declarations and how often each index was used.
+"""
+
+from typing import Any
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from backend.app.config import (
+    ABANDONED_GAME_TTL,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    FINISHED_GAME_TTL,
+    GAME_EVENTS_TTL,
+)
+
+# Finished games are archived to the game history and then deleted, and so
+# are games abandoned before they finished. Deleting them frees their codes.
+GAME_EXPIRY = [
+    IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=FINISHED_GAME_TTL),
+    IndexModel(
+        [("last_activity_at", ASCENDING)], expireAfterSeconds=ABANDONED_GAME_TTL
+    ),
+]
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "users": [
+        # Logins, registrations and admin actions look users up by email.
+        IndexModel([("email", ASCENDING)], unique=True),
+        # Deleting a deck pulls it from the profiles that saved it.
+        IndexModel([("deck_ids", ASCENDING)]),
+    ],
+    "decks": [
+        # Full-text search of profiles; the gallery has its own search index.
+        IndexModel([("name", TEXT), ("tags", TEXT)]),
+        # The gallery lists public decks ordered by name, and continues each
+        # page from the name and ID of the last deck of the previous one.
+        IndexModel([("private", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)]),
+        # Deleting a user removes them from the owners of their decks.
+        IndexModel([("owner_ids", ASCENDING)]),
+        # Deleting a tag pulls it from the decks that have it.
+        IndexModel([("tags", ASCENDING)]),
+    ],
+    "games": GAME_EXPIRY,
+    "aigames": GAME_EXPIRY,
+    "game_history": [
+        # Results of expired games are looked up by code, latest first.
+        IndexModel([("code", ASCENDING), ("finished_at", DESCENDING)]),
+    ],
+    "game_log": [
+        # Consumers read the events of a game in order from an offset, and
+        # each offset of a game is only written once.
+        IndexModel([("game_id", ASCENDING), ("offset", ASCENDING)], unique=True),
+        # Events outlive their game for consumers that catch up later.
+        IndexModel([("at", ASCENDING)], expireAfterSeconds=GAME_EVENTS_TTL),
+    ],
+    "token_revocations": [
+        # Revocations only matter until the access tokens they reject expire.
+        IndexModel(
+            [("revoked_at", ASCENDING)],
+            expireAfterSeconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        ),
+    ],
+}
+
+
+def _name(index: IndexModel) -> str:
+    return index.document["name"]
+
+
+async def ensure_indexes(database: Any) -> dict[str, list[str]]:
+    """
+    Creates every declared index that does not exist yet.
+    An index that cannot be built, for example a unique one over duplicate
+    values, is reported and skipped so that the others are still created.
+    Returns the names of the indexes that failed, by collection.
+    """
+    failed: dict[str, list[str]] = {}
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await database[collection].create_indexes([index])
+            except OperationFailure as e:
+                print(f"Failed to create index {_name(index)} on {collection}: {e}")
+                failed.setdefault(collection, []).append(_name(index))
+    return failed
+
+
+async def _usage(collection: Any) -> dict[str, int] | None:
+    """
+    Returns how many operations used each index of a collection since the
+    server started, or None if the server does not report it.
+    """
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+    except (OperationFailure, NotImplementedError):
+        return None
+    return {entry["name"]: entry["accesses"]["ops"] for entry in stats}
+
+
+async def index_report(database: Any) -> dict[str, dict[str, Any]]:
+    """
+    Lists, for each collection with declared indexes, the declared indexes
+    that are missing, the indexes that exist without being declared, and the
+    indexes no operation has used since the server started.
+    """
+    report: dict[str, dict[str, Any]] = {}
+    for collection, indexes in INDEXES.items():
+        existing = set(await database[collection].index_information())
+        declared = {_name(index) for index in indexes}
+        usage = await _usage(database[collection])
+        unused = (
+            None
+            if usage is None
+            else sorted(name for name, ops in usage.items() if not ops)
+        )
+        report[collection] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared - {"_id_"}),
+            "unused": unused,
+        }
+    return report
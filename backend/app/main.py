@@ -2,28 +2,44 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import TEXT
 
 from backend.app.db import db
+from backend.app.indexes import ensure_indexes
 from backend.app.routers.admin_panel import router as admin_router
 from backend.app.routers.aigame import router as aigame_router
 from backend.app.routers.auth import router as auth_router
 from backend.app.routers.gallery import router as gallery_router
 from backend.app.routers.game import router as game_router
 from backend.app.routers.profile import router as profile_router
+from backend.app.services.aigame_service import backfill_aigame_decks
+from backend.app.services.game_bus import bus
+from backend.app.services.game_engine import engine
+from backend.app.services.game_events import event_log
+from backend.app.services.game_service import backfill_game_decks
+from backend.app.services.profile_service import backfill_deck_summaries
+from backend.app.services.timers import timers
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Context manager for application startup and shutdown events.
-    During startup, it creates a text index on the 'decks' collection
-    for efficient searching.
+    During startup, it creates the indexes declared in `backend.app.indexes`
+    that are missing, including the text index used for deck search, adds
+    summary fields to decks saved before they had them, and moves the decks
+    of games that still embed them into the word list store. On
+    shutdown, pending word timers are dropped and live game state and game
+    events are flushed before this worker gives up its games.
     """
-    # Create a text index on the 'name' and 'tags' fields of the 'decks' collection
-    # Enables full-text search.
-    await db.decks.create_index([("name", TEXT), ("tags", TEXT)])
+    await ensure_indexes(db)
+    await backfill_deck_summaries()
+    await backfill_game_decks()
+    await backfill_aigame_decks()
     yield
+    timers.stop()
+    await engine.stop()
+    await event_log.stop()
+    await bus.stop()
 
 
 # Initialize the FastAPI application with the defined lifespan context
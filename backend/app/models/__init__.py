@@ -15,7 +15,7 @@ class AIGame(BaseModel):
     deck: list[str]
     game_state: str = "pending"
     settings: AIGameSettings
-    remaining_words: list[str] = []
+    word_index: int = 0
     current_word: str | None = None
     clues: list[str] = []
     score: int = 0
@@ -26,7 +26,9 @@ class Team(BaseModel):
     id: str
     name: str
     players: list[str] = Field(default_factory=list)
-    remaining_words: list[str] = Field(default_factory=list)
+    seed: int = 0
+    words_amount: int = 0
+    word_index: int = 0
     current_word: str | None = None
     expires_at: datetime | None = None
     current_master: str | None = None
@@ -71,13 +73,12 @@ class GameState(BaseModel):
     winning_team: str | None = None
 
 
-class PlayerGameState(BaseModel):
+class TeamStateForPlayers(BaseModel):
     game_state: Literal["pending", "in_progress", "finished"]
     team_id: str
     team_name: str
     expires_at: datetime | None
     remaining_words_count: int
-    tries_left: int | None = None
     current_word: str | None = None
     current_master: str | None = None
     team_scores: dict[str, int] = Field(default_factory=dict)
@@ -86,6 +87,10 @@ class PlayerGameState(BaseModel):
     winning_team: str | None = None
 
 
+class PlayerGameState(TeamStateForPlayers):
+    tries_left: int | None = None
+
+
 class Deck(BaseModel):
     id: str | None = Field(None, alias="_id")
     name: str = Field(max_length=20)
@@ -143,14 +148,20 @@ class User(BaseModel):
         return v
 
 
-class UserInDB(BaseModel):
+class CurrentUser(BaseModel):
+    """The caller of a request, as far as authorizing it needs to know."""
+
     id: str
+    email: str
+    isAdmin: bool | None = Field(default=False)  # noqa: N815
+    token_version: int = 0
+
+
+class UserInDB(CurrentUser):
     name: str
     surname: str
-    email: str
     hashed_password: str
     deck_ids: list[str] = Field(default_factory=list)
-    isAdmin: bool | None = Field(default=False)  # noqa: N815
 
 
 class ProfileResponse(BaseModel):
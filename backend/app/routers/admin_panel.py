@@ -8,6 +8,11 @@ from backend.app.services.admin_service import (
     delete_deck_service,
     delete_tag_service,
     delete_user_service,
+    get_auth_stats_service,
+    get_gallery_stats_service,
+    get_game_stats_service,
+    get_id_stats_service,
+    get_index_stats_service,
     get_logs_service,
     remove_admin_service,
 )
@@ -102,3 +107,48 @@ async def clear_logs(current_user=Depends(admin_required)):
     Clears all admin logs. Requires administrator privileges.
     """
     return await clear_logs_service(current_user.email)
+
+
+@router.get("/stats/games")
+async def get_game_stats(current_user=Depends(admin_required)):
+    """
+    Reports live game ownership metrics of one backend worker.
+    Requires administrator privileges.
+    """
+    return await get_game_stats_service()
+
+
+@router.get("/stats/auth")
+async def get_auth_stats(current_user=Depends(admin_required)):
+    """
+    Reports password hashing load and queueing of one backend worker.
+    Requires administrator privileges.
+    """
+    return await get_auth_stats_service()
+
+
+@router.get("/stats/indexes")
+async def get_index_stats(current_user=Depends(admin_required)):
+    """
+    Reports missing, undeclared and unused database indexes.
+    Requires administrator privileges.
+    """
+    return await get_index_stats_service()
+
+
+@router.get("/stats/ids")
+async def get_id_stats(current_user=Depends(admin_required)):
+    """
+    Reports ID allocations and collisions of one backend worker.
+    Requires administrator privileges.
+    """
+    return await get_id_stats_service()
+
+
+@router.get("/stats/gallery")
+async def get_gallery_stats(current_user=Depends(admin_required)):
+    """
+    Reports the gallery cache hit ratio of one backend worker.
+    Requires administrator privileges.
+    """
+    return await get_gallery_stats_service()
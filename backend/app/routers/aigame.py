@@ -1,14 +1,13 @@
-import asyncio
-
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from backend.app.models import AIGame
 from backend.app.services.aigame_service import (
     aigames,
-    check_timer,
+    cancel_timer,
     create_aigame,
     handle_guess,
     manager,
+    schedule_timer,
     skip_word,
     start_aigame_service,
 )
@@ -32,14 +31,13 @@ async def aigame_websocket(websocket: WebSocket, game_id: str):
     Manages game state updates, guesses, skips, and timer.
     """
     await manager.connect(websocket, game_id)
-    timer_task = None
 
     try:
         game = await aigames.find_one({"_id": game_id})
         if game:
+            if game.get("game_state") == "in_progress" and game.get("expires_at"):
+                schedule_timer(game_id, game["expires_at"])
             await manager.send_state(game_id, game)
-            if game.get("game_state") == "in_progress":
-                timer_task = asyncio.create_task(check_timer(game_id))
 
         while True:
             data = await websocket.receive_json()
@@ -47,8 +45,6 @@ async def aigame_websocket(websocket: WebSocket, game_id: str):
 
             if action == "start_game":
                 await start_aigame_service(game_id)
-                if not timer_task or timer_task.done():
-                    timer_task = asyncio.create_task(check_timer(game_id))
 
             elif action == "guess":
                 guess = data.get("guess")
@@ -59,5 +55,4 @@ async def aigame_websocket(websocket: WebSocket, game_id: str):
 
     except WebSocketDisconnect:
         manager.disconnect(game_id)
-        if timer_task:
-            timer_task.cancel()
+        cancel_timer(game_id)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Body, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
+from pymongo.errors import DuplicateKeyError
 
-from backend.app.models import Token, User
+from backend.app.models import CurrentUser, Token, User
 from backend.app.services.auth_service import (
+    access_token_claims,
     authenticate_user,
     create_access_token,
     create_refresh_token,
@@ -34,11 +36,16 @@ async def register(user: User):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Create the new user in the database.
-    await create_user(user)
+    # Create the new user in the database. The unique index on emails catches
+    # a concurrent registration with the same email.
+    try:
+        credentials = await create_user(user)
+    except DuplicateKeyError as err:
+        raise HTTPException(status_code=400, detail="Email already registered") from err
 
     # Generate access and refresh tokens for the newly registered user.
-    access_token = create_access_token(data={"sub": user.email})
+    new_user = CurrentUser(id=credentials["_id"], email=credentials["email"])
+    access_token = create_access_token(data=access_token_claims(new_user))
     refresh_token = create_refresh_token(data={"sub": user.email})
 
     return {
@@ -69,7 +76,7 @@ async def login(data: OAuth2PasswordRequestForm = Depends()):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
 
     # Generate access and refresh tokens for the authenticated user.
-    token = create_access_token(data={"sub": user.email})
+    token = create_access_token(data=access_token_claims(user))
     refresh_token = create_refresh_token(data={"sub": user.email})
 
     return {
@@ -95,7 +102,7 @@ async def refresh(refresh_token: str = Body(..., embed=True)):
     user = await verify_refresh_token(refresh_token)
 
     # Generate new access and refresh tokens.
-    new_access = create_access_token(data={"sub": user.email})
+    new_access = create_access_token(data=access_token_claims(user))
     new_refresh = create_refresh_token(data={"sub": user.email})
 
     return {
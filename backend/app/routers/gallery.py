@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 
-from backend.app.models import UserInDB
+from backend.app.models import CurrentUser
 from backend.app.services.auth_service import get_current_user
 from backend.app.services.gallery_service import (
-    get_gallery_service,
+    get_gallery_page_service,
     save_deck_from_gallery_service,
 )
 
@@ -11,17 +11,26 @@ router = APIRouter(prefix="", tags=["gallery"])
 
 
 @router.get("/decks")
-async def get_gallery(page: int, search: str = Query(None, min_length=1)):
+async def get_gallery(
+    request: Request,
+    page: int = 1,
+    search: str = Query(None, min_length=1),
+    cursor: str | None = None,
+):
     """
     Retrieves a paginated list of public decks from the gallery.
+    Answers 304 Not Modified if the client already has the page.
     """
-    return await get_gallery_service(page, search)
+    body, etag = await get_gallery_page_service(page, search, cursor)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 @router.put("/decks/{deck_id}")
 async def save_deck_from_gallery(
     deck_id: str,
-    current_user: UserInDB = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """
     Saves a deck from the gallery to the current user's profile.
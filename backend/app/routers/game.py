@@ -1,49 +1,52 @@
 import asyncio
 from datetime import UTC, datetime
-from random import shuffle
+from functools import partial
 from typing import Any
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import Response
-from pymongo import ReturnDocument
 
-from backend.app.code_gen import generate_game_code
+from backend.app.code_gen import insert_with_new_id
+from backend.app.config import GAME_EVENTS_PAGE_SIZE
 from backend.app.models import Game
-from backend.app.services.game_service import (
-    determine_winning_team,
-    games,
-    manager,
-    process_new_word,
-    reassign_master,
-    required_to_advance,
-)
+from backend.app.services.game_bus import bus
+from backend.app.services.game_engine import engine
+from backend.app.services.game_events import event_log
+from backend.app.services.game_history import archive_game, find_game_results
+from backend.app.services.game_service import game_words, games, manager
+from backend.app.services.timers import as_utc, timers
+from backend.app.services.word_lists import store_words
+from backend.app.shuffles import new_seed
 
 router = APIRouter(prefix="", tags=["game"])
 
 
 @router.post("/create")
 async def create_game(game: Game):
-    words = list(game.deck)
-    shuffle(words)
-
-    if game.words_amount is not None and 1 < game.words_amount < len(words):
-        words = words[: game.words_amount]
-
-    code = await generate_game_code()
-
+    """
+    Creates a team game. The deck goes to the word list store, and the game
+    keeps seeds instead of shuffled copies: the game's seed picks the words
+    in play and their order, and each team's seed orders the team's draws.
+    """
+    deck_ref = await store_words(list(game.deck))
+    words_amount = len(game.deck)
+    if game.words_amount is not None and 1 < game.words_amount < words_amount:
+        words_amount = game.words_amount
+
+    now = datetime.now(UTC)
     teams_data: dict[str, dict[str, Any]] = {}
     for i in range(game.number_of_teams):
         team_id = f"team_{i + 1}"
         team_name = f"Team {i + 1}"
 
-        team_words = list(words)
-        shuffle(team_words)
-
         teams_data[team_id] = {
             "id": team_id,
             "name": team_name,
             "players": [],
-            "remaining_words": team_words,
+            "seed": new_seed(),
+            "words_amount": words_amount,
+            "word_index": 0,
             "current_word": None,
             "expires_at": None,
             "current_master": None,
@@ -56,31 +59,40 @@ async def create_game(game: Game):
         }
 
     new_game = {
-        "_id": code,
         "number_of_teams": game.number_of_teams,
         "teams": teams_data,
-        "deck": words,
-        "words_amount": len(words),
+        "deck_ref": deck_ref,
+        "seed": new_seed(),
+        "words_amount": words_amount,
         "time_for_guessing": game.time_for_guessing,
         "tries_per_player": game.tries_per_player,
         "right_answers_to_advance": game.right_answers_to_advance,
         "rotate_masters": game.rotate_masters,
         "game_state": "pending",
         "winning_team": None,
+        "created_at": now,
+        "last_activity_at": now,
     }
 
-    result = await games.insert_one(new_game)
-    return {"id": str(result.inserted_id)}
+    code = await insert_with_new_id(games, new_game, "game")
+    return {"id": code}
+
+
+async def find_game_or_results(game_id: str) -> dict[str, Any] | None:
+    """
+    Returns a game that is still stored, or else the archived results of the
+    last game that had its code.
+    """
+    return await games.find_one({"_id": game_id}) or await find_game_results(game_id)
 
 
 @router.get("/leaderboard/{game_id}/export")
 async def export_deck_txt(game_id: str):
-    game = await games.find_one({"_id": game_id})
+    game = await find_game_or_results(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    words = game.get("deck", [])
-    content = "\n".join(words)
+    content = "\n".join(await game_words(game))
     timestamp = datetime.now().astimezone().strftime("%Y%m%d_%H%M%S")
     return Response(
         content=content,
@@ -93,10 +105,169 @@ async def export_deck_txt(game_id: str):
 
 @router.get("/deck/{game_id}")
 async def get_game_deck(game_id: str):
-    game = await games.find_one({"_id": game_id})
+    game = await find_game_or_results(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
-    return {"words": game.get("deck", [])}
+    return {"words": await game_words(game)}
+
+
+async def expire_word(game_id: str, team_id: str) -> None:
+    game = engine.games.get(game_id)
+    if game is None or game.get("game_state") != "in_progress":
+        return
+    # The team may have moved on to a new word since the timer fired.
+    expires_at = game["teams"][team_id].get("expires_at")
+    if expires_at is None or as_utc(expires_at) > datetime.now(UTC):
+        return
+    engine.advance_word(game_id, team_id)
+    await publish_state(game_id)
+
+
+def sync_timers(game_id: str, game: dict[str, Any]) -> None:
+    """
+    Arms the word timer of every team that is guessing and disarms the rest.
+    """
+    in_progress = game.get("game_state") == "in_progress"
+    for team_id, team in game.get("teams", {}).items():
+        key = ("game", game_id, team_id)
+        if in_progress and team.get("expires_at"):
+            timers.schedule(
+                key, team["expires_at"], partial(expire_word, game_id, team_id)
+            )
+        else:
+            timers.cancel(key)
+
+
+def cancel_timers(game_id: str, game: dict[str, Any]) -> None:
+    for team_id in game.get("teams", {}):
+        timers.cancel(("game", game_id, team_id))
+
+
+async def publish_state(game_id: str) -> None:
+    """
+    Sends the owned game's state to the sockets of every worker.
+    """
+    game = engine.games.get(game_id)
+    if game is None:
+        return
+    sync_timers(game_id, game)
+    if game.get("game_state") == "finished":
+        # Results are read straight from the database once the game is over,
+        # and from the game history once the game has expired.
+        await engine.flush(game_id)
+        await archive_game(game_id, game)
+        await event_log.flush()
+    # The deck is not part of any view, so it is not sent to other workers.
+    state = {key: value for key, value in game.items() if key != "deck"}
+    await bus.publish(game_id, {"kind": "state", "game": state})
+
+
+async def apply_action(game_id: str, action: dict[str, Any]) -> None:
+    """
+    Applies a host or player action to a game owned by this worker.
+    """
+    if game_id not in engine.games:
+        return
+    kind = action.get("action")
+    player, team_id = action.get("player", ""), action.get("team_id", "")
+    changed = True
+    if kind == "sync":
+        # A new socket asks for the current state; nothing changes.
+        pass
+    elif kind == "join":
+        engine.join(game_id, player, team_id)
+    elif kind == "leave":
+        engine.leave(game_id, player, team_id)
+    elif kind == "start_game":
+        changed = engine.start_game(game_id)
+    elif kind == "stop_game":
+        engine.stop_game(game_id)
+    elif kind == "switch_team":
+        changed = engine.switch_team(game_id, player, team_id, action["new_team_id"])
+    elif kind == "skip":
+        changed = engine.skip(game_id, player, team_id)
+    elif kind == "guess":
+        changed = engine.guess(game_id, player, team_id, action["guess"])
+    else:
+        changed = False
+    if changed:
+        await publish_state(game_id)
+
+
+async def dispatch(game_id: str, action: dict[str, Any]) -> None:
+    """
+    Applies an action here if this worker owns the game, and otherwise
+    forwards it to the owner.
+    """
+    if bus.owns(game_id):
+        await apply_action(game_id, action)
+    else:
+        await bus.publish(game_id, {"kind": "action", "action": action})
+
+
+async def on_bus_message(game_id: str, message: dict[str, Any]) -> None:
+    kind = message.get("kind")
+    if kind == "state":
+        if manager.has_connections(game_id):
+            await manager.broadcast_state(game_id, message["game"])
+    elif kind == "action":
+        if bus.owns(game_id):
+            await apply_action(game_id, message["action"])
+    elif kind == "claimed":
+        # The previous owner is gone; carry on from what it persisted.
+        await engine.load(game_id, bus.fence(game_id))
+        await publish_state(game_id)
+    elif kind == "lost":
+        # Another worker owns the game now and carries on from the database.
+        if game := engine.games.get(game_id):
+            cancel_timers(game_id, game)
+        engine.discard(game_id)
+    elif kind == "kick":
+        await manager.disconnect_all_players(game_id)
+
+
+bus.handler = on_bus_message
+
+
+def current_game(game_id: str) -> dict[str, Any] | None:
+    """
+    Returns the owned game, or the latest state received from its owner.
+    """
+    return engine.games.get(game_id) or manager.latest.get(game_id)
+
+
+async def open_game(game_id: str) -> dict[str, Any] | None:
+    """
+    Follows a game on the bus and loads it here if no other worker owns it.
+    """
+    bus.subscribe(game_id)
+    if await bus.claim(game_id) and (
+        game := await engine.load(game_id, bus.fence(game_id))
+    ):
+        return game
+    return current_game(game_id) or await games.find_one({"_id": game_id})
+
+
+async def release_game(game_id: str) -> None:
+    if manager.has_connections(game_id):
+        return
+    bus.unsubscribe(game_id)
+    if not bus.owns(game_id):
+        return
+    await engine.flush(game_id)
+    # Somebody may have connected while the flush was in flight.
+    if manager.has_connections(game_id):
+        return
+    try:
+        if game := engine.games.get(game_id):
+            cancel_timers(game_id, game)
+            if not engine.evict(game_id):
+                # Kept here, the game would hold its lease with nobody
+                # playing it; the next owner carries on from the database.
+                print(f"Failed to save game {game_id}, dropping unsaved changes")
+                engine.discard(game_id)
+    finally:
+        await bus.release(game_id)
 
 
 @router.websocket("/{game_id}")
@@ -104,129 +275,43 @@ async def handle_game(websocket: WebSocket, game_id: str):
     if not await manager.connect_host(websocket, game_id):
         return
 
-    timer_task = asyncio.create_task(check_timers(game_id))
-
     try:
-        game_data = await games.find_one({"_id": game_id})
-        if not isinstance(game_data, dict):
+        if await open_game(game_id) is None:
             return
-        game: dict[str, Any] | None = game_data
-        await manager.broadcast_state(game_id, game_data)
+        await dispatch(game_id, {"action": "sync"})
 
         while True:
             data = await websocket.receive_json()
             action = data.get("action")
 
-            game_lookup = await games.find_one({"_id": game_id})
-            if (
-                not isinstance(game_lookup, dict)
-                or game_lookup.get("game_state") == "finished"
-            ):
+            game = current_game(game_id)
+            if game is None or game.get("game_state") == "finished":
                 break
-            game = game_lookup
 
-            if action == "start_game" and game["game_state"] == "pending":
-                await games.update_one(
-                    {"_id": game_id}, {"$set": {"game_state": "in_progress"}}
-                )
-                game["game_state"] = "in_progress"
-                for tid in game["teams"]:
-                    if game["teams"][tid].get("state") == "pending" and game["teams"][
-                        tid
-                    ].get("remaining_words"):
-                        await process_new_word(game_id, tid, game["time_for_guessing"])
-                refreshed = await games.find_one({"_id": game_id})
-                if isinstance(refreshed, dict):
-                    await manager.broadcast_state(game_id, refreshed)
+            if action == "resync":
+                await manager.resync(game_id, websocket, game)
+
+            elif action == "start_game":
+                await dispatch(game_id, {"action": "start_game"})
 
             elif action == "stop_game":
-                winning_team = determine_winning_team(game)
-                await games.update_one(
-                    {"_id": game_id},
-                    {
-                        "$set": {
-                            "game_state": "finished",
-                            "winning_team": winning_team,
-                        }
-                    },
-                )
-                game["game_state"] = "finished"
-                game["winning_team"] = winning_team
-                await manager.broadcast_state(game_id, game)
-                break
+                # The socket stays open until the host leaves: closing it here
+                # would drop the finished state still queued for the host.
+                await dispatch(game_id, {"action": "stop_game"})
 
     except (WebSocketDisconnect, Exception) as e:
         print(f"Host disconnected or error in handle_game for {game_id}: {e}")
     finally:
-        timer_task.cancel()
-        game = await games.find_one({"_id": game_id})
+        game = current_game(game_id)
         if game and game.get("game_state") == "pending":
-            await manager.disconnect_all_players(game_id)
+            await bus.publish(game_id, {"kind": "kick"})
         manager.disconnect(game_id, websocket)
-
-
-async def check_timers(game_id: str):
-    while True:
-        try:
-            game_data = await games.find_one({"_id": game_id})
-            if (
-                not isinstance(game_data, dict)
-                or game_data.get("game_state") != "in_progress"
-            ):
-                await asyncio.sleep(1)
-                continue
-
-            now = datetime.now(UTC)
-
-            expirations = [
-                team.get("expires_at")
-                for team in game_data.get("teams", {}).values()
-                if team.get("expires_at")
-            ]
-
-            expired_teams = [
-                team_id
-                for team_id, team_data in game_data.get("teams", {}).items()
-                if team_data.get("expires_at")
-                and now >= team_data["expires_at"].replace(tzinfo=UTC)
-            ]
-
-            if expired_teams:
-                async with manager.locks.get(game_id, asyncio.Lock()):
-                    for team_id in expired_teams:
-                        current_game = await games.find_one({"_id": game_id})
-                        if not isinstance(current_game, dict):
-                            continue
-                        current_expires_at = current_game["teams"][team_id].get(
-                            "expires_at"
-                        )
-                        if current_expires_at and now >= current_expires_at.replace(
-                            tzinfo=UTC
-                        ):
-                            new_state = await process_new_word(
-                                game_id, team_id, game_data["time_for_guessing"]
-                            )
-                            await manager.broadcast_state(game_id, new_state)
-                continue
-
-            if expirations:
-                next_expiry = min(expirations)
-                sleep_duration = (next_expiry.replace(tzinfo=UTC) - now).total_seconds()
-                if sleep_duration > 0:
-                    await asyncio.sleep(sleep_duration)
-            else:
-                await asyncio.sleep(1)
-
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            print(e)
-            await asyncio.sleep(5)
+        await release_game(game_id)
 
 
 @router.get("/leaderboard/{game_id}")
 async def get_leaderboard(game_id: str):
-    game = await games.find_one({"_id": game_id})
+    game = engine.games.get(game_id) or await find_game_or_results(game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
@@ -259,8 +344,59 @@ async def get_leaderboard(game_id: str):
     return detailed_leaderboard
 
 
+@router.get("/events/{game_id}")
+async def get_game_events(
+    game_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(GAME_EVENTS_PAGE_SIZE, ge=1, le=GAME_EVENTS_PAGE_SIZE),
+):
+    """
+    Returns a page of a game's events from `offset` on, and the offset to
+    ask for next.
+    """
+    page = await event_log.read(game_id, offset, limit)
+    next_offset = page[-1]["offset"] + 1 if page else offset
+    return {"events": page, "next_offset": next_offset}
+
+
+async def send_events(websocket: WebSocket, game_id: str, offset: int) -> None:
+    async for event in event_log.follow(game_id, offset):
+        await websocket.send_json(jsonable_encoder(event))
+
+
+@router.websocket("/events/{game_id}")
+async def stream_game_events(websocket: WebSocket, game_id: str):
+    """
+    Sends a game's events from the `offset` query parameter on as they
+    happen, and closes once the game has finished.
+    """
+    try:
+        offset = max(int(websocket.query_params.get("offset", 0)), 0)
+    except ValueError:
+        await websocket.close(code=1008, reason="Invalid offset")
+        return
+    await websocket.accept()
+    sender = asyncio.create_task(send_events(websocket, game_id, offset))
+    # Consumers send nothing, so receiving only returns once they disconnect.
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if sender.done() and sender.exception() is None:
+            await websocket.close()
+    except Exception as e:
+        print(f"Event stream of game {game_id} failed: {e}")
+    finally:
+        sender.cancel()
+        receiver.cancel()
+
+
 @router.delete("/delete/{game_id}")
 async def delete_game(game_id: str):
+    if game := engine.games.get(game_id):
+        cancel_timers(game_id, game)
+    # Unsaved changes must not bring the game back on the next flush.
+    engine.discard(game_id)
+    await bus.release(game_id)
     if not await games.find_one_and_delete({"_id": game_id}):
         raise HTTPException(status_code=404, detail="Game not found")
     return {"status": "OK"}
@@ -274,190 +410,66 @@ async def handle_player(websocket: WebSocket, game_id: str):
         await websocket.close(code=1008, reason="Missing player's name or team ID")
         return
 
-    game_data = await games.find_one({"_id": game_id})
-    if not isinstance(game_data, dict) or team_id not in game_data["teams"]:
+    game_data = await open_game(game_id)
+    if game_data is None or team_id not in game_data["teams"]:
         await websocket.close(code=1011, reason="Game or team not found")
+        await release_game(game_id)
         return
 
     await manager.connect_player(websocket, game_id, player_name, team_id)
-    await games.update_one(
-        {"_id": game_id, f"teams.{team_id}.players": {"$ne": player_name}},
-        {"$addToSet": {f"teams.{team_id}.players": player_name}},
-    )
-    await games.update_one(
-        {"_id": game_id, f"teams.{team_id}.scores.{player_name}": {"$exists": False}},
-        {"$set": {f"teams.{team_id}.scores.{player_name}": 0}},
-    )
-
-    game = await games.find_one({"_id": game_id})
-    if (
-        isinstance(game, dict)
-        and not game.get("rotate_masters")
-        and not game["teams"][team_id].get("current_master")
-    ):
-        await games.update_one(
-            {"_id": game_id, f"teams.{team_id}.current_master": None},
-            {"$set": {f"teams.{team_id}.current_master": player_name}},
-        )
 
     try:
-        current_state = await games.find_one({"_id": game_id})
-        if isinstance(current_state, dict):
-            await manager.broadcast_state(game_id, current_state)
+        await dispatch(
+            game_id, {"action": "join", "player": player_name, "team_id": team_id}
+        )
 
         while True:
             data = await websocket.receive_json()
             action = data.get("action")
-            game_lookup = await games.find_one({"_id": game_id})
-            if (
-                not isinstance(game_lookup, dict)
-                or game_lookup.get("game_state") == "finished"
-            ):
+            game = current_game(game_id)
+            if game is None or game.get("game_state") == "finished":
                 break
-            game = game_lookup
 
-            if action == "switch_team" and game["game_state"] == "pending":
+            if action == "resync":
+                await manager.resync(game_id, websocket, game)
+
+            elif action == "switch_team":
                 new_team_id = data.get("new_team_id")
                 if (
-                    new_team_id
-                    and new_team_id != team_id
-                    and new_team_id in game["teams"]
+                    game.get("game_state") != "pending"
+                    or not new_team_id
+                    or new_team_id == team_id
+                    or new_team_id not in game["teams"]
                 ):
-                    await games.update_one(
-                        {"_id": game_id},
-                        {
-                            "$pull": {f"teams.{team_id}.players": player_name},
-                            "$unset": {
-                                f"teams.{team_id}.scores.{player_name}": "",
-                                f"teams.{team_id}.player_attempts.{player_name}": "",
-                            },
-                        },
-                    )
-                    if game["teams"][team_id].get("current_master") == player_name:
-                        await reassign_master(game_id, team_id)
-
-                    await games.update_one(
-                        {"_id": game_id},
-                        {
-                            "$addToSet": {f"teams.{new_team_id}.players": player_name},
-                            "$set": {f"teams.{new_team_id}.scores.{player_name}": 0},
-                        },
-                    )
-                    manager.switch_player_team(
-                        game_id, player_name, new_team_id, websocket
-                    )
-                    team_id = new_team_id
-
-                    new_game_state = await games.find_one({"_id": game_id})
-                    if (
-                        isinstance(new_game_state, dict)
-                        and not new_game_state.get("rotate_masters")
-                        and not new_game_state["teams"][new_team_id].get(
-                            "current_master"
-                        )
-                    ):
-                        await games.update_one(
-                            {
-                                "_id": game_id,
-                                f"teams.{new_team_id}.current_master": None,
-                            },
-                            {
-                                "$set": {
-                                    f"teams.{new_team_id}.current_master": player_name
-                                }
-                            },
-                        )
-                    refreshed_state = await games.find_one({"_id": game_id})
-                    if isinstance(refreshed_state, dict):
-                        await manager.broadcast_state(game_id, refreshed_state)
-
-            elif (
-                action == "skip"
-                and game["teams"][team_id].get("current_master") == player_name
-            ):
-                async with manager.locks[game_id]:
-                    new_state = await process_new_word(
-                        game_id, team_id, game["time_for_guessing"]
-                    )
-                await manager.broadcast_state(game_id, new_state)
-
-            elif action == "guess":
-                guess = data.get("guess", "").strip().lower()
-                team_state = game["teams"][team_id]
-
-                can_guess = (
-                    team_state.get("state") == "in_progress"
-                    and team_state.get("current_master") != player_name
-                    and player_name not in team_state.get("correct_players", [])
-                )
-
-                if not can_guess:
-                    continue
-
-                tries_per_player = game.get("tries_per_player", 0)
-                if tries_per_player > 0:
-                    attempts = team_state.get("player_attempts", {}).get(player_name, 0)
-                    if attempts >= tries_per_player:
-                        continue
-
-                expires_at = team_state.get("expires_at")
-                if expires_at and datetime.now(UTC) > expires_at.replace(tzinfo=UTC):
                     continue
+                manager.switch_player_team(game_id, player_name, new_team_id, websocket)
+                await dispatch(
+                    game_id,
+                    {
+                        "action": "switch_team",
+                        "player": player_name,
+                        "team_id": team_id,
+                        "new_team_id": new_team_id,
+                    },
+                )
+                team_id = new_team_id
 
-                async with manager.locks[game_id]:
-                    await games.update_one(
-                        {"_id": game_id},
-                        {"$inc": {f"teams.{team_id}.player_attempts.{player_name}": 1}},
-                    )
-
-                    if guess == team_state.get("current_word", "").lower():
-                        updated_game = await games.find_one_and_update(
-                            {"_id": game_id},
-                            {
-                                "$inc": {
-                                    f"teams.{team_id}.scores.{player_name}": 1,
-                                    f"teams.{team_id}.current_correct": 1,
-                                },
-                                "$addToSet": {
-                                    f"teams.{team_id}.correct_players": player_name
-                                },
-                            },
-                            return_document=ReturnDocument.AFTER,
-                        )
-                        if isinstance(updated_game, dict) and updated_game["teams"][
-                            team_id
-                        ]["current_correct"] >= required_to_advance(
-                            updated_game["teams"][team_id]
-                        ):
-                            updated_game = await process_new_word(
-                                game_id, team_id, game["time_for_guessing"]
-                            )
-                        if isinstance(updated_game, dict):
-                            await manager.broadcast_state(game_id, updated_game)
-                    else:
-                        refreshed = await games.find_one({"_id": game_id})
-                        if isinstance(refreshed, dict):
-                            await manager.broadcast_state(game_id, refreshed)
+            elif action in ("skip", "guess"):
+                await dispatch(
+                    game_id,
+                    {
+                        "action": action,
+                        "player": player_name,
+                        "team_id": team_id,
+                        "guess": data.get("guess", "").strip().lower(),
+                    },
+                )
 
     except (WebSocketDisconnect, Exception) as e:
         print(f"Player {player_name} disconnected or error: {e}")
     finally:
         manager.disconnect(game_id, websocket)
-        game = await games.find_one({"_id": game_id})
-        if isinstance(game, dict):
-            is_master = game["teams"][team_id].get("current_master") == player_name
-
-            await games.update_one(
-                {"_id": game_id},
-                {
-                    "$pull": {f"teams.{team_id}.players": player_name},
-                    "$unset": {f"teams.{team_id}.scores.{player_name}": ""},
-                },
-            )
-
-            if game.get("game_state") != "finished" and is_master:
-                await reassign_master(game_id, team_id)
-
-            refreshed = await games.find_one({"_id": game_id})
-            if isinstance(refreshed, dict):
-                await manager.broadcast_state(game_id, refreshed)
+        await dispatch(
+            game_id, {"action": "leave", "player": player_name, "team_id": team_id}
+        )
+        await release_game(game_id)
@@ -1,6 +1,12 @@
 from fastapi import APIRouter, Depends, Query
 
-from backend.app.models import DeckDetail, DeckIn, DeckUpdate, ProfileResponse, UserInDB
+from backend.app.models import (
+    CurrentUser,
+    DeckDetail,
+    DeckIn,
+    DeckUpdate,
+    ProfileResponse,
+)
 from backend.app.services.auth_service import get_current_user
 from backend.app.services.profile_service import (
     delete_deck_service,
@@ -16,7 +22,7 @@ router = APIRouter(prefix="", tags=["profile"])
 @router.get("/me", response_model=ProfileResponse)
 async def get_my_profile(
     search: str = Query(None),
-    current_user: UserInDB = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """
     Retrieves the profile of the current authenticated user.
@@ -28,7 +34,7 @@ async def get_my_profile(
 @router.post("/deck/save")
 async def save_deck_into_profile(
     deck: DeckIn,
-    current_user: UserInDB = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """
     Saves a new deck to the current user's profile.
@@ -40,7 +46,7 @@ async def save_deck_into_profile(
 async def edit_deck(
     deck_id: str,
     deck: DeckUpdate,
-    current_user: UserInDB = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     """
     Edits an existing deck in the current user's profile.
@@ -50,7 +56,7 @@ async def edit_deck(
 
 @router.get("/deck/{deck_id}", response_model=DeckDetail)
 async def get_additional_deck_info(
-    deck_id: str, current_user: UserInDB = Depends(get_current_user)
+    deck_id: str, current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Retrieves detailed information for a specific deck.
@@ -59,7 +65,9 @@ async def get_additional_deck_info(
 
 
 @router.delete("/deck/{deck_id}/delete")
-async def delete_deck(deck_id: str, current_user: UserInDB = Depends(get_current_user)):
+async def delete_deck(
+    deck_id: str, current_user: CurrentUser = Depends(get_current_user)
+):
     """
     Deletes a deck from the current user's profile.
     """
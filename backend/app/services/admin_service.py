@@ -1,11 +1,19 @@
 from datetime import UTC, datetime
 
 from fastapi import HTTPException
+from pymongo import ReturnDocument
 
+from backend.app.code_gen import id_stats
 from backend.app.config import DEFAULT_REASON_MESSAGE
 from backend.app.db import db
-from backend.app.services.auth_service import users
+from backend.app.indexes import index_report
+from backend.app.services.auth_service import revoke_tokens, user_cache, users
+from backend.app.services.gallery_service import decks_changed, gallery_cache
+from backend.app.services.game_bus import bus
+from backend.app.services.game_engine import engine
 from backend.app.services.game_service import decks
+from backend.app.services.hashing import hashing_pool
+from backend.app.services.profile_cache import profile_cache
 
 logs = db.logs
 
@@ -33,9 +41,13 @@ async def delete_user_service(email: str, reason: str, admin_email: str):
         raise HTTPException(status_code=404, detail="User not found")
 
     await users.delete_one({"email": email})
+    user_cache.invalidate(email)
+    profile_cache.invalidate(user["_id"])
+    await revoke_tokens(user["_id"], user.get("token_version", 0) + 1)
     await decks.update_many(
         {"owner_ids": user["_id"]}, {"$pull": {"owner_ids": user["_id"]}}
     )
+    gallery_cache.clear()
 
     await _log_admin_action(
         action="DELETE_USER",
@@ -75,6 +87,10 @@ async def delete_deck_service(deck_id: str, reason: str, admin_email: str):
         raise HTTPException(status_code=404, detail="Deck not found")
     await decks.delete_one({"_id": deck_id})
     await users.update_many({"deck_ids": deck_id}, {"$pull": {"deck_ids": deck_id}})
+    # Any number of owners changed, so no cached user can be trusted.
+    user_cache.clear()
+    profile_cache.clear()
+    await decks_changed(deck_id)
 
     await _log_admin_action(
         action="DELETE_DECK",
@@ -85,6 +101,22 @@ async def delete_deck_service(deck_id: str, reason: str, admin_email: str):
     return {"message": f"{deck_id} deleted. Reason: {reason or DEFAULT_REASON_MESSAGE}"}
 
 
+async def _set_admin(email: str, is_admin: bool) -> None:
+    """
+    Changes a user's admin flag and revokes their access tokens, which still
+    carry the old one.
+    """
+    user = await users.find_one_and_update(
+        {"email": email},
+        {"$set": {"isAdmin": is_admin}, "$inc": {"token_version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    user_cache.invalidate(email)
+    if user:
+        profile_cache.invalidate(user["_id"])
+        await revoke_tokens(user["_id"], user["token_version"])
+
+
 async def add_admin_service(email: str, admin_email: str):
     """
     Grants administrator privileges to a user.
@@ -95,7 +127,7 @@ async def add_admin_service(email: str, admin_email: str):
         raise HTTPException(status_code=404, detail="User not found")
     if user.get("isAdmin"):
         raise HTTPException(status_code=400, detail="User is already an admin")
-    await users.update_one({"email": email}, {"$set": {"isAdmin": True}})
+    await _set_admin(email, True)
 
     await _log_admin_action(
         action="ADD_ADMIN",
@@ -120,7 +152,7 @@ async def remove_admin_service(email: str, admin_email: str):
         raise HTTPException(status_code=404, detail="User not found")
     if not user.get("isAdmin"):
         raise HTTPException(status_code=400, detail="User is not an admin")
-    await users.update_one({"email": email}, {"$set": {"isAdmin": False}})
+    await _set_admin(email, False)
 
     await _log_admin_action(
         action="REMOVE_ADMIN",
@@ -140,7 +172,10 @@ async def delete_tag_service(tag: str, reason: str, admin_email: str):
         raise HTTPException(
             status_code=404, detail=f"Tag '{tag}' not found in any deck"
         )
+    tagged = await decks.distinct("_id", {"tags": tag})
     await decks.update_many({"tags": tag}, {"$pull": {"tags": tag}})
+    profile_cache.clear()
+    await decks_changed(*tagged)
 
     await _log_admin_action(
         action="DELETE_TAG",
@@ -162,3 +197,48 @@ async def clear_logs_service(admin_email: str):
     )
     await db.drop_collection("logs")
     return {"message": "Logs cleared."}
+
+
+async def get_game_stats_service():
+    """
+    Reports the live games of the worker serving the request and how often
+    it contended with other workers for their ownership.
+    """
+    return {
+        "live_games": len(engine.games),
+        "owned_games": sum(bus.owns(game_id) for game_id in engine.games),
+        "ownership": dict(bus.stats),
+        "fencing": dict(engine.stats),
+    }
+
+
+async def get_auth_stats_service():
+    """
+    Reports how busy the password hashing threads of the worker serving the
+    request are and how long logins waited for them.
+    """
+    return hashing_pool.metrics()
+
+
+async def get_index_stats_service():
+    """
+    Reports declared indexes that are missing, indexes that are not declared,
+    and indexes that no query has used since the database server started.
+    """
+    return await index_report(db)
+
+
+async def get_id_stats_service():
+    """
+    Reports how many IDs of each kind the worker serving the request handed
+    out and how often a random ID was already taken.
+    """
+    return id_stats()
+
+
+async def get_gallery_stats_service():
+    """
+    Reports how often the worker serving the request answered gallery pages
+    from its cache.
+    """
+    return gallery_cache.metrics()
@@ -1,15 +1,27 @@
-import asyncio
 import random
 from datetime import UTC, datetime, timedelta
+from functools import partial
+from typing import Any
 
 from fastapi import WebSocket
+from pymongo import ReturnDocument
 
-from backend.app.code_gen import generate_aigame_code
+from backend.app.code_gen import insert_with_new_id
 from backend.app.db import db
 from backend.app.models import AIGame
+from backend.app.services.game_history import LIFECYCLE_FIELDS, archive_aigame
+from backend.app.services.game_service import drawn_word
+from backend.app.services.timers import timers
+from backend.app.services.word_lists import load_words, store_words
+from backend.app.shuffles import new_seed
 
 aigames = db.aigames
 
+# Game fields kept for the server's own use and never sent to the client:
+# what the words are derived from, and the outcome of the last guess as
+# recorded by the guess pipeline
+SERVER_FIELDS = ("deck_ref", "seed", "last_guess_correct")
+
 
 class AIGameConnectionManager:
     """
@@ -35,9 +47,12 @@ class AIGameConnectionManager:
     async def send_state(self, game_id: str, game_data: dict) -> None:
         """
         Sends the current game state to the connected WebSocket client for a given game ID.
-        Converts 'expires_at' to ISO format if present.
+        Converts 'expires_at' to ISO format if present and leaves out the
+        game's lifecycle timestamps and server-side fields.
         """
         if game_id in self.active_connections:
+            for field in (*LIFECYCLE_FIELDS, *SERVER_FIELDS):
+                game_data.pop(field, None)
             if game_data.get("expires_at"):
                 expires_at = game_data["expires_at"]
                 if expires_at.tzinfo is None:
@@ -54,39 +69,109 @@ manager = AIGameConnectionManager()
 async def create_aigame(game: AIGame) -> str:
     """
     Creates a new AI game entry in the database.
-    Initializes game state, shuffles the deck, and generates a unique game ID.
+    Stores the deck in the word list store, seeds the order in which words
+    are drawn from it, and generates a unique game ID.
     """
-    words = list(game.deck)
-    random.shuffle(words)
-
+    deck_ref = await store_words(list(game.deck))
+    words_amount = len(game.deck)
     if (game.settings.word_amount is not None) and (
-        1 < game.settings.word_amount < len(words)
+        1 < game.settings.word_amount < words_amount
     ):
-        words = words[: game.settings.word_amount]
-
-    code = await generate_aigame_code()
+        words_amount = game.settings.word_amount
 
+    now = datetime.now(UTC)
     new_game = {
-        "_id": code,
-        "deck": words,
+        "deck_ref": deck_ref,
+        "seed": new_seed(),
+        "words_amount": words_amount,
         "game_state": "pending",
         "settings": game.settings.model_dump(),
-        "remaining_words": words,
+        "word_index": 0,
         "current_word": None,
         "clues": [],
         "score": 0,
         "expires_at": None,
+        "created_at": now,
+        "last_activity_at": now,
     }
-    await aigames.insert_one(new_game)
-    return code
+    return await insert_with_new_id(aigames, new_game, "aigame")
+
+
+async def backfill_aigame_decks() -> None:
+    """
+    Moves the words of AI games that embed their deck into the word list
+    store. Such games were created before games referred to stored word
+    lists, and pop their next word off `remaining_words`. The current word
+    and the remaining ones become the game's `picks`, played in that order.
+    """
+    legacy = {"deck_ref": {"$exists": False}, "deck": {"$exists": True}}
+    async for game in aigames.find(legacy):
+        deck = game["deck"]
+        positions = {word: i for i, word in reversed(list(enumerate(deck)))}
+        drawn = [game["current_word"]] if game.get("current_word") in positions else []
+        picks = [
+            positions[word]
+            for word in drawn + game.get("remaining_words", [])
+            if word in positions
+        ]
+        await aigames.update_one(
+            {"_id": game["_id"], **legacy},
+            {
+                "$set": {
+                    "deck_ref": await store_words(deck),
+                    "picks": picks,
+                    "words_amount": len(picks),
+                    "word_index": len(drawn),
+                },
+                "$unset": {"deck": "", "remaining_words": ""},
+            },
+        )
+
+
+def _next_word_stages(advance: Any) -> list[dict[str, Any]]:
+    """
+    Update pipeline stages that, where `advance` evaluates to true, move a game
+    on to its next word, or finish it once no words remain. `word_index`
+    counts the words drawn in the game's seeded order. The drawn word itself
+    is only known to the stored word list, so `current_word` is cleared here
+    and set by `_present_word`.
+    """
+    has_next = {"$lt": ["$word_index", "$words_amount"]}
+    next_word = {"$and": [advance, has_next]}
+    out_of_words = {"$and": [advance, {"$gte": ["$word_index", "$words_amount"]}]}
+    return [
+        {
+            "$set": {
+                "current_word": {"$cond": [next_word, None, "$current_word"]},
+                "word_index": {
+                    "$cond": [next_word, {"$add": ["$word_index", 1]}, "$word_index"]
+                },
+                # Set together with the word's first clue
+                "expires_at": {"$cond": [next_word, None, "$expires_at"]},
+                "clues": {"$cond": [next_word, [], "$clues"]},
+                "game_state": {
+                    "$cond": [
+                        out_of_words,
+                        "finished",
+                        "$game_state",
+                    ]
+                },
+            }
+        }
+    ]
 
 
 async def start_aigame_service(game_id: str):
     """
     Starts an AI game by setting its state to 'in_progress' and processing the first word.
     """
-    await aigames.update_one({"_id": game_id}, {"$set": {"game_state": "in_progress"}})
-    await process_new_word(game_id)
+    game = await aigames.find_one_and_update(
+        {"_id": game_id, "game_state": "pending"},
+        [{"$set": {"game_state": "in_progress"}}, *_next_word_stages(True)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if game:
+        await _present_word(game_id, game)
 
 
 async def process_new_word(game_id: str):
@@ -95,36 +180,67 @@ async def process_new_word(game_id: str):
     If no remaining words, sets game state to 'finished'.
     Generates a new clue and updates the game state.
     """
-    game = await aigames.find_one({"_id": game_id})
-    if not game or not game.get("remaining_words"):
-        await aigames.update_one({"_id": game_id}, {"$set": {"game_state": "finished"}})
-        finished_game = await aigames.find_one({"_id": game_id})
-        if finished_game:
-            await manager.send_state(game_id, finished_game)
+    game = await aigames.find_one_and_update(
+        {"_id": game_id, "game_state": "in_progress"},
+        _next_word_stages(True),
+        return_document=ReturnDocument.AFTER,
+    )
+    if game:
+        await _present_word(game_id, game)
+
+
+async def _present_word(game_id: str, game: dict[str, Any]) -> None:
+    """
+    Arms the timer for a freshly drawn word and sends it with its first clue,
+    or sends the final state of a finished game.
+    """
+    if game["game_state"] == "finished":
+        cancel_timer(game_id)
+        game["finished_at"] = datetime.now(UTC)
+        await aigames.update_one(
+            {"_id": game_id}, {"$set": {"finished_at": game["finished_at"]}}
+        )
+        await archive_aigame(game_id, game)
+        await manager.send_state(game_id, game)
         return
 
-    new_word = game["remaining_words"].pop(0)
+    deck = await load_words(game["deck_ref"])
+    game["current_word"] = drawn_word(deck, game, game["word_index"] - 1)
     expires_at = datetime.now(UTC) + timedelta(
         seconds=game["settings"]["time_for_guessing"]
     )
-
-    await aigames.update_one(
-        {"_id": game_id},
-        {
-            "$set": {
-                "remaining_words": game["remaining_words"],
-                "current_word": new_word,
-                "expires_at": expires_at,
-                "clues": [],
-            }
-        },
+    schedule_timer(game_id, expires_at)
+    await _send_with_clue(
+        game_id,
+        game,
+        {"current_word": game["current_word"], "expires_at": expires_at},
     )
 
-    context_words = random.sample(game["deck"], k=min(len(game["deck"]), 3))
-    first_clue = await generate_clue(new_word, context_words=context_words)
-    await aigames.update_one({"_id": game_id}, {"$push": {"clues": first_clue}})
 
-    updated_game = await aigames.find_one({"_id": game_id})
+async def _send_with_clue(
+    game_id: str, game: dict[str, Any], to_set: dict[str, Any] | None = None
+) -> None:
+    """
+    Adds a new clue for the current word, along with any other fields to set,
+    and sends the resulting state. Nothing is written if the game has moved
+    on to another word in the meantime.
+    """
+    deck = await load_words(game["deck_ref"])
+    steps = random.sample(range(game["words_amount"]), k=min(game["words_amount"], 3))
+    context_words = [drawn_word(deck, game, step) for step in steps]
+    clue = await generate_clue(
+        game["current_word"], game.get("clues", []), context_words=context_words
+    )
+    update: dict[str, Any] = {
+        "$push": {"clues": clue},
+        # Games that stop changing are deleted as abandoned after a while.
+        "$set": {"last_activity_at": datetime.now(UTC), **(to_set or {})},
+    }
+    updated_game = await aigames.find_one_and_update(
+        {"_id": game_id, "word_index": game["word_index"]},
+        update,
+        return_document=ReturnDocument.AFTER,
+    )
     if updated_game:
         await manager.send_state(game_id, updated_game)
 
@@ -195,24 +311,41 @@ async def generate_clue(
 async def handle_guess(game_id: str, guess: str):
     """
     Handles a player's guess for the current word.
-    If correct, increments score and processes a new word. Otherwise, generates a new clue.
+    Checking the guess, scoring it and drawing the next word happen in one
+    conditional update. A wrong guess gets another clue for the same word.
     """
-    game = await aigames.find_one({"_id": game_id})
-    if not game or game.get("game_state") != "in_progress":
+    correct = {
+        "$and": [
+            {"$ne": [{"$ifNull": ["$current_word", None]}, None]},
+            {"$eq": [{"$toLower": "$current_word"}, {"$literal": guess.lower()}]},
+        ]
+    }
+    game = await aigames.find_one_and_update(
+        {"_id": game_id, "game_state": "in_progress"},
+        [
+            {"$set": {"last_guess_correct": correct}},
+            {
+                "$set": {
+                    "score": {
+                        "$cond": [
+                            "$last_guess_correct",
+                            {"$add": ["$score", 1]},
+                            "$score",
+                        ]
+                    }
+                }
+            },
+            *_next_word_stages("$last_guess_correct"),
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    if not game:
         return
 
-    if guess.lower() == game.get("current_word", "").lower():
-        await aigames.update_one({"_id": game_id}, {"$inc": {"score": 1}})
-        await process_new_word(game_id)
-    else:
-        context_words = random.sample(game["deck"], k=min(len(game["deck"]), 3))
-        new_clue = await generate_clue(
-            game["current_word"], game.get("clues", []), context_words=context_words
-        )
-        await aigames.update_one({"_id": game_id}, {"$push": {"clues": new_clue}})
-        updated_game = await aigames.find_one({"_id": game_id})
-        if updated_game:
-            await manager.send_state(game_id, updated_game)
+    if game["last_guess_correct"]:
+        await _present_word(game_id, game)
+    elif game["current_word"] is not None:
+        await _send_with_clue(game_id, game)
 
 
 async def skip_word(game_id: str):
@@ -222,26 +355,16 @@ async def skip_word(game_id: str):
     await process_new_word(game_id)
 
 
-async def check_timer(game_id: str):
+def schedule_timer(game_id: str, expires_at: datetime) -> None:
     """
-    Periodically checks if the time for guessing the current word has expired.
-    If expired, processes a new word.
+    Moves on to the next word once the time for guessing the current one is up.
+    Replaces any deadline the game already had.
     """
-    while True:
-        game = await aigames.find_one({"_id": game_id})
-        if (
-            not game
-            or game.get("game_state") != "in_progress"
-            or not game.get("expires_at")
-        ):
-            break
-
-        expires_at = game["expires_at"]
-        if expires_at.tzinfo is None:
-            expires_at = expires_at.replace(tzinfo=UTC)
+    timers.schedule(("aigame", game_id), expires_at, partial(process_new_word, game_id))
 
-        now = datetime.now(UTC)
-        if now >= expires_at:
-            await process_new_word(game_id)
 
-        await asyncio.sleep(1)
+def cancel_timer(game_id: str) -> None:
+    """
+    Drops the pending word deadline of a game, if any.
+    """
+    timers.cancel(("aigame", game_id))
@@ -1,3 +1,5 @@
+import asyncio
+import time
 from datetime import UTC, datetime, timedelta
 
 from fastapi import Depends, HTTPException, status
@@ -5,24 +7,106 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import ExpiredSignatureError, JWTError, jwt  # type: ignore
 from passlib.context import CryptContext  # type: ignore
 
-from backend.app.code_gen import generate_user_id
+from backend.app.code_gen import insert_with_new_id
 from backend.app.config import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     ALGORITHM,
+    BCRYPT_ROUNDS,
     REFRESH_TOKEN_EXPIRE_DAYS,
     SECRET_KEY,
+    TOKEN_REVOCATION_POLL_SECONDS,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
 )
 from backend.app.db import db
-from backend.app.models import User, UserInDB
+from backend.app.models import CurrentUser, User, UserInDB
+from backend.app.services.hashing import hashing_pool
+from backend.app.services.ttl_cache import TTLCache
 
 # Access the 'users' collection from the database instance
 users = db.users
-# Initialize CryptContext for password hashing and verification
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Oldest access token version still valid for users whose tokens were revoked
+token_revocations = db.token_revocations
+# Initialize CryptContext for password hashing and verification.
+# Hashes made with a cost other than BCRYPT_ROUNDS are reported by needs_update.
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+# Background rehashes of outdated password hashes, referenced until they finish
+_rehashes: set[asyncio.Task] = set()
 # OAuth2PasswordBearer for handling token-based authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
+class UserCache(TTLCache[str, UserInDB]):
+    """
+    Cache of the users that access tokens resolve to, keyed by the token
+    subject (email).
+    """
+
+    def __init__(self, size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        super().__init__(size, ttl)
+
+
+user_cache = UserCache()
+
+
+class TokenRevocations:
+    """
+    Mirror of `token_revocations`: for each user whose access tokens were
+    revoked, the oldest token version that is still valid.
+
+    Revocations made by this worker apply at once. Those made by other workers
+    are picked up by polling the collection at most every `poll_interval`
+    seconds, so checking tokens costs one query per interval instead of one
+    per request.
+    """
+
+    def __init__(self, poll_interval: float = TOKEN_REVOCATION_POLL_SECONDS):
+        self.poll_interval = poll_interval
+        self.min_versions: dict[str, int] = {}
+        self._polled_at: float | None = None
+        self._since: datetime | None = None
+
+    async def min_version(self, user_id: str) -> int:
+        if (
+            self._polled_at is None
+            or time.monotonic() - self._polled_at >= self.poll_interval
+        ):
+            await self.poll()
+        return self.min_versions.get(user_id, 0)
+
+    async def poll(self) -> None:
+        # Requests arriving while the poll is in flight use what is known.
+        self._polled_at = time.monotonic()
+        started = datetime.now(UTC)
+        query: dict = {}
+        if self._since is not None:
+            # Overlap the previous poll to allow for clock skew between workers.
+            overlap = timedelta(seconds=self.poll_interval)
+            query = {"revoked_at": {"$gte": self._since - overlap}}
+        async for revocation in token_revocations.find(query):
+            self._raise(revocation["_id"], revocation["version"])
+        self._since = started
+
+    async def revoke(self, user_id: str, version: int) -> None:
+        """
+        Invalidates every access token of a user older than `version`.
+        """
+        self._raise(user_id, version)
+        await token_revocations.update_one(
+            {"_id": user_id},
+            {"$max": {"version": version}, "$set": {"revoked_at": datetime.now(UTC)}},
+            upsert=True,
+        )
+
+    def _raise(self, user_id: str, version: int) -> None:
+        self.min_versions[user_id] = max(self.min_versions.get(user_id, 0), version)
+
+
+revocations = TokenRevocations()
+
+
 async def create_user(user: User):
     """
     Creates a new user in the database.
@@ -35,21 +119,20 @@ async def create_user(user: User):
     Returns:
         dict: A dictionary representing the created user's credentials, including the hashed password and generated ID.
     """
-    # Hash the plain password using bcrypt for secure storage.
-    hashed_password = pwd_context.hash(user.password)
-    # Generate a unique user ID for the new user.
-    user_id = await generate_user_id()
+    # Hash the plain password using bcrypt for secure storage, off the event loop.
+    hashed_password = await hashing_pool.run(pwd_context.hash, user.password)
     # Prepare the user credentials for insertion into the database.
     user_credentials = {
-        "_id": user_id,
         "name": user.name,
         "surname": user.surname,
         "email": user.email,
         "hashed_password": hashed_password,
         "isAdmin": False,  # Default to non-admin user
+        "token_version": 0,  # Raised to revoke the user's access tokens
     }
-    # Insert the new user document into the 'users' collection.
-    await users.insert_one(user_credentials)
+    # Insert the new user document into the 'users' collection under a
+    # unique user ID, which is stored in the credentials as '_id'.
+    await insert_with_new_id(users, user_credentials, "user")
     return user_credentials
 
 
@@ -94,6 +177,41 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return _create_token(data, delta)
 
 
+def access_token_claims(user: CurrentUser) -> dict:
+    """
+    Builds the payload of an access token for a user.
+
+    Besides the subject (email), access tokens carry the user's ID, admin flag
+    and token version, so that requests can be authorized without looking the
+    user up. Raising the user's token version revokes them.
+
+    Args:
+        user (CurrentUser): The user the token is issued to.
+
+    Returns:
+        dict: The claims to pass to `create_access_token`.
+    """
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "adm": bool(user.isAdmin),
+        "ver": user.token_version,
+    }
+
+
+async def revoke_tokens(user_id: str, version: int) -> None:
+    """
+    Rejects the user's access tokens issued before their token version was
+    raised to `version`. Refresh tokens keep working and get new access
+    tokens with up-to-date claims.
+
+    Args:
+        user_id (str): The ID of the user.
+        version (int): The user's new token version.
+    """
+    await revocations.revoke(user_id, version)
+
+
 def create_refresh_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """
     Creates a refresh token with a default or specified expiration time.
@@ -115,6 +233,23 @@ def _decode_token(token: str, is_refresh_token: bool = False) -> str:
     """
     Decodes a JWT token and extracts the subject (email).
 
+    Args:
+        token (str): The JWT string to decode.
+        is_refresh_token (bool): Flag to indicate if the token is a refresh token, affecting error messages.
+
+    Raises:
+        HTTPException: 401 if the token is expired or otherwise invalid.
+
+    Returns:
+        str: The email (subject) extracted from the token payload.
+    """
+    return _decode_claims(token, is_refresh_token)["sub"]
+
+
+def _decode_claims(token: str, is_refresh_token: bool = False) -> dict:
+    """
+    Decodes a JWT token and returns its payload.
+
     Handles token expiration and invalid token errors by raising appropriate HTTPExceptions.
 
     Args:
@@ -125,7 +260,7 @@ def _decode_token(token: str, is_refresh_token: bool = False) -> str:
         HTTPException: 401 if the token is expired or otherwise invalid.
 
     Returns:
-        str: The email (subject) extracted from the token payload.
+        dict: The token payload, which always has a string subject (email).
     """
     # Define standard exceptions for invalid or expired credentials.
 
@@ -148,7 +283,7 @@ def _decode_token(token: str, is_refresh_token: bool = False) -> str:
             raise credentials_exception
         # Ensure the email is a string before returning.
         assert isinstance(email, str)
-        return email
+        return payload
     except ExpiredSignatureError as err:
         # Catch specific error for expired tokens.
         raise expired_exception from err
@@ -207,6 +342,7 @@ async def get_user(email: str) -> UserInDB | None:
             isAdmin=user.get(
                 "isAdmin", False
             ),  # Default isAdmin to False if not present
+            token_version=user.get("token_version", 0),
         )
     return None
 
@@ -230,6 +366,9 @@ async def authenticate_user(email: str, password: str) -> UserInDB | None:
     """
     Authenticates a user by verifying their email and password.
 
+    If the stored hash does not follow the current hashing policy, the
+    password is rehashed in the background once it has been verified.
+
     Args:
         email (str): The user's email address.
         password (str): The user's plain-text password.
@@ -240,16 +379,51 @@ async def authenticate_user(email: str, password: str) -> UserInDB | None:
     # Retrieve the user from the database by email.
     user = await get_user(email)
     # If user not found or password does not match, return None.
-    if not user or not verify_password(password, user.hashed_password):
+    # bcrypt is slow by design, so the check runs off the event loop.
+    if not user or not await hashing_pool.run(
+        verify_password, password, user.hashed_password
+    ):
         return None
+    if password_needs_rehash(user.hashed_password):
+        task = asyncio.create_task(_rehash_password(user, password))
+        _rehashes.add(task)
+        task.add_done_callback(_rehashes.discard)
     return user
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Checks whether a stored hash was made with an outdated scheme or cost.
+    """
+    return pwd_context.identify(hashed_password) is not None and bool(
+        pwd_context.needs_update(hashed_password)
+    )
+
+
+async def _rehash_password(user: UserInDB, password: str) -> None:
+    """
+    Replaces a user's outdated password hash, unless the password was changed
+    in the meantime.
+    """
+    try:
+        hashed_password = await hashing_pool.run(pwd_context.hash, password)
+        await users.update_one(
+            {"_id": user.id, "hashed_password": user.hashed_password},
+            {"$set": {"hashed_password": hashed_password}},
+        )
+        user_cache.invalidate(user.email)
+    except Exception as e:
+        print(f"Failed to rehash the password of user {user.id}: {e}")
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Retrieves the current authenticated user based on the provided access token.
 
-    This function is intended to be used as a FastAPI dependency.
+    This function is intended to be used as a FastAPI dependency. Access
+    tokens with claims are trusted without a database lookup unless they were
+    revoked, see `TokenRevocations`. For older tokens the user is looked up,
+    and cached for a short while, see `UserCache`.
 
     Args:
         token (str): The access token, automatically injected by OAuth2PasswordBearer.
@@ -258,11 +432,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         HTTPException: 401 if the token is invalid, expired, or the user is not found.
 
     Returns:
-        UserInDB: The authenticated user object.
+        CurrentUser: The authenticated user object.
     """
-    # Decode the access token to get the user's email.
-    email = _decode_token(token)
+    claims = _decode_claims(token)
+    # Tokens carrying the user's claims authorize the request by themselves,
+    # unless they were revoked.
+    if {"uid", "adm", "ver"} <= claims.keys():
+        if claims["ver"] < await revocations.min_version(claims["uid"]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return CurrentUser(
+            id=claims["uid"],
+            email=claims["sub"],
+            isAdmin=claims["adm"],
+            token_version=claims["ver"],
+        )
+    # Older tokens only name the user's email, who is looked up.
+    email = claims["sub"]
+    # Serve the user from the cache if it was resolved recently.
+    if (user := user_cache.get(email)) is not None:
+        return user
     # Retrieve the user from the database using the email.
+    version = user_cache.version
     user = await get_user(email)
     # If no user is found for the given email, raise an authentication exception.
     if user is None:
@@ -271,4 +465,5 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    user_cache.put(email, user, version)
     return user
@@ -0,0 +1,248 @@
+"""In-process full-text index of the public decks shown in the gallery.
+
+Deck names and tags, and optionally words, are split into lowercase terms and
+kept in an inverted index from each term to the decks that contain it. A
+query term matches index terms equal to it, starting with it, or one typo
+away from it, and decks are ranked by how well and in which fields they
+match every query term. Searching costs no database query; only the decks of
+the requested page are then read by ID.
+
+The index is built from the database on first use. Deck changes made by this
+worker are applied to it right away with `refresh`, and it is rebuilt in the
+background every `GALLERY_SEARCH_REBUILD_SECONDS` to pick up the changes made
+by other workers.
+"""
+
+import asyncio
+import re
+import time
+from bisect import bisect_left, insort
+from collections.abc import Iterable
+from typing import Any
+
+from backend.app.config import (
+    GALLERY_SEARCH_INDEX_WORDS,
+    GALLERY_SEARCH_REBUILD_SECONDS,
+)
+from backend.app.services.game_service import decks
+from backend.app.services.word_lists import resolve_words
+
+# How much a match in each field counts towards a deck's relevance
+FIELD_WEIGHTS = {"name": 3.0, "tags": 2.0, "words": 1.0}
+# How much each kind of term match counts, relative to an exact one
+PREFIX_MATCH = 0.6
+FUZZY_MATCH = 0.4
+# Shortest query terms that are also matched as prefixes and with a typo
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _deletions(term: str) -> set[str]:
+    """The term with each one of its characters left out."""
+    return {term[:i] + term[i + 1 :] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) <= 1
+    shorter, longer = sorted((a, b), key=len)
+    return any(longer[:i] + longer[i + 1 :] == shorter for i in range(len(longer)))
+
+
+class DeckSearchIndex:
+    """
+    Inverted index of deck terms. `postings` maps each term to the weight of
+    the best field it appears in for every deck containing it, and `names`
+    holds deck names for ordering decks that are equally relevant.
+    """
+
+    def __init__(self, index_words: bool = GALLERY_SEARCH_INDEX_WORDS) -> None:
+        self.index_words = index_words
+        self.postings: dict[str, dict[str, float]] = {}
+        self.names: dict[str, str] = {}
+        self.built_at: float | None = None
+        self._terms: list[str] = []
+        self._deck_terms: dict[str, set[str]] = {}
+        # Single-deletion variants of each term, to find terms one typo away
+        self._variants: dict[str, set[str]] = {}
+        self._build_task: asyncio.Task | None = None
+        # Decks refreshed while a build reads the database, to apply again
+        # once the built index has replaced this one
+        self._refreshed_during_build: set[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _fields(self, deck: dict[str, Any]) -> dict[str, list[str]]:
+        fields = {"name": [deck.get("name") or ""], "tags": deck.get("tags") or []}
+        if self.index_words:
+            fields["words"] = deck.get("words") or []
+        return fields
+
+    def add(self, deck: dict[str, Any]) -> None:
+        """
+        Indexes a public deck, replacing what was indexed for it before.
+        """
+        deck_id = deck["_id"]
+        self.remove(deck_id)
+        weights: dict[str, float] = {}
+        for field, texts in self._fields(deck).items():
+            for text in texts:
+                for term in tokenize(text):
+                    weights[term] = max(weights.get(term, 0.0), FIELD_WEIGHTS[field])
+        for term, weight in weights.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                insort(self._terms, term)
+                for variant in _deletions(term):
+                    self._variants.setdefault(variant, set()).add(term)
+            self.postings[term][deck_id] = weight
+        self._deck_terms[deck_id] = set(weights)
+        self.names[deck_id] = deck.get("name") or ""
+
+    def remove(self, deck_id: str) -> None:
+        self.names.pop(deck_id, None)
+        for term in self._deck_terms.pop(deck_id, ()):
+            postings = self.postings[term]
+            postings.pop(deck_id, None)
+            if postings:
+                continue
+            del self.postings[term]
+            del self._terms[bisect_left(self._terms, term)]
+            for variant in _deletions(term):
+                self._variants[variant].discard(term)
+                if not self._variants[variant]:
+                    del self._variants[variant]
+
+    def _matches(self, query_term: str) -> dict[str, float]:
+        """
+        Returns the index terms that match a query term and how well.
+        """
+        matches: dict[str, float] = {}
+        if len(query_term) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._variants.get(query_term, ()))
+            for variant in _deletions(query_term) | {query_term}:
+                candidates |= self._variants.get(variant, set())
+                if variant in self.postings:
+                    candidates.add(variant)
+            for term in candidates:
+                if _within_one_edit(query_term, term):
+                    matches[term] = FUZZY_MATCH
+        if len(query_term) >= MIN_PREFIX_LENGTH:
+            start = bisect_left(self._terms, query_term)
+            for term in self._terms[start:]:
+                if not term.startswith(query_term):
+                    break
+                matches[term] = PREFIX_MATCH
+        if query_term in self.postings:
+            matches[query_term] = 1.0
+        return matches
+
+    def search(self, query: str) -> list[str]:
+        """
+        Returns the IDs of the decks matching every term of the query, most
+        relevant first, and by name among equally relevant decks.
+        """
+        scores: dict[str, float] | None = None
+        for query_term in dict.fromkeys(tokenize(query)):
+            term_scores: dict[str, float] = {}
+            for term, quality in self._matches(query_term).items():
+                for deck_id, weight in self.postings[term].items():
+                    score = quality * weight
+                    if score > term_scores.get(deck_id, 0.0):
+                        term_scores[deck_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    deck_id: score + term_scores[deck_id]
+                    for deck_id, score in scores.items()
+                    if deck_id in term_scores
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return sorted(
+            scores, key=lambda deck_id: (-scores[deck_id], self.names[deck_id])
+        )
+
+    def _projection(self) -> dict[str, int]:
+        projection = {"name": 1, "tags": 1}
+        if self.index_words:
+            projection.update(words=1, words_ref=1)
+        return projection
+
+    async def build(self) -> None:
+        """
+        Replaces the index with one of every public deck in the database.
+        """
+        fresh = DeckSearchIndex(self.index_words)
+        started = time.monotonic()
+        self._refreshed_during_build = set()
+        try:
+            found = decks.find({"private": False}, fresh._projection())
+            public = await found.to_list(None)
+            if self.index_words:
+                await resolve_words(public)
+        except BaseException:
+            self._refreshed_during_build = None
+            raise
+        for deck in public:
+            fresh.add(deck)
+        self.postings, self.names = fresh.postings, fresh.names
+        self._terms, self._deck_terms = fresh._terms, fresh._deck_terms
+        self._variants = fresh._variants
+        self.built_at = started
+        # The scan may have read these decks before they changed.
+        refreshed, self._refreshed_during_build = self._refreshed_during_build, None
+        if refreshed:
+            await self.refresh(refreshed)
+
+    async def refresh(self, deck_ids: Iterable[str]) -> None:
+        """
+        Re-reads the given decks, indexing the public ones and dropping the
+        rest.
+        """
+        deck_ids = list(deck_ids)
+        if self._refreshed_during_build is not None:
+            self._refreshed_during_build.update(deck_ids)
+        if self.built_at is None:
+            return
+        found = decks.find(
+            {"_id": {"$in": deck_ids}, "private": False}, self._projection()
+        )
+        public = {
+            deck["_id"]: deck for deck in await resolve_words(await found.to_list(None))
+        }
+        for deck_id in deck_ids:
+            if deck_id in public:
+                self.add(public[deck_id])
+            else:
+                self.remove(deck_id)
+
+    async def ready(self) -> None:
+        """
+        Builds the index on first use, and starts rebuilding it in the
+        background once it is older than the rebuild interval. Searches keep
+        using the current index until the new one is done.
+        """
+        stale = (
+            self.built_at is None
+            or time.monotonic() - self.built_at > GALLERY_SEARCH_REBUILD_SECONDS
+        )
+        if stale and (self._build_task is None or self._build_task.done()):
+            self._build_task = asyncio.create_task(self.build())
+        if self.built_at is None and self._build_task is not None:
+            await asyncio.shield(self._build_task)
+
+
+search_index = DeckSearchIndex()
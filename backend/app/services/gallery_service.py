@@ -1,18 +1,161 @@
+import base64
+import hashlib
+import json
+from collections import Counter
 from typing import Any
 
 from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
 from pymongo import DESCENDING
 
-from backend.app.code_gen import generate_deck_id
-from backend.app.config import GALLERY_PAGE_SIZE
-from backend.app.models import Deck, UserInDB
-from backend.app.services.auth_service import users
+from backend.app.code_gen import insert_with_new_id
+from backend.app.config import (
+    GALLERY_CACHE_SIZE,
+    GALLERY_CACHE_TTL,
+    GALLERY_COUNT_CACHE_SIZE,
+    GALLERY_COUNT_TTL,
+    GALLERY_PAGE_SIZE,
+)
+from backend.app.models import CurrentUser, Deck
+from backend.app.services.auth_service import user_cache, users
+from backend.app.services.deck_search import search_index
 from backend.app.services.game_service import decks
+from backend.app.services.profile_cache import profile_cache
+from backend.app.services.ttl_cache import TTLCache
+from backend.app.services.word_lists import resolve_words, store_words
 
+# Gallery order; `_id` breaks ties between decks with the same name so that
+# every deck has a unique position to continue from.
+GALLERY_SORT = [("name", DESCENDING), ("_id", DESCENDING)]
 
-async def get_gallery_service(page: int, search: str | None = None):
+
+class GalleryCounts(TTLCache[str | None, int]):
+    """
+    Cache of how many public decks match each gallery search.
+
+    Counting scans every matching deck, so a count is reused for `ttl`
+    seconds instead of being redone for every page. Pages are fetched with
+    continuation cursors, which do not depend on the count, so a count that
+    is slightly out of date only affects the total shown to users.
+    """
+
+    def __init__(
+        self, size: int = GALLERY_COUNT_CACHE_SIZE, ttl: float = GALLERY_COUNT_TTL
+    ):
+        super().__init__(size, ttl)
+
+    async def count(self, search: str | None, query: dict[str, Any]) -> int:
+        """
+        Returns the number of decks matching `query`, the filter of `search`.
+        """
+        if (count := self.get(search)) is not None:
+            return count
+        version = self.version
+        count = await decks.count_documents(query)
+        self.put(search, count, version)
+        return count
+
+
+gallery_counts = GalleryCounts()
+
+GalleryKey = tuple[int, str | None, str | None]
+
+
+class GalleryCache(TTLCache[GalleryKey, tuple[bytes, str]]):
+    """
+    Cache of gallery responses, serialized to JSON along with their ETag,
+    keyed by page, search and cursor.
+
+    Every deck change made by this worker clears the whole cache, since any
+    of them can move decks between pages. `stats` counts hits, misses and
+    invalidations.
+    """
+
+    def __init__(self, size: int = GALLERY_CACHE_SIZE, ttl: float = GALLERY_CACHE_TTL):
+        super().__init__(size, ttl)
+        self.stats: Counter[str] = Counter()
+
+    def get(self, key: GalleryKey) -> tuple[bytes, str] | None:
+        response = super().get(key)
+        self.stats["hits" if response is not None else "misses"] += 1
+        return response
+
+    def store(self, key: GalleryKey, body: bytes, version: int) -> tuple[bytes, str]:
+        """
+        Caches a response built while the cache was at `version` and returns
+        it with its ETag.
+        """
+        response = body, f'"{hashlib.sha1(body).hexdigest()}"'
+        self.put(key, response, version)
+        return response
+
+    def clear(self) -> None:
+        """
+        Drops every cached page and deck count after a deck has changed.
+        """
+        super().clear()
+        self.stats["invalidations"] += 1
+        gallery_counts.clear()
+
+    def metrics(self) -> dict[str, Any]:
+        hits, misses = self.stats["hits"], self.stats["misses"]
+        return {
+            "pages": len(self),
+            "hits": hits,
+            "misses": misses,
+            "invalidations": self.stats["invalidations"],
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        }
+
+
+gallery_cache = GalleryCache()
+
+
+async def decks_changed(*deck_ids: str) -> None:
+    """
+    Drops the cached gallery pages and counts after decks were created,
+    changed or deleted, and updates the given decks in the search index.
+    """
+    gallery_cache.clear()
+    await search_index.refresh(deck_ids)
+
+
+def encode_cursor(position: list[Any]) -> str:
+    """
+    Returns an opaque token for continuing the gallery from a position: the
+    name and ID of the last deck shown or, in search results, the number of
+    decks shown.
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> list[Any]:
+    """
+    Returns the position in a cursor, which must consist of values of the
+    given types.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor))
+    except ValueError:
+        position = None
+    if not (
+        isinstance(position, list)
+        and len(position) == len(types)
+        and all(isinstance(value, t) for value, t in zip(position, types))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return position
+
+
+async def get_gallery_service(
+    page: int = 1, search: str | None = None, cursor: str | None = None
+):
     """
-    Retrieves a paginated list of public decks from the gallery based on the page number and an optional search query.
+    Retrieves a page of public decks from the gallery, optionally filtered by a search query.
+    With a cursor from a previous page, the page after it is returned. Without
+    one, pages are counted from the start of the gallery.
     """
     if page < 1:
         raise HTTPException(
@@ -20,44 +163,90 @@ async def get_gallery_service(page: int, search: str | None = None):
             detail="Page number must be 1 or greater",
         )
 
-    query: dict[str, Any] = {"private": False}
     if search:
-        query["$text"] = {"$search": search}
-
-    skip_amount = (page - 1) * GALLERY_PAGE_SIZE
-
-    pipeline = [
-        {"$match": query},
-        {"$sort": {"name": DESCENDING}},
-        {
-            "$facet": {
-                "decks": [{"$skip": skip_amount}, {"$limit": GALLERY_PAGE_SIZE}],
-                "total_count": [{"$count": "count"}],
-            }
-        },
-    ]
-
-    cursor = decks.aggregate(pipeline)
-    result = await cursor.to_list(1)
-
-    if not result:
-        gallery_decks = []
-        total_decks = 0
-    else:
-        gallery_decks = result[0]["decks"]
-        total_decks = (
-            result[0]["total_count"][0]["count"] if result[0]["total_count"] else 0
+        return await _search_gallery(page, search, cursor)
+
+    query: dict[str, Any] = {"private": False}
+    page_query = dict(query)
+    if cursor is not None:
+        name, deck_id = decode_cursor(cursor, str, str)
+        # Decks that sort after the cursor's deck, found through the index
+        # instead of skipping every deck before it.
+        page_query["$or"] = [
+            {"name": {"$lt": name}},
+            {"name": name, "_id": {"$lt": deck_id}},
+        ]
+
+    found = decks.find(page_query).sort(GALLERY_SORT)
+    if cursor is None and page > 1:
+        found = found.skip((page - 1) * GALLERY_PAGE_SIZE)
+    # One extra deck tells whether there is a next page.
+    gallery_decks = await found.limit(GALLERY_PAGE_SIZE + 1).to_list(
+        GALLERY_PAGE_SIZE + 1
+    )
+    await resolve_words(gallery_decks)
+    next_cursor = None
+    if len(gallery_decks) > GALLERY_PAGE_SIZE:
+        gallery_decks = gallery_decks[:GALLERY_PAGE_SIZE]
+        next_cursor = encode_cursor(
+            [gallery_decks[-1]["name"], gallery_decks[-1]["_id"]]
         )
 
     return {
         "gallery": [Deck(**deck) for deck in gallery_decks],
-        "total_decks": total_decks,
+        "total_decks": await gallery_counts.count(search, query),
+        "next_cursor": next_cursor,
+    }
+
+
+async def _search_gallery(page: int, search: str, cursor: str | None):
+    """
+    Retrieves a page of the public decks matching a search, most relevant
+    first. Matches are found in the in-process search index, and only the
+    decks of the page are read from the database.
+    """
+    await search_index.ready()
+    ranked = search_index.search(search)
+    if cursor is None:
+        start = (page - 1) * GALLERY_PAGE_SIZE
+    else:
+        (start,) = decode_cursor(cursor, int)
+        start = max(start, 0)
+    page_ids = ranked[start : start + GALLERY_PAGE_SIZE]
+    found = decks.find({"_id": {"$in": page_ids}, "private": False})
+    by_id = {
+        deck["_id"]: deck for deck in await resolve_words(await found.to_list(None))
+    }
+    end = start + GALLERY_PAGE_SIZE
+
+    return {
+        "gallery": [Deck(**by_id[deck_id]) for deck_id in page_ids if deck_id in by_id],
+        "total_decks": len(ranked),
+        "next_cursor": encode_cursor([end]) if end < len(ranked) else None,
     }
 
 
+async def get_gallery_page_service(
+    page: int = 1, search: str | None = None, cursor: str | None = None
+) -> tuple[bytes, str]:
+    """
+    Returns the JSON of a gallery page and its ETag, from the cache if the
+    page was served recently.
+    """
+    # Pages continued from a cursor do not depend on the page number.
+    key = (page if cursor is None else 0, search, cursor)
+    cached = gallery_cache.get(key)
+    if cached is not None:
+        return cached
+    version = gallery_cache.version
+    result = await get_gallery_service(page, search, cursor)
+    body = json.dumps(jsonable_encoder(result)).encode()
+    return gallery_cache.store(key, body, version)
+
+
 async def save_deck_from_gallery_service(
     deck_id: str,
-    current_user: UserInDB,
+    current_user: CurrentUser,
 ):
     """
     Saves a deck from the gallery to the current user's profile.
@@ -80,21 +269,37 @@ async def save_deck_from_gallery_service(
             detail="This deck is private and cannot be saved",
         )
 
-    new_deck_id = await generate_deck_id()
+    words_ref = gallery_deck_doc.get("words_ref")
+    if words_ref is None:
+        # The first save of a deck moves its words to the word list store,
+        # so that this and every later copy only refer to them.
+        words = gallery_deck_doc.get("words", [])
+        words_ref = await store_words(words)
+        await decks.update_one(
+            {"_id": deck_id, "words": words},
+            {"$set": {"words_ref": words_ref}, "$unset": {"words": ""}},
+        )
+
     deck_data = {
-        "_id": new_deck_id,
         "name": gallery_deck_doc["name"],
         "owner_ids": [current_user.id],
-        "words": gallery_deck_doc["words"],
         "tags": gallery_deck_doc["tags"],
         "private": gallery_deck_doc["private"],
     }
 
     new_deck = Deck(**deck_data)
-    await decks.insert_one(new_deck.model_dump(by_alias=True))
+    new_deck_doc = new_deck.model_dump(by_alias=True, exclude={"id", "words"})
+    new_deck_doc["words_ref"] = words_ref
+    new_deck_doc["words_count"] = gallery_deck_doc.get(
+        "words_count", len(gallery_deck_doc.get("words", []))
+    )
+    new_deck_id = await insert_with_new_id(decks, new_deck_doc, "deck")
 
     await users.update_one(
         {"_id": current_user.id}, {"$addToSet": {"deck_ids": new_deck_id}}
     )
+    user_cache.invalidate(current_user.email)
+    profile_cache.invalidate(current_user.id)
+    await decks_changed(new_deck_id)
 
     return {"saved_deck_id": new_deck_id}
@@ -0,0 +1,307 @@
+"""Fan-out of game updates between backend workers.
+
+Every live team game is owned by exactly one worker, the one that holds it in
+its `GameEngine` and runs its timers. Workers serving sockets of a game they do
+not own forward player and host actions over the bus to the owner, and every
+worker with sockets for the game delivers the state the owner publishes.
+
+`InProcessGameBus` is used when a single worker serves all games. With
+`GAME_BUS=mongo`, `MongoGameBus` relays messages through a change stream on the
+``game_events`` collection, which needs MongoDB to run as a replica set (a
+single node is enough), and hands out ownership as expiring leases in
+``game_leases``. Every claim of a lease bumps its epoch, which the owner's
+engine uses as a fencing token on the game document, so a worker that lost
+its lease without noticing can no longer write the game.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from uuid import uuid4
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.config import GAME_BUS, GAME_LEASE_SECONDS
+from backend.app.db import db
+
+MessageHandler = Callable[[str, dict[str, Any]], Awaitable[None]]
+
+# Seconds bus events are kept for workers that lag behind the change stream
+EVENT_TTL_SECONDS = 60
+
+
+class GameBus(ABC):
+    """
+    Publishes messages to every worker subscribed to a game and arbitrates
+    which worker owns it. Subscribed workers get ``{"kind": "claimed"}``
+    delivered once they take over a game whose previous owner went away, and
+    owners get ``{"kind": "lost"}`` if their ownership was taken from them.
+    `stats` counts ownership contention on this worker.
+    """
+
+    def __init__(self) -> None:
+        self.handler: MessageHandler | None = None
+        self.subscribed: set[str] = set()
+        self.stats: Counter[str] = Counter()
+
+    def subscribe(self, game_id: str) -> None:
+        self.subscribed.add(game_id)
+
+    def unsubscribe(self, game_id: str) -> None:
+        self.subscribed.discard(game_id)
+
+    async def deliver(self, game_id: str, message: dict[str, Any]) -> None:
+        """
+        Hands a message to this worker's handler if it follows the game.
+        """
+        if self.handler is None or game_id not in self.subscribed:
+            return
+        try:
+            await self.handler(game_id, message)
+        except Exception as e:
+            print(f"Failed to handle bus message for {game_id}: {e}")
+
+    @abstractmethod
+    def owns(self, game_id: str) -> bool:
+        """
+        Returns whether this worker owns a game.
+        """
+
+    def fence(self, game_id: str) -> int | None:
+        """
+        Returns the fencing token of an owned game, if ownership can move.
+        """
+        return None
+
+    @abstractmethod
+    async def claim(self, game_id: str) -> bool:
+        """
+        Makes this worker the owner of a game unless another one already is.
+        Returns whether this worker owns the game afterwards.
+        """
+
+    @abstractmethod
+    async def release(self, game_id: str) -> None:
+        """
+        Gives up this worker's ownership of a game, if it has it.
+        """
+
+    @abstractmethod
+    async def publish(self, game_id: str, message: dict[str, Any]) -> None:
+        """
+        Delivers a message to every subscribed worker, this one first.
+        """
+
+    async def stop(self) -> None:  # noqa: B027 - optional, most buses run nothing
+        """
+        Stops whatever the bus runs in the background.
+        """
+
+
+class InProcessGameBus(GameBus):
+    """
+    Bus for a single worker: it owns every game and delivers directly.
+    """
+
+    def owns(self, game_id: str) -> bool:
+        return True
+
+    async def claim(self, game_id: str) -> bool:
+        return True
+
+    async def release(self, game_id: str) -> None:
+        pass
+
+    async def publish(self, game_id: str, message: dict[str, Any]) -> None:
+        await self.deliver(game_id, message)
+
+
+class MongoGameBus(GameBus):
+    """
+    Bus shared by several workers through MongoDB. Published messages are
+    inserted into ``game_events`` and picked up by the other workers' change
+    streams. Ownership is a lease document per game that the owner renews;
+    subscribed workers take over leases that have run out.
+    """
+
+    def __init__(
+        self,
+        database: Any,
+        worker_id: str | None = None,
+        lease_seconds: float = GAME_LEASE_SECONDS,
+    ) -> None:
+        super().__init__()
+        self.events = database.game_events
+        self.leases = database.game_leases
+        self.worker_id = worker_id or uuid4().hex
+        self.lease_seconds = lease_seconds
+        self.owned: set[str] = set()
+        self.epochs: dict[str, int] = {}
+        self._watch_task: asyncio.Task | None = None
+        self._lease_task: asyncio.Task | None = None
+
+    def subscribe(self, game_id: str) -> None:
+        super().subscribe(game_id)
+        self._ensure_tasks()
+
+    def owns(self, game_id: str) -> bool:
+        return game_id in self.owned
+
+    def fence(self, game_id: str) -> int | None:
+        return self.epochs.get(game_id)
+
+    async def claim(self, game_id: str) -> bool:
+        if game_id in self.owned:
+            return True
+        now = datetime.now(UTC)
+        try:
+            lease = await self.leases.find_one_and_update(
+                {
+                    "_id": game_id,
+                    # Released leases have no owner.
+                    "$or": [
+                        {"owner": self.worker_id},
+                        {"owner": None},
+                        {"expires_at": {"$lt": now}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "owner": self.worker_id,
+                        "expires_at": now + timedelta(seconds=self.lease_seconds),
+                    },
+                    "$inc": {"epoch": 1},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by a live worker.
+            self.stats["claims_contended"] += 1
+            return False
+        self.stats["claims"] += 1
+        self.owned.add(game_id)
+        self.epochs[game_id] = lease["epoch"]
+        self._ensure_tasks()
+        return True
+
+    async def release(self, game_id: str) -> None:
+        if game_id not in self.owned:
+            return
+        self.owned.discard(game_id)
+        self.epochs.pop(game_id, None)
+        # The lease is kept, lapsed, so that the next claim carries on from
+        # its epoch; a fence the game document has seen is never handed out
+        # again.
+        await self.leases.update_one(
+            {"_id": game_id, "owner": self.worker_id},
+            {"$set": {"expires_at": datetime.now(UTC)}, "$unset": {"owner": ""}},
+        )
+        await self.publish(game_id, {"kind": "released"})
+
+    async def publish(self, game_id: str, message: dict[str, Any]) -> None:
+        if message.get("kind") == "action":
+            self.stats["forwarded_actions"] += 1
+        await self.deliver(game_id, message)
+        await self.events.insert_one(
+            {
+                "game_id": game_id,
+                "origin": self.worker_id,
+                "message": message,
+                "created_at": datetime.now(UTC),
+            }
+        )
+
+    async def receive(self, event: dict[str, Any]) -> None:
+        """
+        Handles an event inserted by any worker, ignoring this worker's own.
+        """
+        game_id = event["game_id"]
+        if event.get("origin") == self.worker_id or game_id not in self.subscribed:
+            return
+        if event["message"].get("kind") == "released":
+            await self._take_over(game_id)
+        else:
+            await self.deliver(game_id, event["message"])
+
+    async def _take_over(self, game_id: str) -> None:
+        if game_id not in self.owned and await self.claim(game_id):
+            self.stats["takeovers"] += 1
+            await self.deliver(game_id, {"kind": "claimed"})
+
+    async def renew(self) -> None:
+        """
+        Extends the leases of owned games and gives up those another worker
+        took over in the meantime, e.g. after this one stalled.
+        """
+        owned = list(self.owned)
+        if not owned:
+            return
+        result = await self.leases.update_many(
+            {"_id": {"$in": owned}, "owner": self.worker_id},
+            {
+                "$set": {
+                    "expires_at": datetime.now(UTC)
+                    + timedelta(seconds=self.lease_seconds)
+                }
+            },
+        )
+        if result.matched_count == len(owned):
+            return
+        held = {
+            lease["_id"]
+            async for lease in self.leases.find(
+                {"_id": {"$in": owned}, "owner": self.worker_id}, {"_id": 1}
+            )
+        }
+        for game_id in owned:
+            if game_id not in held and game_id in self.owned:
+                self.owned.discard(game_id)
+                self.epochs.pop(game_id, None)
+                self.stats["leases_lost"] += 1
+                await self.deliver(game_id, {"kind": "lost"})
+
+    def _ensure_tasks(self) -> None:
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch())
+        if self._lease_task is None or self._lease_task.done():
+            self._lease_task = asyncio.create_task(self._maintain_leases())
+
+    async def _watch(self) -> None:
+        await self.events.create_index(
+            "created_at", expireAfterSeconds=EVENT_TTL_SECONDS
+        )
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.events.watch(pipeline) as stream:
+                    async for change in stream:
+                        await self.receive(change["fullDocument"])
+            except Exception as e:
+                print(f"Game event stream failed: {e}")
+                await asyncio.sleep(1)
+
+    async def _maintain_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.renew()
+                # Games whose owner died are taken over once its lease lapses.
+                for game_id in self.subscribed - self.owned:
+                    await self._take_over(game_id)
+            except Exception as e:
+                print(f"Failed to maintain game leases: {e}")
+
+    async def stop(self) -> None:
+        for task in (self._watch_task, self._lease_task):
+            if task is not None:
+                task.cancel()
+        for game_id in list(self.owned):
+            await self.release(game_id)
+
+
+bus: GameBus = MongoGameBus(db) if GAME_BUS == "mongo" else InProcessGameBus()
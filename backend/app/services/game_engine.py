@@ -0,0 +1,379 @@
+"""In-memory authoritative state for live team games.
+
+The engine keeps the game document of every active game in process memory and
+applies player and host actions to it directly. Changed fields are tracked as
+dotted Mongo paths and written behind to the ``games`` collection by a
+background flusher, so a guess costs no database round-trip before it is
+broadcast.
+
+When ownership of games can move between workers, a game is loaded with the
+fencing token of its lease. Loading raises ``owner_epoch`` on the document to
+that token and every flush is conditional on it not having been raised
+further, so a worker that was superseded cannot overwrite the new owner's
+progress; it drops the game instead.
+"""
+
+import asyncio
+from collections import Counter
+from copy import deepcopy
+from datetime import UTC, datetime
+from typing import Any
+
+from pymongo import ReturnDocument
+
+from backend.app.config import GAME_FLUSH_INTERVAL
+from backend.app.services.game_events import FINISHED, event_log
+from backend.app.services.game_service import (
+    WORD_FIELDS,
+    advance_team_word,
+    choose_master,
+    determine_winning_team,
+    finish_if_all_teams_done,
+    game_words,
+    games,
+    required_to_advance,
+    words_left,
+)
+
+
+def _resolve(document: dict[str, Any], path: str) -> tuple[bool, Any]:
+    """Returns whether a dotted path exists in the document and its value."""
+    value: Any = document
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return False, None
+        value = value[key]
+    return True, value
+
+
+def _collapse(paths: set[str]) -> list[str]:
+    """Drops paths whose ancestor is also dirty; Mongo rejects such overlaps."""
+    result: list[str] = []
+    for path in sorted(paths):
+        if result and path.startswith(result[-1] + "."):
+            continue
+        result.append(path)
+    return result
+
+
+class GameEngine:
+    """
+    Holds the live game dict of each active game as the source of truth.
+    Actions mutate the cached dict synchronously and mark the changed paths,
+    which are persisted by `flush`. `stats` counts loads and writes rejected
+    by fencing.
+    """
+
+    def __init__(self, flush_interval: float = GAME_FLUSH_INTERVAL) -> None:
+        self.flush_interval = flush_interval
+        self.games: dict[str, dict[str, Any]] = {}
+        self.fences: dict[str, int] = {}
+        self.stats: Counter[str] = Counter()
+        self._dirty: dict[str, set[str]] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def load(
+        self, game_id: str, fence: int | None = None
+    ) -> dict[str, Any] | None:
+        """
+        Returns the cached game, reading it from the database on first access.
+        With a fencing token, the game is only loaded if no newer owner has
+        fenced it already.
+        """
+        if game_id in self.games:
+            return self.games[game_id]
+        if fence is None:
+            game = await games.find_one({"_id": game_id})
+        else:
+            game = await games.find_one_and_update(
+                {"_id": game_id},
+                {"$max": {"owner_epoch": fence}},
+                return_document=ReturnDocument.AFTER,
+            )
+        if not isinstance(game, dict):
+            return None
+        if fence is not None:
+            if game["owner_epoch"] > fence:
+                self.stats["stale_loads"] += 1
+                return None
+            self.fences[game_id] = fence
+        # Words are drawn from the resolved list, which is never written back.
+        game["deck"] = await game_words(game)
+        # Another coroutine may have loaded the game while we were waiting.
+        return self.games.setdefault(game_id, game)
+
+    def mark(self, game_id: str, *paths: str) -> None:
+        """
+        Records changed dotted paths of a game for the next flush.
+        """
+        self._dirty.setdefault(game_id, set()).update(paths)
+        self._ensure_flusher()
+
+    def _build_update(self, game_id: str) -> dict[str, Any] | None:
+        paths = self._dirty.pop(game_id, None)
+        game = self.games.get(game_id)
+        if not paths or game is None:
+            return None
+        # Games that stop changing are deleted as abandoned after a while.
+        game["last_activity_at"] = datetime.now(UTC)
+        paths.add("last_activity_at")
+        to_set: dict[str, Any] = {}
+        to_unset: dict[str, str] = {}
+        for path in _collapse(paths):
+            exists, value = _resolve(game, path)
+            if exists:
+                # Motor encodes documents off the event loop, so the values
+                # must not be shared with the live game dict.
+                to_set[path] = deepcopy(value)
+            else:
+                to_unset[path] = ""
+        update: dict[str, Any] = {}
+        if to_set:
+            update["$set"] = to_set
+        if to_unset:
+            update["$unset"] = to_unset
+        return update
+
+    async def flush(self, game_id: str | None = None) -> None:
+        """
+        Writes pending changes of one game, or of every game, to the database.
+        Failed writes are re-queued for the next flush.
+        """
+        game_ids = [game_id] if game_id is not None else list(self._dirty)
+        pending = [
+            (gid, update)
+            for gid in game_ids
+            if (update := self._build_update(gid)) is not None
+        ]
+        results = await asyncio.gather(
+            *(games.update_one(self._filter(gid), update) for gid, update in pending),
+            return_exceptions=True,
+        )
+        for (gid, update), result in zip(pending, results):
+            if isinstance(result, BaseException):
+                print(f"Failed to flush game {gid}: {result}")
+                paths = [*update.get("$set", {}), *update.get("$unset", {})]
+                self._dirty.setdefault(gid, set()).update(paths)
+            elif gid in self.fences and not result.matched_count:
+                print(f"Game {gid} is owned by another worker now, dropping it")
+                self.stats["fenced_writes"] += 1
+                self.discard(gid)
+
+    def _filter(self, game_id: str) -> dict[str, Any]:
+        if game_id not in self.fences:
+            return {"_id": game_id}
+        return {"_id": game_id, "owner_epoch": {"$lte": self.fences[game_id]}}
+
+    def _ensure_flusher(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._flush_loop()
+            )
+
+    async def _flush_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self) -> None:
+        """
+        Stops the background flusher and persists everything still pending.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def evict(self, game_id: str) -> bool:
+        """
+        Drops a game from memory if all of its changes have been persisted.
+        """
+        if game_id in self._dirty:
+            return False
+        self.games.pop(game_id, None)
+        self.fences.pop(game_id, None)
+        event_log.forget(game_id)
+        return True
+
+    def discard(self, game_id: str) -> None:
+        """
+        Forgets a game together with its unsaved changes.
+        """
+        self.games.pop(game_id, None)
+        self.fences.pop(game_id, None)
+        self._dirty.pop(game_id, None)
+        event_log.discard(game_id)
+
+    def join(self, game_id: str, player_name: str, team_id: str) -> None:
+        game = self.games[game_id]
+        # Finished games keep their final teams and scores.
+        if game.get("game_state") == "finished":
+            return
+        team = game["teams"][team_id]
+        prefix = f"teams.{team_id}"
+        if player_name not in team.setdefault("players", []):
+            team["players"].append(player_name)
+            self.mark(game_id, f"{prefix}.players")
+            event_log.emit(game_id, "joined", team_id=team_id, player=player_name)
+        if player_name not in team.setdefault("scores", {}):
+            team["scores"][player_name] = 0
+            self.mark(game_id, f"{prefix}.scores.{player_name}")
+        if not game.get("rotate_masters") and not team.get("current_master"):
+            team["current_master"] = player_name
+            self.mark(game_id, f"{prefix}.current_master")
+
+    def leave(self, game_id: str, player_name: str, team_id: str) -> None:
+        game = self.games[game_id]
+        if game.get("game_state") == "finished":
+            return
+        team = game["teams"][team_id]
+        prefix = f"teams.{team_id}"
+        is_master = team.get("current_master") == player_name
+        if player_name in team.get("players", []):
+            team["players"].remove(player_name)
+            event_log.emit(game_id, "left", team_id=team_id, player=player_name)
+        team.get("scores", {}).pop(player_name, None)
+        self.mark(game_id, f"{prefix}.players", f"{prefix}.scores.{player_name}")
+        if is_master:
+            team["current_master"] = choose_master(game, team)
+            self.mark(game_id, f"{prefix}.current_master")
+
+    def switch_team(
+        self, game_id: str, player_name: str, team_id: str, new_team_id: str
+    ) -> bool:
+        game = self.games[game_id]
+        if (
+            game["game_state"] != "pending"
+            or not new_team_id
+            or new_team_id == team_id
+            or new_team_id not in game["teams"]
+        ):
+            return False
+
+        team = game["teams"][team_id]
+        prefix = f"teams.{team_id}"
+        if player_name in team.get("players", []):
+            team["players"].remove(player_name)
+        team.get("scores", {}).pop(player_name, None)
+        team.get("player_attempts", {}).pop(player_name, None)
+        self.mark(
+            game_id,
+            f"{prefix}.players",
+            f"{prefix}.scores.{player_name}",
+            f"{prefix}.player_attempts.{player_name}",
+        )
+        if team.get("current_master") == player_name:
+            team["current_master"] = choose_master(game, team)
+            self.mark(game_id, f"{prefix}.current_master")
+
+        new_team = game["teams"][new_team_id]
+        new_prefix = f"teams.{new_team_id}"
+        if player_name not in new_team.setdefault("players", []):
+            new_team["players"].append(player_name)
+        new_team.setdefault("scores", {})[player_name] = 0
+        event_log.emit(
+            game_id,
+            "switched_team",
+            team_id=team_id,
+            new_team_id=new_team_id,
+            player=player_name,
+        )
+        self.mark(
+            game_id, f"{new_prefix}.players", f"{new_prefix}.scores.{player_name}"
+        )
+        if not game.get("rotate_masters") and not new_team.get("current_master"):
+            new_team["current_master"] = player_name
+            self.mark(game_id, f"{new_prefix}.current_master")
+        return True
+
+    def start_game(self, game_id: str) -> bool:
+        game = self.games[game_id]
+        if game["game_state"] != "pending":
+            return False
+        game["game_state"] = "in_progress"
+        self.mark(game_id, "game_state")
+        event_log.emit(game_id, "started")
+        for team_id, team in game["teams"].items():
+            if team.get("state") == "pending" and words_left(team) > 0:
+                self.advance_word(game_id, team_id)
+        return True
+
+    def stop_game(self, game_id: str) -> None:
+        game = self.games[game_id]
+        if game["game_state"] == "finished":
+            return
+        game["game_state"] = "finished"
+        game["winning_team"] = determine_winning_team(game)
+        game["finished_at"] = datetime.now(UTC)
+        self.mark(game_id, "game_state", "winning_team", "finished_at")
+        event_log.emit(game_id, FINISHED, winning_team=game["winning_team"])
+
+    def advance_word(self, game_id: str, team_id: str) -> None:
+        game = self.games[game_id]
+        advance_team_word(game, team_id, game["time_for_guessing"])
+        self.mark(game_id, *(f"teams.{team_id}.{field}" for field in WORD_FIELDS))
+        if finish_if_all_teams_done(game):
+            self.mark(game_id, "game_state", "winning_team", "finished_at")
+
+    def skip(self, game_id: str, player_name: str, team_id: str) -> bool:
+        game = self.games[game_id]
+        if (
+            game.get("game_state") != "in_progress"
+            or game["teams"][team_id].get("current_master") != player_name
+        ):
+            return False
+        self.advance_word(game_id, team_id)
+        return True
+
+    def guess(self, game_id: str, player_name: str, team_id: str, guess: str) -> bool:
+        """
+        Applies a guess and returns whether it was accepted as an attempt.
+        """
+        game = self.games[game_id]
+        team = game["teams"][team_id]
+        prefix = f"teams.{team_id}"
+
+        if (
+            game.get("game_state") != "in_progress"
+            or team.get("state") != "in_progress"
+            or team.get("current_master") == player_name
+            or player_name in team.get("correct_players", [])
+        ):
+            return False
+
+        attempts = team.setdefault("player_attempts", {})
+        tries_per_player = game.get("tries_per_player", 0)
+        if tries_per_player > 0 and attempts.get(player_name, 0) >= tries_per_player:
+            return False
+
+        expires_at = team.get("expires_at")
+        if expires_at and datetime.now(UTC) > expires_at.replace(tzinfo=UTC):
+            return False
+
+        attempts[player_name] = attempts.get(player_name, 0) + 1
+        self.mark(game_id, f"{prefix}.player_attempts.{player_name}")
+
+        correct = guess == (team.get("current_word") or "").lower()
+        # The guess itself is left out, since a right one is the word.
+        event_log.emit(
+            game_id, "guess", team_id=team_id, player=player_name, correct=correct
+        )
+        if not correct:
+            return True
+
+        scores = team.setdefault("scores", {})
+        scores[player_name] = scores.get(player_name, 0) + 1
+        team["current_correct"] = team.get("current_correct", 0) + 1
+        team.setdefault("correct_players", []).append(player_name)
+        self.mark(
+            game_id,
+            f"{prefix}.scores.{player_name}",
+            f"{prefix}.current_correct",
+            f"{prefix}.correct_players",
+        )
+        if team["current_correct"] >= required_to_advance(team):
+            self.advance_word(game_id, team_id)
+        return True
+
+
+engine = GameEngine()
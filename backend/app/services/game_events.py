@@ -0,0 +1,198 @@
+"""Append-only log of what happens in each team game.
+
+The worker that owns a game records its events (players joining and leaving,
+the game starting, guesses, teams moving on to another word, the game
+finishing) with `emit`, which costs no database round-trip. Events are
+written behind to ``game_log`` in batches, where each one gets the next
+offset of its game, so that consumers can stream them instead of polling
+game documents. The log is kept apart from ``game_events``, which carries the
+game bus's messages between workers.
+
+Consumers read a game's events from any offset with `read`, or follow them
+with `follow`, which keeps yielding new events until the game finishes or
+is gone. A consumer that stops can carry on later from the offset after the last event
+it saw. Events never contain the word being guessed.
+"""
+
+import asyncio
+from collections import Counter
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from typing import Any
+
+from pymongo import ASCENDING, DESCENDING
+
+from backend.app.config import (
+    GAME_EVENTS_PAGE_SIZE,
+    GAME_EVENTS_POLL_SECONDS,
+    GAME_FLUSH_INTERVAL,
+)
+from backend.app.db import db
+
+events = db.game_log
+games = db.games
+
+# The last event of every game that finished
+FINISHED = "finished"
+
+
+class GameEventLog:
+    """
+    Buffers the events emitted by this worker and appends them to the log.
+    `stats` counts events written and batches that failed to be.
+    """
+
+    def __init__(self, flush_interval: float = GAME_FLUSH_INTERVAL) -> None:
+        self.flush_interval = flush_interval
+        self.stats: Counter[str] = Counter()
+        self._pending: dict[str, list[dict[str, Any]]] = {}
+        # Offset of the next event of each game this worker has written to
+        self._next_offsets: dict[str, int] = {}
+        # Set when events of a game are written, for the games followed here
+        self._arrivals: dict[str, asyncio.Event] = {}
+        self._followers: Counter[str] = Counter()
+        self._lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    def emit(self, game_id: str, kind: str, **data: Any) -> None:
+        """
+        Records an event of a game owned by this worker.
+        """
+        event = {"kind": kind, "at": datetime.now(UTC), **data}
+        self._pending.setdefault(game_id, []).append(event)
+        self._ensure_flusher()
+
+    async def _next_offset(self, game_id: str) -> int:
+        if game_id not in self._next_offsets:
+            last = await events.find_one(
+                {"game_id": game_id}, {"offset": 1}, sort=[("offset", DESCENDING)]
+            )
+            self._next_offsets[game_id] = last["offset"] + 1 if last else 0
+        return self._next_offsets[game_id]
+
+    async def flush(self) -> None:
+        """
+        Appends the pending events of every game to the log. Failed batches
+        are re-queued ahead of newer events for the next flush.
+        """
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            for game_id, batch in pending.items():
+                try:
+                    offset = await self._next_offset(game_id)
+                    await events.insert_many(
+                        [
+                            {"game_id": game_id, "offset": offset + i, **event}
+                            for i, event in enumerate(batch)
+                        ]
+                    )
+                except Exception as e:
+                    print(f"Failed to write events of game {game_id}: {e}")
+                    self.stats["failed_batches"] += 1
+                    # The offset is read again in case some of them were taken.
+                    self._next_offsets.pop(game_id, None)
+                    self._pending[game_id] = batch + self._pending.get(game_id, [])
+                    continue
+                self._next_offsets[game_id] = offset + len(batch)
+                self.stats["events"] += len(batch)
+                if arrival := self._arrivals.pop(game_id, None):
+                    arrival.set()
+
+    def _ensure_flusher(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._flush_loop()
+            )
+
+    async def _flush_loop(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self) -> None:
+        """
+        Stops the background flusher and writes everything still pending.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def forget(self, game_id: str) -> None:
+        """
+        Forgets the offset of a game that this worker no longer owns, so that
+        it is read again should the game come back.
+        """
+        self._next_offsets.pop(game_id, None)
+
+    def discard(self, game_id: str) -> None:
+        """
+        Forgets a game together with its unwritten events, for a game that
+        another worker has taken over.
+        """
+        self.forget(game_id)
+        self._pending.pop(game_id, None)
+
+    async def read(
+        self, game_id: str, offset: int = 0, limit: int = GAME_EVENTS_PAGE_SIZE
+    ) -> list[dict[str, Any]]:
+        """
+        Returns the events of a game from the given offset on, oldest first.
+        """
+        found = (
+            events.find(
+                {"game_id": game_id, "offset": {"$gte": offset}},
+                {"_id": 0, "game_id": 0},
+            )
+            .sort("offset", ASCENDING)
+            .limit(limit)
+        )
+        return await found.to_list(None)
+
+    async def _game_over(self, game_id: str) -> bool:
+        game = await games.find_one({"_id": game_id}, {"game_state": 1})
+        return game is None or game.get("game_state") == "finished"
+
+    async def follow(
+        self,
+        game_id: str,
+        offset: int = 0,
+        poll_seconds: float = GAME_EVENTS_POLL_SECONDS,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yields the events of a game from the given offset on as they are
+        written, and stops after the event of the game finishing. Events
+        written by this worker are yielded as soon as they are written, and
+        those of other workers within `poll_seconds`. Games that were deleted,
+        or that finished without their last event being written, stop being
+        followed after the events written until then.
+        """
+        self._followers[game_id] += 1
+        try:
+            over = False
+            while True:
+                # Waited on before reading, so that no write in between is missed
+                arrival = self._arrivals.setdefault(game_id, asyncio.Event())
+                batch = await self.read(game_id, offset)
+                for event in batch:
+                    yield event
+                    if event["kind"] == FINISHED:
+                        return
+                if batch:
+                    offset = batch[-1]["offset"] + 1
+                    continue
+                if over:
+                    return
+                try:
+                    await asyncio.wait_for(arrival.wait(), poll_seconds)
+                except TimeoutError:
+                    # Read once more should it be over, for events written since.
+                    over = await self._game_over(game_id)
+        finally:
+            self._followers[game_id] -= 1
+            if not self._followers[game_id]:
+                del self._followers[game_id]
+                self._arrivals.pop(game_id, None)
+
+
+event_log = GameEventLog()
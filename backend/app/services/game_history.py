@@ -0,0 +1,75 @@
+"""Lifecycle of team and AI games once they are over.
+
+Games only stay in ``games`` and ``aigames`` while they are played and for a
+short while after. TTL indexes on ``finished_at`` and ``last_activity_at``
+delete finished and abandoned games, which keeps the live collections small
+and hands their codes back to new games. The results of finished games are
+archived beforehand to the compact ``game_history`` collection, where they
+can still be looked up by code.
+"""
+
+from typing import Any
+
+from pymongo import DESCENDING
+
+from backend.app.db import db
+
+history = db.game_history
+
+# Lifecycle timestamps stored on games but not sent to clients
+LIFECYCLE_FIELDS = ("created_at", "last_activity_at", "finished_at")
+
+
+async def _archive(kind: str, game_id: str, game: dict[str, Any], **results):
+    # Archiving is idempotent: the first record of a game run is kept, and a
+    # recycled code gets a new record since its game has a new creation time.
+    await history.update_one(
+        {"kind": kind, "code": game_id, "created_at": game.get("created_at")},
+        {"$setOnInsert": {"finished_at": game.get("finished_at"), **results}},
+        upsert=True,
+    )
+
+
+async def archive_game(game_id: str, game: dict[str, Any]) -> None:
+    """
+    Stores the deck reference and seed, team names and scores, and winner
+    of a finished team game. The teams' seeds and guessing state are left
+    out.
+    """
+    teams = {
+        team_id: {"name": team["name"], "scores": team.get("scores", {})}
+        for team_id, team in game.get("teams", {}).items()
+    }
+    await _archive(
+        "game",
+        game_id,
+        game,
+        deck_ref=game.get("deck_ref"),
+        seed=game.get("seed"),
+        words_amount=game.get("words_amount", 0),
+        teams=teams,
+        winning_team=game.get("winning_team"),
+    )
+
+
+async def archive_aigame(game_id: str, game: dict[str, Any]) -> None:
+    """
+    Stores the score of a finished AI game and how many words it had.
+    """
+    await _archive(
+        "aigame",
+        game_id,
+        game,
+        words_amount=game.get("words_amount", 0),
+        score=game.get("score", 0),
+    )
+
+
+async def find_game_results(game_id: str) -> dict[str, Any] | None:
+    """
+    Returns the archived results of the latest finished team game that had
+    the given code.
+    """
+    return await history.find_one(
+        {"kind": "game", "code": game_id}, sort=[("finished_at", DESCENDING)]
+    )
@@ -1,28 +1,216 @@
-from asyncio import Lock
+import asyncio
+import json
 from datetime import UTC, datetime, timedelta
-from typing import Any, cast
+from typing import Any
 
 from fastapi import WebSocket
-from pymongo import ReturnDocument
 
+from backend.app.config import WS_MAX_RESYNCS, WS_SEND_QUEUE_SIZE
 from backend.app.db import db
-from backend.app.models import GameState, PlayerGameState, TeamStateForHost
+from backend.app.models import GameState, TeamStateForHost, TeamStateForPlayers
+from backend.app.services.game_events import FINISHED, event_log
+from backend.app.services.word_lists import load_words, store_words
+from backend.app.shuffles import permuted
 
 games = db.games
 decks = db.decks
 
 
+# Team fields rewritten when a team moves on to its next word. The team's
+# `seed` for the order of the game's words never changes; `word_index` counts
+# how many were drawn. Games created before seeds keep the stored `order` of
+# each team and `picks` of the game instead, and are played in that order.
+WORD_FIELDS = (
+    "current_word",
+    "word_index",
+    "expires_at",
+    "current_correct",
+    "player_attempts",
+    "correct_players",
+    "state",
+    "current_master",
+)
+
+
+def words_left(team_state: dict[str, Any]) -> int:
+    words_amount = team_state.get("words_amount", len(team_state.get("order", [])))
+    return words_amount - team_state.get("word_index", 0)
+
+
+def drawn_word(deck: list[str], game: dict[str, Any], step: int) -> str:
+    """
+    Returns the word of the stored deck that a game draws at the given step
+    of its seeded order, or of its stored picks if it has no seed.
+    """
+    if "seed" not in game:
+        return deck[game["picks"][step]]
+    return deck[permuted(game["seed"], len(deck), step)]
+
+
+async def game_words(game: dict[str, Any]) -> list[str]:
+    """
+    Returns the words a game is played with, in the game's order. Games
+    refer to the stored word list they were created from and derive their
+    words from a seed; archived games from before that embed their words.
+    """
+    if "deck_ref" not in game:
+        return game.get("deck", [])
+    deck = await load_words(game["deck_ref"])
+    if "seed" not in game:
+        return [deck[i] for i in game.get("picks", [])]
+    amount = min(game.get("words_amount", 0), len(deck))
+    return [drawn_word(deck, game, step) for step in range(amount)]
+
+
+async def backfill_game_decks() -> None:
+    """
+    Moves the words of games that embed their deck into the word list store.
+    Such games were created before games referred to stored word lists, and
+    each of their teams pops its next word off its `remaining_words`. The
+    game keeps its deck in stored order as `picks`, and each team keeps the
+    positions of its remaining words as its `order`.
+    """
+    legacy = {"deck_ref": {"$exists": False}, "deck": {"$exists": True}}
+    async for game in games.find(legacy):
+        deck = game["deck"]
+        positions = {word: i for i, word in reversed(list(enumerate(deck)))}
+        to_set: dict[str, Any] = {
+            "deck_ref": await store_words(deck),
+            "picks": list(range(len(deck))),
+        }
+        to_unset = {"deck": ""}
+        for team_id, team in game.get("teams", {}).items():
+            prefix = f"teams.{team_id}"
+            remaining = team.get("remaining_words", [])
+            to_set[f"{prefix}.order"] = [
+                positions[word] for word in remaining if word in positions
+            ]
+            to_set[f"{prefix}.word_index"] = 0
+            to_unset[f"{prefix}.remaining_words"] = ""
+        await games.update_one(
+            {"_id": game["_id"], **legacy}, {"$set": to_set, "$unset": to_unset}
+        )
+
+
 def required_to_advance(team_state: dict) -> int:
     names = set(team_state.get("scores", {}).keys())
     names.discard(team_state.get("current_master"))
     return min(team_state.get("right_answers_to_advance", 1), len(names))
 
 
+def diff_state(
+    old: dict[str, Any], new: dict[str, Any]
+) -> tuple[dict[str, Any], list[list[str]]]:
+    """
+    Computes a patch turning `old` into `new`.
+    Returns the changed values as a nested dict, where only dicts are recursed
+    into, and the key paths that were removed.
+    """
+    changes: dict[str, Any] = {}
+    removed: list[list[str]] = [[key] for key in old if key not in new]
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested_changes, nested_removed = diff_state(previous, value)
+            if nested_changes:
+                changes[key] = nested_changes
+            removed.extend([key, *path] for path in nested_removed)
+        elif key not in old or previous != value:
+            changes[key] = value
+    return changes, removed
+
+
+class Outbox:
+    """
+    Bounded send queue of one WebSocket, drained by its own task so that a
+    slow client never holds up the broadcast or the other connections.
+    Messages are queued already encoded.
+    """
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(WS_SEND_QUEUE_SIZE)
+        self.resyncs = 0
+        self.task = asyncio.create_task(self._drain())
+
+    def put(self, message: str) -> bool:
+        """
+        Queues a message without waiting. Returns False if the queue is full.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def replace(self, message: str) -> None:
+        """
+        Drops everything still queued and queues `message` instead.
+        """
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(message)
+
+    async def _drain(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                await self.websocket.send_text(message)
+            except Exception as e:
+                print(f"Failed to send to a game socket: {e}")
+            finally:
+                self.queue.task_done()
+            if self.queue.empty():
+                self.resyncs = 0
+
+    def close(self) -> None:
+        self.task.cancel()
+
+
+class StateStream:
+    """
+    One view of a game shared by several sockets: the host's, or a team's as
+    seen by its players. The view is diffed and JSON-encoded once per
+    broadcast, however many sockets follow it.
+    """
+
+    def __init__(self) -> None:
+        self.state: dict[str, Any] = {}
+        self.version = 0
+        self.previous_version: int | None = None
+        self.encoded_state = "{}"
+        self.encoded_patch: str | None = None
+
+    def update(self, state: dict[str, Any], version: int) -> None:
+        changes, removed = diff_state(self.state, state)
+        if self.version and not changes and not removed:
+            self.encoded_patch = None
+            return
+        patch = f'"changes":{json.dumps(changes)}'
+        if removed:
+            patch += f',"removed":{json.dumps(removed)}'
+        self.encoded_patch = patch
+        self.previous_version = self.version or None
+        self.version = version
+        self.state = state
+        self.encoded_state = json.dumps(state)
+
+
 class ConnectionManager:
     def __init__(self) -> None:
         self.hosts: dict[str, WebSocket] = {}
         self.players: dict[str, list[tuple[WebSocket, str, str]]] = {}
-        self.locks: dict[str, Lock] = {}
+        self.versions: dict[str, int] = {}
+        # Latest game state broadcast, whichever worker owns the game
+        self.latest: dict[str, dict[str, Any]] = {}
+        self.streams: dict[str, dict[str, StateStream]] = {}
+        # Stream key and version of the last view each socket was sent
+        self.sent_views: dict[WebSocket, tuple[str, int]] = {}
+        # Per-player fields last sent to each socket, outside the shared view
+        self.sent_own: dict[WebSocket, dict[str, Any]] = {}
+        self.outboxes: dict[WebSocket, Outbox] = {}
+        self._closing: set[asyncio.Task] = set()
 
     async def connect_host(self, websocket: WebSocket, game_id: str) -> bool:
         if game_id in self.hosts:
@@ -30,7 +218,6 @@ class ConnectionManager:
             return False
         await websocket.accept()
         self.hosts[game_id] = websocket
-        self.locks[game_id] = Lock()
         return True
 
     async def connect_player(
@@ -39,10 +226,17 @@ class ConnectionManager:
         await websocket.accept()
         self.players.setdefault(game_id, []).append((websocket, player_name, team_id))
 
+    def _forget_socket(self, websocket: WebSocket) -> None:
+        self.sent_views.pop(websocket, None)
+        self.sent_own.pop(websocket, None)
+        if outbox := self.outboxes.pop(websocket, None):
+            outbox.close()
+
     def disconnect(self, game_id: str, websocket: WebSocket) -> str | None:
+        self._forget_socket(websocket)
         if self.hosts.get(game_id) is websocket:
             del self.hosts[game_id]
-            self.locks.pop(game_id, None)
+            self._forget_game(game_id)
             return None
 
         removed_player = None
@@ -54,11 +248,22 @@ class ConnectionManager:
                 else:
                     remaining_players.append(conn)
             self.players[game_id] = remaining_players
+        self._forget_game(game_id)
         return removed_player
 
+    def _forget_game(self, game_id: str) -> None:
+        if not self.has_connections(game_id):
+            self.versions.pop(game_id, None)
+            self.latest.pop(game_id, None)
+            self.streams.pop(game_id, None)
+
+    def has_connections(self, game_id: str) -> bool:
+        return game_id in self.hosts or bool(self.players.get(game_id))
+
     async def disconnect_all_players(self, game_id: str):
         if game_id in self.players:
             for ws, _, _ in self.players[game_id]:
+                self._forget_socket(ws)
                 await ws.close(code=1012, reason="Host disconnected")
             del self.players[game_id]
 
@@ -71,95 +276,180 @@ class ConnectionManager:
                     self.players[game_id][i] = (ws, name, new_team_id)
                     break
 
-    async def broadcast_state(self, game_id: str, game: dict[str, Any]) -> None:
-        if host_ws := self.hosts.get(game_id):
-            host_teams_state = {
-                team_id: TeamStateForHost(
-                    **team_data,
-                    remaining_words_count=len(team_data.get("remaining_words", [])),
-                )
-                for team_id, team_data in game.get("teams", {}).items()
-            }
-            host_state = GameState(
-                game_state=game.get("game_state", "pending"),
-                teams=host_teams_state,
-                winning_team=game.get("winning_team"),
-            ).model_dump(mode="json")
-            await host_ws.send_json(host_state)
-
-        all_teams_scores = {
+    @staticmethod
+    def _host_state(game: dict[str, Any]) -> dict[str, Any]:
+        host_teams_state = {
+            team_id: TeamStateForHost(
+                **team_data,
+                remaining_words_count=words_left(team_data),
+            )
+            for team_id, team_data in game.get("teams", {}).items()
+        }
+        return GameState(
+            game_state=game.get("game_state", "pending"),
+            teams=host_teams_state,
+            winning_team=game.get("winning_team"),
+        ).model_dump(mode="json")
+
+    @staticmethod
+    def _team_state(
+        game: dict[str, Any], team_id: str, all_teams_scores: dict[str, int]
+    ) -> dict[str, Any]:
+        team_data = game["teams"][team_id]
+        return TeamStateForPlayers(
+            game_state=game.get("game_state", "pending"),
+            team_id=team_id,
+            team_name=team_data.get("name"),
+            expires_at=team_data.get("expires_at"),
+            remaining_words_count=words_left(team_data),
+            current_word=team_data.get("current_word"),
+            current_master=team_data.get("current_master"),
+            team_scores=team_data.get("scores", {}),
+            all_teams_scores=all_teams_scores,
+            players_in_team=team_data.get("players", []),
+            winning_team=game.get("winning_team"),
+        ).model_dump(mode="json")
+
+    @staticmethod
+    def _own_state(game: dict[str, Any], name: str, team_id: str) -> dict[str, Any]:
+        attempts = game["teams"][team_id].get("player_attempts", {}).get(name, 0)
+        tries_left = (
+            (game["tries_per_player"] - attempts)
+            if game.get("tries_per_player", 0) > 0
+            else None
+        )
+        return {"tries_left": tries_left}
+
+    @staticmethod
+    def _all_teams_scores(game: dict[str, Any]) -> dict[str, int]:
+        return {
             t["name"]: sum(t.get("scores", {}).values())
             for t in game.get("teams", {}).values()
         }
-        for ws, name, p_team_id in self.players.get(game_id, []):
-            if not (team_data := game["teams"].get(p_team_id)):
-                continue
 
-            attempts = team_data.get("player_attempts", {}).get(name, 0)
-            tries_left = (
-                (game["tries_per_player"] - attempts)
-                if game.get("tries_per_player", 0) > 0
-                else None
-            )
+    def _stream(self, game_id: str, key: str) -> StateStream:
+        return self.streams.setdefault(game_id, {}).setdefault(key, StateStream())
 
-            player_state = PlayerGameState(
-                game_state=game.get("game_state", "pending"),
-                team_id=p_team_id,
-                team_name=team_data.get("name"),
-                expires_at=team_data.get("expires_at"),
-                remaining_words_count=len(team_data.get("remaining_words", [])),
-                tries_left=tries_left,
-                current_word=team_data.get("current_word"),
-                current_master=team_data.get("current_master"),
-                team_scores=team_data.get("scores", {}),
-                all_teams_scores=all_teams_scores,
-                players_in_team=team_data.get("players", []),
-                winning_team=game.get("winning_team"),
-            ).model_dump(mode="json")
-            await ws.send_json(player_state)
+    def _send_view(
+        self,
+        websocket: WebSocket,
+        key: str,
+        stream: StateStream,
+        version: int,
+        own: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        Queues a full snapshot for a socket that is not in sync with the view
+        it follows, and otherwise the view's shared patch, if there is one,
+        plus any per-player fields that changed.
+        A socket whose queue overflows gets its backlog replaced with a
+        snapshot, and is closed if it keeps falling behind.
+        """
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            outbox = self.outboxes[websocket] = Outbox(websocket)
+
+        own_part = f',"self":{json.dumps(own)}' if own is not None else ""
+        snapshot = (
+            f'{{"type":"snapshot","version":{version},'
+            f'"state":{stream.encoded_state}{own_part}}}'
+        )
+        sent_view = self.sent_views.get(websocket)
+        sent_own = self.sent_own.get(websocket)
+        self.sent_views[websocket] = (key, stream.version)
+        if own is not None:
+            self.sent_own[websocket] = own
+
+        if sent_view is None or sent_view[0] != key:
+            outbox.replace(snapshot)
+            return
+
+        if sent_view[1] == stream.version:
+            if own is None or own == sent_own:
+                return
+            message = f'{{"type":"patch","version":{version},"changes":{{}}{own_part}}}'
+        elif sent_view[1] == stream.previous_version and stream.encoded_patch:
+            if own == sent_own:
+                own_part = ""
+            message = (
+                f'{{"type":"patch","version":{version},'
+                f"{stream.encoded_patch}{own_part}}}"
+            )
+        else:
+            message = snapshot
+
+        if outbox.put(message):
+            return
+
+        outbox.resyncs += 1
+        if outbox.resyncs > WS_MAX_RESYNCS:
+            self._drop(websocket)
+        else:
+            outbox.replace(snapshot)
+
+    def _drop(self, websocket: WebSocket) -> None:
+        self._forget_socket(websocket)
+        # The socket's handler notices the close and cleans up after itself.
+        task = asyncio.create_task(
+            websocket.close(code=1013, reason="Connection too slow")
+        )
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
+    def _next_version(self, game_id: str) -> int:
+        self.versions[game_id] = self.versions.get(game_id, 0) + 1
+        return self.versions[game_id]
 
-manager = ConnectionManager()
-
+    async def broadcast_state(self, game_id: str, game: dict[str, Any]) -> None:
+        self.latest[game_id] = game
+        version = self._next_version(game_id)
+        if host_ws := self.hosts.get(game_id):
+            stream = self._stream(game_id, "host")
+            stream.update(self._host_state(game), version)
+            self._send_view(host_ws, "host", stream, version)
 
-async def add_player_to_game(game_id: str, player_name: str, team_id: str):
-    await games.update_one(
-        {"_id": game_id, f"teams.{team_id}.players": {"$ne": player_name}},
-        {"$addToSet": {f"teams.{team_id}.players": player_name}},
-    )
-    await games.update_one(
-        {"_id": game_id, f"teams.{team_id}.scores.{player_name}": {"$exists": False}},
-        {"$set": {f"teams.{team_id}.scores.{player_name}": 0}},
-    )
-    game = cast(dict[str, Any], await games.find_one({"_id": game_id}))
-    if not game.get("rotate_masters") and not game["teams"][team_id].get(
-        "current_master"
-    ):
-        await games.update_one(
-            {"_id": game_id, f"teams.{team_id}.current_master": None},
-            {"$set": {f"teams.{team_id}.current_master": player_name}},
-        )
-    return await games.find_one({"_id": game_id})
+        all_teams_scores = self._all_teams_scores(game)
+        updated: set[str] = set()
+        for ws, name, p_team_id in self.players.get(game_id, []):
+            if p_team_id not in game["teams"]:
+                continue
+            stream = self._stream(game_id, p_team_id)
+            if p_team_id not in updated:
+                stream.update(
+                    self._team_state(game, p_team_id, all_teams_scores), version
+                )
+                updated.add(p_team_id)
+            own = self._own_state(game, name, p_team_id)
+            self._send_view(ws, p_team_id, stream, version, own)
 
+    async def resync(
+        self, game_id: str, websocket: WebSocket, game: dict[str, Any]
+    ) -> None:
+        """
+        Sends a fresh snapshot to a client that lost track of the state.
+        """
+        self.sent_views.pop(websocket, None)
+        version = self.versions.get(game_id, 0)
+        if self.hosts.get(game_id) is websocket:
+            stream = self._stream(game_id, "host")
+            if not stream.version:
+                stream.update(self._host_state(game), version)
+            self._send_view(websocket, "host", stream, version)
+            return
+        for ws, name, team_id in self.players.get(game_id, []):
+            if ws is websocket and team_id in game["teams"]:
+                stream = self._stream(game_id, team_id)
+                if not stream.version:
+                    stream.update(
+                        self._team_state(game, team_id, self._all_teams_scores(game)),
+                        version,
+                    )
+                own = self._own_state(game, name, team_id)
+                self._send_view(ws, team_id, stream, version, own)
+                return
 
-async def remove_player_from_game(game_id: str, player_name: str, team_id: str):
-    game = cast(dict[str, Any], await games.find_one({"_id": game_id}))
-    if not game:
-        return None
 
-    await games.update_one(
-        {"_id": game_id},
-        {
-            "$pull": {f"teams.{team_id}.players": player_name},
-            "$unset": {
-                f"teams.{team_id}.scores.{player_name}": "",
-                f"teams.{team_id}.player_attempts.{player_name}": "",
-            },
-        },
-    )
-    if game["teams"][team_id].get("current_master") == player_name:
-        await reassign_master(game_id, team_id)
-    return await games.find_one({"_id": game_id})
+manager = ConnectionManager()
 
 
 def _get_next_master_circular(
@@ -178,24 +468,13 @@ def _get_next_master_circular(
         return players[0]
 
 
-async def reassign_master(game_id: str, team_id: str):
-    game = await games.find_one({"_id": game_id})
-    if not game or not (team_state := game.get("teams", {}).get(team_id)):
-        return
-
+def choose_master(game: dict[str, Any], team_state: dict[str, Any]) -> str | None:
     players = team_state.get("players", [])
     if not players:
-        new_master = None
-    elif game.get("rotate_masters"):
-        new_master = _get_next_master_circular(
-            team_state.get("current_master"), players
-        )
-    else:
-        new_master = players[0]
-
-    await games.update_one(
-        {"_id": game_id}, {"$set": {f"teams.{team_id}.current_master": new_master}}
-    )
+        return None
+    if game.get("rotate_masters"):
+        return _get_next_master_circular(team_state.get("current_master"), players)
+    return players[0]
 
 
 def determine_winning_team(game: dict[str, Any]) -> str | None:
@@ -222,27 +501,31 @@ def determine_winning_team(game: dict[str, Any]) -> str | None:
         min_remaining_words = float("inf")
         final_winner = None
         for team_id in winning_teams:
-            remaining_words_count = len(
-                game.get("teams", {}).get(team_id, {}).get("remaining_words", [])
-            )
+            remaining_words_count = words_left(game.get("teams", {}).get(team_id, {}))
             if remaining_words_count < min_remaining_words:
                 min_remaining_words = remaining_words_count
                 final_winner = team_id
         return final_winner
 
 
-async def process_new_word(game_id: str, team_id: str, sec: int) -> dict[str, Any]:
-    game = cast(dict[str, Any], await games.find_one({"_id": game_id}))
+def advance_team_word(game: dict[str, Any], team_id: str, sec: int) -> None:
     team_state = game["teams"][team_id]
 
-    new_word = (
-        team_state["remaining_words"].pop(0)
-        if team_state.get("remaining_words")
-        else None
-    )
+    word_index = team_state.get("word_index", 0)
+    new_word = None
+    if words_left(team_state) > 0:
+        if "seed" in team_state:
+            position = permuted(
+                team_state["seed"], team_state["words_amount"], word_index
+            )
+        else:
+            position = team_state["order"][word_index]
+        new_word = game["deck"][position]
+        word_index += 1
     team_state.update(
         {
             "current_word": new_word,
+            "word_index": word_index,
             "expires_at": (
                 datetime.now(UTC) + timedelta(seconds=sec) if new_word else None
             ),
@@ -260,23 +543,21 @@ async def process_new_word(game_id: str, team_id: str, sec: int) -> dict[str, An
     elif not team_state.get("current_master") and team_state["players"]:
         team_state["current_master"] = team_state["players"][0]
 
-    updated_game = cast(
-        dict[str, Any],
-        await games.find_one_and_update(
-            {"_id": game_id},
-            {"$set": {f"teams.{team_id}": team_state}},
-            return_document=ReturnDocument.AFTER,
-        ),
+    event_log.emit(
+        game["_id"],
+        "word_advanced",
+        team_id=team_id,
+        word_index=word_index,
+        words_left=words_left(team_state),
+        master=team_state.get("current_master"),
     )
 
-    if all(
-        t.get("state") == "finished" for t in updated_game.get("teams", {}).values()
-    ):
-        winning_team_id = determine_winning_team(updated_game)
-        await games.update_one(
-            {"_id": game_id},
-            {"$set": {"game_state": "finished", "winning_team": winning_team_id}},
-        )
-        updated_game = cast(dict[str, Any], await games.find_one({"_id": game_id}))
 
-    return updated_game
+def finish_if_all_teams_done(game: dict[str, Any]) -> bool:
+    if not all(t.get("state") == "finished" for t in game.get("teams", {}).values()):
+        return False
+    game["game_state"] = "finished"
+    game["winning_team"] = determine_winning_team(game)
+    game["finished_at"] = datetime.now(UTC)
+    event_log.emit(game["_id"], FINISHED, winning_team=game["winning_team"])
+    return True
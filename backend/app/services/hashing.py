@@ -0,0 +1,67 @@
+"""Password hashing off the event loop.
+
+A bcrypt hash or check takes tens to hundreds of milliseconds of CPU. Run
+inline in a handler it stalls every other coroutine of the worker, live game
+sockets included. ``HashingPool`` runs such calls on a few threads instead;
+bcrypt releases the GIL while it works, so the event loop keeps going. Calls
+beyond the cap wait for a free thread on the event loop, where they are
+counted.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from backend.app.config import PASSWORD_HASH_WORKERS
+
+T = TypeVar("T")
+
+
+class HashingPool:
+    """
+    Runs blocking password hashing calls on at most `workers` threads.
+    `waiting` and `running` give the current queue depth and load, and
+    `stats` counts calls, the time they waited in total, and the deepest
+    queue seen.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS) -> None:
+        self.workers = workers
+        self.waiting = 0
+        self.running = 0
+        self.stats: Counter[str] = Counter()
+        self._slots = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="hashing")
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.stats["peak_waiting"] = max(self.stats["peak_waiting"], self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.stats["wait_ms"] += round((time.perf_counter() - queued_at) * 1000)
+        self.stats["calls"] += 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            **self.stats,
+        }
+
+
+hashing_pool = HashingPool()
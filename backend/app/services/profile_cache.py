@@ -0,0 +1,54 @@
+"""Per-worker cache of the deck listings shown on profiles."""
+
+from backend.app.config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+from backend.app.models import ProfileResponse
+from backend.app.services.ttl_cache import TTLCache
+
+ProfileKey = tuple[str | None, int, int]
+
+
+class ProfileCache:
+    """
+    Cache of profile listings, keyed by user ID and then by the search, skip
+    and limit of the listing.
+
+    The listings of a user expire together, `ttl` seconds after the first of
+    them was cached. Deck changes made by this worker invalidate the listings
+    of the users owning the deck right away.
+    """
+
+    def __init__(self, size: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL):
+        self._users: TTLCache[str, dict[ProfileKey, ProfileResponse]] = TTLCache(
+            size, ttl
+        )
+
+    @property
+    def version(self) -> int:
+        return self._users.version
+
+    def get(self, user_id: str, key: ProfileKey) -> ProfileResponse | None:
+        listings = self._users.get(user_id)
+        return None if listings is None else listings.get(key)
+
+    def put(
+        self, user_id: str, key: ProfileKey, profile: ProfileResponse, version: int
+    ) -> None:
+        """
+        Caches a listing read while the cache was at `version`.
+        """
+        if version != self.version:
+            return
+        listings = self._users.get(user_id)
+        if listings is None:
+            listings = {}
+            self._users.put(user_id, listings, version)
+        listings[key] = profile
+
+    def invalidate(self, *user_ids: str) -> None:
+        self._users.invalidate(*user_ids)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+profile_cache = ProfileCache()
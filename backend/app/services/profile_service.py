@@ -3,23 +3,40 @@ from typing import Any
 from fastapi import HTTPException
 from pymongo import ASCENDING
 
-from backend.app.code_gen import generate_deck_id
+from backend.app.code_gen import insert_with_new_id
 from backend.app.db import db
 from backend.app.models import (
+    CurrentUser,
     DeckDetail,
     DeckIn,
     DeckPreview,
     DeckUpdate,
     ProfileResponse,
-    UserInDB,
 )
+from backend.app.services.auth_service import user_cache
+from backend.app.services.gallery_service import decks_changed
+from backend.app.services.profile_cache import profile_cache
+from backend.app.services.word_lists import resolve_words
 
 users = db.users
 decks = db.decks
 
+# Deck fields the profile lists; the words themselves are only read on demand.
+SUMMARY_FIELDS = {"name": 1, "words_count": 1, "tags": 1}
+
+
+async def backfill_deck_summaries() -> None:
+    """
+    Adds the summary fields to decks saved before decks carried them.
+    """
+    await decks.update_many(
+        {"words_count": {"$exists": False}},
+        [{"$set": {"words_count": {"$size": {"$ifNull": ["$words", []]}}}}],
+    )
+
 
 async def get_profile_service(
-    current_user: UserInDB,
+    current_user: CurrentUser,
     search: str | None = None,
     skip: int = 0,
     limit: int = 100,
@@ -27,6 +44,12 @@ async def get_profile_service(
     """
     Retrieves the current user's profile and their associated decks.
     """
+    key = (search, skip, limit)
+    cached = profile_cache.get(current_user.id, key)
+    if cached is not None:
+        return cached
+    version = profile_cache.version
+
     user_data = await users.find_one({"_id": current_user.id})
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
@@ -40,7 +63,7 @@ async def get_profile_service(
             query["$text"] = {"$search": search}
 
         cursor = (
-            decks.find(query, {"name": 1, "words": 1, "tags": 1})
+            decks.find(query, SUMMARY_FIELDS)
             .sort("name", ASCENDING)
             .skip(skip)
             .limit(limit)
@@ -48,7 +71,7 @@ async def get_profile_service(
 
         user_decks = await cursor.to_list(length=limit)
 
-    return ProfileResponse(
+    profile = ProfileResponse(
         id=user_data["_id"],
         name=user_data["name"],
         surname=user_data["surname"],
@@ -58,43 +81,47 @@ async def get_profile_service(
             DeckPreview(
                 id=deck["_id"],
                 name=deck["name"],
-                words_count=len(deck.get("words", [])),
+                words_count=deck.get("words_count", 0),
                 tags=deck.get("tags"),
             )
             for deck in user_decks
         ],
     )
+    profile_cache.put(current_user.id, key, profile, version)
+    return profile
 
 
 async def save_deck_service(
     deck: DeckIn,
-    current_user: UserInDB,
+    current_user: CurrentUser,
 ):
     """
     Saves a new deck to the current user's profile.
     """
 
-    deck_id = await generate_deck_id()
     temp_deck = {
-        "_id": deck_id,
         "name": deck.deck_name,
         "tags": deck.tags,
         "words": deck.words,
+        "words_count": len(deck.words),
         "owner_ids": [current_user.id],
         "private": deck.private,
     }
 
-    await decks.insert_one(temp_deck)
+    deck_id = await insert_with_new_id(decks, temp_deck, "deck")
     await users.update_one(
         {"_id": current_user.id}, {"$addToSet": {"deck_ids": deck_id}}
     )
+    user_cache.invalidate(current_user.email)
+    profile_cache.invalidate(current_user.id)
+    await decks_changed(deck_id)
     return {"inserted_id": deck_id}
 
 
 async def edit_deck_service(
     deck_id: str,
     deck_update: DeckUpdate,
-    current_user: UserInDB,
+    current_user: CurrentUser,
 ):
     """
     Edits an existing deck in the current user's profile.
@@ -109,19 +136,29 @@ async def edit_deck_service(
     update_data: dict[str, Any] = {}
     if deck_update.deck_name is not None:
         update_data["name"] = deck_update.deck_name
+    to_unset: dict[str, str] = {}
     if deck_update.words is not None:
+        # A deck sharing a stored word list gets its own words from now on.
         update_data["words"] = deck_update.words
+        update_data["words_count"] = len(deck_update.words)
+        to_unset["words_ref"] = ""
     if deck_update.tags is not None:
         update_data["tags"] = deck_update.tags
     if deck_update.private is not None:
         update_data["private"] = deck_update.private
 
     if update_data:
-        await decks.update_one({"_id": deck_id}, {"$set": update_data})
+        update: dict[str, Any] = {"$set": update_data}
+        if to_unset:
+            update["$unset"] = to_unset
+        await decks.update_one({"_id": deck_id}, update)
+        profile_cache.invalidate(*existing.get("owner_ids", []))
+        await decks_changed(deck_id)
 
     updated = await decks.find_one({"_id": deck_id})
     if not isinstance(updated, dict):
         raise HTTPException(status_code=404, detail="Deck not found")
+    await resolve_words([updated])
     return DeckDetail(
         id=updated["_id"],
         name=updated["name"],
@@ -132,7 +169,7 @@ async def edit_deck_service(
     )
 
 
-async def get_deck_detail_service(deck_id: str, current_user: UserInDB):
+async def get_deck_detail_service(deck_id: str, current_user: CurrentUser):
     """
     Retrieves detailed information for a specific deck.
     Ensures the deck is public or the current user is an owner.
@@ -143,6 +180,7 @@ async def get_deck_detail_service(deck_id: str, current_user: UserInDB):
 
     if deck.get("private") and (current_user.id not in deck.get("owner_ids", [])):
         raise HTTPException(status_code=403, detail="Forbidden")
+    await resolve_words([deck])
 
     return DeckDetail(
         id=deck["_id"],
@@ -156,7 +194,7 @@ async def get_deck_detail_service(deck_id: str, current_user: UserInDB):
 
 async def delete_deck_service(
     deck_id: str,
-    current_user: UserInDB,
+    current_user: CurrentUser,
 ):
     """
     Deletes a deck from the current user's profile.
@@ -169,8 +207,11 @@ async def delete_deck_service(
         raise HTTPException(status_code=403, detail="Forbidden")
 
     await users.update_one({"_id": current_user.id}, {"$pull": {"deck_ids": deck_id}})
+    user_cache.invalidate(current_user.email)
+    profile_cache.invalidate(current_user.id)
     await decks.update_one({"_id": deck_id}, {"$pull": {"owner_ids": current_user.id}})
     updated_deck = await decks.find_one({"_id": deck_id})
     if not updated_deck or not updated_deck.get("owner_ids"):
         await decks.delete_one({"_id": deck_id})
+    await decks_changed(deck_id)
     return {"status": "deleted"}
@@ -0,0 +1,85 @@
+"""Process-wide deadline scheduler for word timers.
+
+Every team game and AI game keeps at most one pending deadline here, keyed by
+the caller. Deadlines are armed on the event loop's own timer heap, so nothing
+wakes up between them and no game document is read just to look at the clock.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from datetime import UTC, datetime
+
+TimerCallback = Callable[[], Awaitable[None]]
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Treats naive datetimes, as read back from Mongo, as UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=UTC)
+    return moment.astimezone(UTC)
+
+
+class TimerScheduler:
+    """
+    Fires a coroutine once its deadline has passed. Scheduling a key that
+    already has a deadline replaces it; cancelled keys never fire.
+    """
+
+    def __init__(self) -> None:
+        self._timers: dict[Hashable, tuple[datetime, asyncio.TimerHandle]] = {}
+        self._running: set[asyncio.Task] = set()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def deadline(self, key: Hashable) -> datetime | None:
+        entry = self._timers.get(key)
+        return entry[0] if entry else None
+
+    def schedule(self, key: Hashable, when: datetime, callback: TimerCallback) -> None:
+        """
+        Runs `callback` at `when`, or right away if it is already past.
+        Re-scheduling a key for the deadline it already has is a no-op.
+        """
+        when = as_utc(when)
+        entry = self._timers.get(key)
+        if entry is not None:
+            if entry[0] == when:
+                return
+            entry[1].cancel()
+        delay = max((when - datetime.now(UTC)).total_seconds(), 0)
+        handle = asyncio.get_running_loop().call_later(delay, self._fire, key, callback)
+        self._timers[key] = (when, handle)
+
+    def cancel(self, key: Hashable) -> None:
+        if entry := self._timers.pop(key, None):
+            entry[1].cancel()
+
+    def _fire(self, key: Hashable, callback: TimerCallback) -> None:
+        self._timers.pop(key, None)
+        task = asyncio.create_task(self._run(key, callback))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _run(key: Hashable, callback: TimerCallback) -> None:
+        try:
+            await callback()
+        except Exception as e:
+            print(f"Timer {key} failed: {e}")
+
+    def stop(self) -> None:
+        """
+        Cancels every pending deadline and any callback still running.
+        """
+        for _, handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        for task in self._running:
+            task.cancel()
+
+
+timers = TimerScheduler()
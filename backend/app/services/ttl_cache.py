@@ -0,0 +1,60 @@
+"""Per-worker cache of values read from the database."""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):  # noqa: UP046 - also runs on Python 3.11
+    """
+    Bounded LRU cache whose entries expire after `ttl` seconds, which bounds
+    how long changes made by other workers go unnoticed. Changes made by this
+    worker invalidate the affected entries right away. Values that never
+    change are kept until evicted with the default `ttl`.
+    """
+
+    def __init__(self, size: int, ttl: float = math.inf):
+        self.size = size
+        self.ttl = ttl
+        # Bumped on every invalidation, so that a value read from the database
+        # before it is not cached afterwards.
+        self.version = 0
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V, version: int) -> None:
+        """
+        Caches a value read while the cache was at `version`.
+        """
+        if version != self.version:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: K) -> None:
+        self.version += 1
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
@@ -0,0 +1,85 @@
+"""Content-addressed store of immutable word lists.
+
+A word list is stored once in ``word_lists`` under the SHA-256 of its words,
+and documents refer to it by that hash instead of embedding the words: decks
+in ``words_ref``, team and AI games in ``deck_ref``. Lists are never changed
+once stored: a document that needs other words embeds them or refers to
+another list. Because of that, the lists a worker reads are kept in memory
+for as long as there is room for them.
+"""
+
+import hashlib
+import json
+from collections.abc import Iterable
+from typing import Any
+
+from backend.app.config import WORD_LIST_CACHE_SIZE
+from backend.app.db import db
+from backend.app.services.ttl_cache import TTLCache
+
+word_lists = db.word_lists
+
+
+class WordListCache(TTLCache[str, list[str]]):
+    """
+    Cache of stored word lists, keyed by their hash. Lists never change, so
+    they never expire.
+    """
+
+    def __init__(self, size: int = WORD_LIST_CACHE_SIZE) -> None:
+        super().__init__(size)
+
+
+word_list_cache = WordListCache()
+
+
+def words_hash(words: list[str]) -> str:
+    return hashlib.sha256(json.dumps(words).encode()).hexdigest()
+
+
+async def store_words(words: list[str]) -> str:
+    """
+    Stores a word list unless it is stored already, and returns its hash.
+    """
+    ref = words_hash(words)
+    await word_lists.update_one(
+        {"_id": ref}, {"$setOnInsert": {"words": words}}, upsert=True
+    )
+    return ref
+
+
+async def fetch_words(refs: Iterable[str]) -> dict[str, list[str]]:
+    """
+    Returns the stored word lists with the given hashes.
+    """
+    found = word_lists.find({"_id": {"$in": list(set(refs))}})
+    return {doc["_id"]: doc["words"] async for doc in found}
+
+
+async def load_words(ref: str) -> list[str]:
+    """
+    Returns a stored word list, reading it from the database only if this
+    worker has not read it recently. The list must not be modified.
+    """
+    words = word_list_cache.get(ref)
+    if words is None:
+        version = word_list_cache.version
+        doc = await word_lists.find_one({"_id": ref})
+        words = doc["words"] if doc else []
+        if doc:
+            word_list_cache.put(ref, words, version)
+    return words
+
+
+async def resolve_words(documents: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Fills in `words` of the documents that refer to a stored word list, with
+    a single query for all of them, and returns the documents.
+    """
+    refs = [doc["words_ref"] for doc in documents if "words_ref" in doc]
+    if refs:
+        stored = await fetch_words(refs)
+        for doc in documents:
+            if "words_ref" in doc:
+                doc["words"] = stored.get(doc["words_ref"], [])
+    return documents
@@ -0,0 +1,55 @@
+"""Seeded permutations for the order in which games draw their words.
+
+Games do not store shuffled word lists. They store a seed, and the word drawn
+at any step is found by `permuted`, which maps a step to a position of the
+seeded permutation without building the permutation. The mapping only uses
+integer arithmetic, so every worker and every Python version derives the same
+order from the same seed, and a game's draws can be replayed from its
+document.
+
+The permutation is a small Feistel network over the smallest power of four
+covering the positions. Steps it maps outside the positions are mapped again
+until they land inside (cycle walking), which happens fewer than four times
+on average.
+"""
+
+from random import getrandbits
+
+_MASK_64 = (1 << 64) - 1
+_ROUNDS = 4
+
+
+def new_seed() -> int:
+    """Generate a random seed that fits a signed 64-bit database integer."""
+    return getrandbits(63)
+
+
+def _mix(value: int) -> int:
+    """The SplitMix64 finalizer, spreading every input bit over the output."""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+def permuted(seed: int, size: int, index: int) -> int:
+    """
+    Returns the position at `index` of the permutation of `range(size)`
+    that the seed stands for.
+    """
+    if not 0 <= index < size:
+        raise IndexError(f"Index {index} out of range for size {size}")
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    half_mask = (1 << half_bits) - 1
+    while True:
+        left, right = index >> half_bits, index & half_mask
+        for round_number in range(_ROUNDS):
+            key = _mix(seed + (round_number << 58) + right)
+            left, right = right, left ^ (key & half_mask)
+        index = (left << half_bits) | right
+        if index < size:
+            return index
+
+
+def permutation(seed: int, size: int) -> list[int]:
+    """Returns the whole permutation of `range(size)` that the seed stands for."""
+    return [permuted(seed, size, index) for index in range(size)]
@@ -0,0 +1,137 @@
+"""
+Measures game state broadcast latency as a room grows.
+
+Every tenth player is a slow mobile client whose sends take `--slow-ms`.
+For each room size the script broadcasts `--rounds` state changes and reports
+how long the fast players waited for them using the queued fan-out of
+`ConnectionManager`. With `--sequential` the previous one-socket-after-another
+loop is measured as well for comparison; it takes a while on large rooms.
+
+Usage:
+    python -m backend.benchmarks.broadcast --sizes 5 25 50 100 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GEMINI_MODEL_NAME", "")
+
+from backend.app.models import PlayerGameState
+from backend.app.services.game_service import ConnectionManager
+
+GAME_ID = "BENCH1"
+
+
+class FakeSocket:
+    def __init__(self, delay: float, latencies: list[float] | None) -> None:
+        self.delay = delay
+        self.latencies = latencies
+        self.sent_at = 0.0
+
+    async def send_text(self, data: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.latencies is not None:
+            self.latencies.append(time.perf_counter() - self.sent_at)
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        pass
+
+
+def make_game(players: int) -> dict[str, Any]:
+    names = [f"player{i}" for i in range(players)]
+    return {
+        "_id": GAME_ID,
+        "game_state": "in_progress",
+        "tries_per_player": 3,
+        "teams": {
+            "team_1": {
+                "id": "team_1",
+                "name": "Team 1",
+                "players": names,
+                "scores": dict.fromkeys(names, 0),
+                "player_attempts": {},
+                "words": [f"word{i}" for i in range(100)],
+                "current_word": "word",
+                "current_master": names[0],
+                "state": "in_progress",
+            }
+        },
+    }
+
+
+async def sequential_broadcast(manager: ConnectionManager, game: dict[str, Any]):
+    """The original broadcast: a full state built, encoded and awaited per socket."""
+    scores = manager._all_teams_scores(game)
+    for ws, name, team_id in manager.players[GAME_ID]:
+        state = PlayerGameState(
+            **manager._team_state(game, team_id, scores),
+            **manager._own_state(game, name, team_id),
+        ).model_dump(mode="json")
+        await ws.send_text(json.dumps(state))
+
+
+async def run(players: int, rounds: int, slow_ms: float, queued: bool) -> list[float]:
+    manager = ConnectionManager()
+    latencies: list[float] = []
+    sockets: list[Any] = [
+        FakeSocket(slow_ms / 1000, None) if i % 10 == 9 else FakeSocket(0, latencies)
+        for i in range(players)
+    ]
+    manager.players[GAME_ID] = [
+        (ws, f"player{i}", "team_1") for i, ws in enumerate(sockets)
+    ]
+    game = make_game(players)
+
+    for round_number in range(rounds):
+        game["teams"]["team_1"]["scores"]["player1"] = round_number
+        start = time.perf_counter()
+        for ws in sockets:
+            ws.sent_at = start
+        if queued:
+            await manager.broadcast_state(GAME_ID, game)
+        else:
+            await sequential_broadcast(manager, game)
+        await asyncio.sleep(0.02)
+
+    for outbox in manager.outboxes.values():
+        outbox.close()
+    return latencies
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 25, 50, 100, 200])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--slow-ms", type=float, default=250)
+    parser.add_argument("--sequential", action="store_true")
+    args = parser.parse_args()
+
+    modes = (True, False) if args.sequential else (True,)
+    print(f"{'players':>8} {'mode':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for size in args.sizes:
+        for queued in modes:
+            latencies = await run(size, args.rounds, args.slow_ms, queued)
+            mode = "queued" if queued else "sequential"
+            print(
+                f"{size:>8} {mode:>10} {percentile(latencies, 50):>10.2f}"
+                f" {percentile(latencies, 99):>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
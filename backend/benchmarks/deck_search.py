@@ -0,0 +1,104 @@
+"""
+Measures the gallery search index on a synthetic gallery.
+
+The script indexes `--decks` random decks, as a worker does on its first
+search, and reports how long that took and how much memory the index holds.
+It then times `--queries` searches of each kind (exact terms, prefixes,
+terms with a typo, and two-term queries) and prints latency percentiles.
+
+Usage:
+    python -m backend.benchmarks.deck_search --decks 100000
+    python -m backend.benchmarks.deck_search --decks 100000 --words
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GEMINI_MODEL_NAME", "")
+
+from backend.app.services.deck_search import DeckSearchIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "an", "or", "el"]
+
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 5))))
+    return sorted(words)
+
+
+def make_deck(i: int, vocab: list[str], rng: random.Random, words: int) -> dict:
+    return {
+        "_id": f"{i:010d}",
+        "name": " ".join(rng.choices(vocab, k=rng.randint(1, 3)))[:20],
+        "tags": rng.choices(vocab, k=rng.randint(0, 3)),
+        "words": rng.choices(vocab, k=words),
+    }
+
+
+def with_typo(term: str, rng: random.Random) -> str:
+    i = rng.randrange(len(term))
+    return term[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + term[i + 1 :]
+
+
+def percentiles(samples: list[float]) -> str:
+    cuts = statistics.quantiles(samples, n=100)
+    return f"{cuts[49]:>8.3f} {cuts[94]:>8.3f} {cuts[98]:>8.3f} {max(samples):>8.3f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--decks", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--deck-words", type=int, default=30)
+    parser.add_argument("--words", action="store_true", help="index deck words")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = vocabulary(args.vocabulary, rng)
+    decks = [make_deck(i, vocab, rng, args.deck_words) for i in range(args.decks)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = DeckSearchIndex(index_words=args.words)
+    for deck in decks:
+        index.add(deck)
+    build_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"indexed {len(index)} decks, {len(index.postings)} terms"
+        f" in {build_seconds:.2f} s, {memory / 2**20:.0f} MiB"
+    )
+
+    queries = {
+        "exact": lambda: rng.choice(vocab),
+        "prefix": lambda: rng.choice(vocab)[:3],
+        "typo": lambda: with_typo(rng.choice(vocab), rng),
+        "two terms": lambda: f"{rng.choice(vocab)} {rng.choice(vocab)[:3]}",
+    }
+    print(f"{'query':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, make_query in queries.items():
+        samples = []
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            index.search(query)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"{kind:>10} {percentiles(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Load test of live team games over WebSockets.
+
+Creates `--games` games and connects a host to /api/game/{id} and `--players`
+players to /api/game/player/{id} of each, spread over `--teams` teams. Once
+every game is started, players keep guessing with random pauses, a share of
+them correctly, and masters skip words now and then. After `--duration`
+seconds the hosts stop their games.
+
+Sockets mirror the snapshots and patches they receive the way the frontend
+does. An action counts as broadcast once the sender's mirrored state shows
+its effect: fewer tries left, another word or a finished game. The report
+lists connect and action-to-broadcast latency percentiles, messages received
+per second and error rates.
+
+With `--mock-backend` the script first starts a backend on an in-memory mock
+MongoDB (see `backend.benchmarks.mock_backend`), so only this repository is
+needed. Otherwise it runs against the backend at `--url`.
+
+Usage:
+    python -m backend.benchmarks.gameplay --mock-backend --games 20 --players 8
+    python -m backend.benchmarks.gameplay --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any
+from urllib.parse import urlencode
+
+import httpx
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+
+WORDS = [f"word{i}" for i in range(1000)]
+WRONG_GUESS = "-"
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.attempts: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.messages = 0
+
+
+def merge(target: dict[str, Any], changes: dict[str, Any]) -> None:
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def remove(target: dict[str, Any], path: list[str]) -> None:
+    *parents, last = path
+    for key in parents:
+        target = target.get(key)  # type: ignore[assignment]
+        if not isinstance(target, dict):
+            return
+    target.pop(last, None)
+
+
+class GameSocket:
+    """
+    A game WebSocket that keeps the full state it was sent up to date.
+    """
+
+    def __init__(self, websocket: ClientConnection, stats: Stats) -> None:
+        self.websocket = websocket
+        self.stats = stats
+        self.state: dict[str, Any] | None = None
+        self.version = 0
+        self.closed = False
+        self._changed = asyncio.Condition()
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        try:
+            async for raw in self.websocket:
+                self.stats.messages += 1
+                if not self._apply(json.loads(raw)):
+                    self.stats.errors["resyncs"] += 1
+                    await self.send({"action": "resync"})
+                    continue
+                async with self._changed:
+                    self._changed.notify_all()
+        except ConnectionClosed:
+            pass
+        finally:
+            self.closed = True
+            async with self._changed:
+                self._changed.notify_all()
+
+    def _apply(self, message: dict[str, Any]) -> bool:
+        """Applies a message, or returns False if it is a patch without a base."""
+        if message["type"] == "snapshot":
+            self.state = message["state"]
+        elif self.state is not None and message["version"] > self.version:
+            merge(self.state, message.get("changes", {}))
+            for path in message.get("removed", []):
+                remove(self.state, path)
+        else:
+            return False
+        self.state.update(message.get("self", {}))
+        self.version = message["version"]
+        return True
+
+    async def send(self, message: dict[str, Any]) -> None:
+        await self.websocket.send(json.dumps(message))
+
+    async def wait_for(
+        self, predicate: Callable[[dict[str, Any]], bool], timeout: float
+    ) -> dict[str, Any]:
+        """
+        Waits until the mirrored state satisfies `predicate` and returns it.
+        Raises TimeoutError, or ConnectionError if the socket closes first.
+        """
+        async with asyncio.timeout(timeout), self._changed:
+            while self.state is None or not predicate(self.state):
+                if self.closed:
+                    raise ConnectionError("socket closed")
+                await self._changed.wait()
+        return self.state
+
+    async def close(self) -> None:
+        await self.websocket.close()
+        await self._reader
+
+
+async def open_socket(url: str, stats: Stats, timeout: float) -> GameSocket | None:
+    """
+    Connects and waits for the first snapshot, timing both as the connect.
+    """
+    started = time.perf_counter()
+    stats.attempts["connect"] += 1
+    try:
+        websocket = await asyncio.wait_for(connect(url), timeout)
+        game_socket = GameSocket(websocket, stats)
+        await game_socket.wait_for(lambda state: True, timeout)
+    except (OSError, TimeoutError, ConnectionError, ConnectionClosed) as e:
+        stats.errors["connect"] += 1
+        print(f"Failed to connect to {url}: {e!r}")
+        return None
+    stats.latencies["connect"].append(time.perf_counter() - started)
+    return game_socket
+
+
+def progress(state: dict[str, Any]) -> tuple[Any, ...]:
+    """The parts of a player's state that any accepted action changes."""
+    return (
+        state.get("game_state"),
+        state.get("remaining_words_count"),
+        state.get("current_word"),
+        state.get("tries_left"),
+    )
+
+
+def moved_on(before: tuple[Any, ...], state: dict[str, Any]) -> bool:
+    return progress(state) != before
+
+
+async def play(
+    game_socket: GameSocket,
+    name: str,
+    args: argparse.Namespace,
+    stats: Stats,
+    stop_at: float,
+) -> None:
+    try:
+        await game_socket.wait_for(
+            lambda state: state["game_state"] != "pending", args.timeout
+        )
+    except (TimeoutError, ConnectionError):
+        stats.errors["not_started"] += 1
+        return
+
+    while time.perf_counter() < stop_at and not game_socket.closed:
+        await asyncio.sleep(random.expovariate(1 / args.think_time))
+        state = game_socket.state
+        if state is None or state["game_state"] == "finished":
+            return
+        if not state.get("current_word"):
+            continue
+
+        if state.get("current_master") == name:
+            if random.random() >= args.skip_ratio:
+                continue
+            action, message = "skip", {"action": "skip"}
+        else:
+            correct = random.random() < args.correct_ratio
+            guess = state["current_word"] if correct else WRONG_GUESS
+            action, message = "guess", {"action": "guess", "guess": guess}
+
+        before = progress(state)
+        stats.attempts[action] += 1
+        sent = time.perf_counter()
+        try:
+            await game_socket.send(message)
+            await game_socket.wait_for(partial(moved_on, before), args.timeout)
+        except TimeoutError:
+            stats.errors[f"{action}_unanswered"] += 1
+            continue
+        except (ConnectionError, ConnectionClosed):
+            break
+        stats.latencies[action].append(time.perf_counter() - sent)
+
+    if time.perf_counter() < stop_at:
+        stats.errors["dropped"] += 1
+
+
+async def run_game(
+    client: httpx.AsyncClient,
+    ws_url: str,
+    index: int,
+    args: argparse.Namespace,
+    stats: Stats,
+    ready: asyncio.Barrier,
+) -> None:
+    response = await client.post(
+        "/api/game/create",
+        json={
+            "number_of_teams": args.teams,
+            "deck": random.sample(WORDS, args.words),
+            "time_for_guessing": args.time_for_guessing,
+            # Every guess must change the guesser's state to be measurable
+            "tries_per_player": 1000,
+            "right_answers_to_advance": 1,
+        },
+    )
+    response.raise_for_status()
+    game_id = response.json()["id"]
+
+    host = await open_socket(f"{ws_url}/api/game/{game_id}", stats, args.timeout)
+    players = await asyncio.gather(
+        *(
+            open_socket(
+                f"{ws_url}/api/game/player/{game_id}?"
+                + urlencode(
+                    {"name": f"p{index}_{i}", "team_id": f"team_{i % args.teams + 1}"}
+                ),
+                stats,
+                args.timeout,
+            )
+            for i in range(args.players)
+        )
+    )
+    # Games start together so that the measured phase is under full load.
+    await ready.wait()
+    stop_at = time.perf_counter() + args.duration
+    if host is not None:
+        await host.send({"action": "start_game"})
+
+    await asyncio.gather(
+        *(
+            play(player, f"p{index}_{i}", args, stats, stop_at)
+            for i, player in enumerate(players)
+            if player is not None
+        )
+    )
+
+    if host is not None:
+        if not host.closed:
+            await host.send({"action": "stop_game"})
+        await host.close()
+    for player in players:
+        if player is not None:
+            await player.close()
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] * 1000 if values else float("nan")
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+def report(stats: Stats, elapsed: float) -> None:
+    print(f"{'latency':>10} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for kind in ("connect", "guess", "skip"):
+        values = stats.latencies[kind]
+        print(
+            f"{kind:>10} {len(values):>8} {percentile(values, 50):>10.2f}"
+            f" {percentile(values, 95):>10.2f} {percentile(values, 99):>10.2f}"
+        )
+    print(f"\nmessages received: {stats.messages} ({stats.messages / elapsed:.0f}/s)")
+    actions = stats.attempts["guess"] + stats.attempts["skip"]
+    print(f"actions sent: {actions} ({actions / elapsed:.0f}/s)")
+    for error, count in sorted(stats.errors.items()):
+        if error.endswith("_unanswered"):
+            base = stats.attempts[error.removesuffix("_unanswered")]
+        else:
+            base = stats.attempts["connect"]
+        print(f"errors {error}: {count} ({count / max(base, 1):.2%})")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@asynccontextmanager
+async def mock_backend(verbose: bool) -> AsyncIterator[str]:
+    """Starts a backend on mock MongoDB and yields its base URL."""
+    port = free_port()
+    output = None if verbose else subprocess.DEVNULL
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "backend.benchmarks.mock_backend",
+        "--port",
+        str(port),
+        stdout=output,
+        stderr=output,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/docs")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("The mock backend did not start")
+        yield url
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+async def run(url: str, args: argparse.Namespace) -> None:
+    stats = Stats()
+    ws_url = "ws" + url.removeprefix("http")
+    ready = asyncio.Barrier(args.games)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as client:
+        await asyncio.gather(
+            *(
+                run_game(client, ws_url, index, args, stats, ready)
+                for index in range(args.games)
+            )
+        )
+    report(stats, time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--mock-backend", action="store_true")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--teams", type=int, default=2)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--think-time", type=float, default=1.0)
+    parser.add_argument("--correct-ratio", type=float, default=0.2)
+    parser.add_argument("--skip-ratio", type=float, default=0.1)
+    parser.add_argument("--time-for-guessing", type=int, default=60)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    print(
+        f"{args.games} games x {args.players} players for {args.duration:.0f}s,"
+        f" one action per player every {args.think_time}s on average"
+    )
+    if args.mock_backend:
+        async with mock_backend(args.verbose) as url:
+            await run(url, args)
+    else:
+        await run(args.url, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
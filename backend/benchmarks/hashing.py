@@ -0,0 +1,68 @@
+"""
+Measures login throughput at different bcrypt cost factors.
+
+For each cost in `--rounds` the script checks a password `--logins` times on
+one thread, which gives the logins one core can verify per second, and then
+through a `HashingPool` of `--workers` threads, as the backend does. Use it to
+pick BCRYPT_ROUNDS: every step up doubles the CPU time of each login.
+
+Usage:
+    python -m backend.benchmarks.hashing --rounds 10 11 12 13 --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GEMINI_MODEL_NAME", "")
+
+from passlib.context import CryptContext  # type: ignore
+
+from backend.app.services.hashing import HashingPool
+
+PASSWORD = "Benchmark1!"
+
+
+def per_core(context: CryptContext, hashed: str, logins: int) -> float:
+    started = time.perf_counter()
+    for _ in range(logins):
+        context.verify(PASSWORD, hashed)
+    return logins / (time.perf_counter() - started)
+
+
+async def pooled(context: CryptContext, hashed: str, logins: int, workers: int):
+    pool = HashingPool(workers)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(pool.run(context.verify, PASSWORD, hashed) for _ in range(logins))
+    )
+    return logins / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    print(
+        f"{'rounds':>7} {'ms/login':>10} {'logins/s/core':>14}"
+        f" {f'logins/s x{args.workers}':>14}"
+    )
+    for rounds in args.rounds:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        hashed = context.hash(PASSWORD)
+        rate = per_core(context, hashed, args.logins)
+        pool_rate = await pooled(context, hashed, args.logins, args.workers)
+        print(f"{rounds:>7} {1000 / rate:>10.1f} {rate:>14.1f} {pool_rate:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
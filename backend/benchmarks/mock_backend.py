@@ -0,0 +1,51 @@
+"""
+Runs the backend on an in-memory mock MongoDB.
+
+Meant for load tests that should exercise the real request and WebSocket
+handling without a database server. Everything stored is lost when the
+process exits.
+
+Usage:
+    python -m backend.benchmarks.mock_backend --port 8000
+"""
+
+import argparse
+import os
+import sys
+import types
+
+import mongomock_motor
+import uvicorn
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GEMINI_MODEL_NAME", "")
+
+
+def use_mock_mongo() -> None:
+    """Makes `backend.app.db` connect to mongomock instead of a server."""
+    motor_asyncio = types.ModuleType("motor.motor_asyncio")
+    motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient  # type: ignore[attr-defined]
+    motor = types.ModuleType("motor")
+    motor.motor_asyncio = motor_asyncio  # type: ignore[attr-defined]
+    sys.modules["motor"] = motor
+    sys.modules["motor.motor_asyncio"] = motor_asyncio
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    use_mock_mongo()
+    uvicorn.run(
+        "backend.app.main:app", host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
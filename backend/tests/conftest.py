@@ -4,12 +4,20 @@ import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 
 import backend.tests._test_setup  # noqa: F401
-import backend.app.code_gen as code_gen
 import backend.app.db as db_module
 import backend.app.routers.game as game_router
+import backend.app.services.game_bus as game_bus
+import backend.app.services.game_engine as game_engine
+import backend.app.services.game_events as game_events
+import backend.app.services.game_history as game_history
 import backend.app.services.auth_service as auth_service
+import backend.app.services.deck_search as deck_search
+import backend.app.services.gallery_service as gallery_service
 import backend.app.services.game_service as game_service
 import backend.app.services.profile_service as profile_service
+from backend.app.services.profile_cache import profile_cache
+import backend.app.services.timers as timers_module
+import backend.app.services.word_lists as word_lists
 from backend.app.main import app as fastapi_app
 
 
@@ -19,14 +27,36 @@ async def test_db(monkeypatch):
     test_db = client.db
     monkeypatch.setattr(db_module, "db", test_db)
     monkeypatch.setattr(auth_service, "users", test_db.users)
+    auth_service.user_cache.clear()
+    profile_cache.clear()
+    word_lists.word_list_cache.clear()
+    monkeypatch.setattr(auth_service, "token_revocations", test_db.token_revocations)
+    monkeypatch.setattr(auth_service, "revocations", auth_service.TokenRevocations())
     monkeypatch.setattr(game_service, "games", test_db.games)
     monkeypatch.setattr(game_service, "decks", test_db.decks)
+    monkeypatch.setattr(gallery_service, "decks", test_db.decks)
+    monkeypatch.setattr(gallery_service, "users", test_db.users)
+    gallery_service.gallery_cache.clear()
+    monkeypatch.setattr(deck_search, "decks", test_db.decks)
+    monkeypatch.setattr(deck_search, "search_index", deck_search.DeckSearchIndex())
+    monkeypatch.setattr(gallery_service, "search_index", deck_search.search_index)
     monkeypatch.setattr(game_router, "games", test_db.games)
+    monkeypatch.setattr(game_engine, "games", test_db.games)
+    monkeypatch.setattr(game_engine, "engine", game_engine.GameEngine())
+    monkeypatch.setattr(game_router, "engine", game_engine.engine)
+    monkeypatch.setattr(game_router, "timers", timers_module.TimerScheduler())
+    bus = game_bus.InProcessGameBus()
+    bus.handler = game_router.on_bus_message
+    monkeypatch.setattr(game_router, "bus", bus)
+    monkeypatch.setattr(game_history, "history", test_db.game_history)
+    monkeypatch.setattr(game_events, "events", test_db.game_log)
+    monkeypatch.setattr(game_events, "games", test_db.games)
+    event_log = game_events.GameEventLog()
+    for module in (game_events, game_service, game_engine, game_router):
+        monkeypatch.setattr(module, "event_log", event_log)
     monkeypatch.setattr(profile_service, "users", test_db.users)
     monkeypatch.setattr(profile_service, "decks", test_db.decks)
-    monkeypatch.setattr(code_gen, "games", test_db.games)
-    monkeypatch.setattr(code_gen, "decks", test_db.decks)
-    monkeypatch.setattr(code_gen, "users", test_db.users)
+    monkeypatch.setattr(word_lists, "word_lists", test_db.word_lists)
     yield test_db
 
 
@@ -4,7 +4,6 @@ import mongomock_motor
 import pytest
 from fastapi.testclient import TestClient
 
-import backend.app.code_gen as code_gen
 import backend.app.db as db_module
 import backend.app.routers.game as game_router
 import backend.app.services.auth_service as auth_service
@@ -25,9 +24,6 @@ game_service.decks = test_db.decks
 game_router.games = test_db.games
 profile_service.users = test_db.users
 profile_service.decks = test_db.decks
-code_gen.games = test_db.games
-code_gen.decks = test_db.decks
-code_gen.users = test_db.users
 
 client = TestClient(app)
 
@@ -155,3 +151,58 @@ def test_clear_logs_by_admin(mock_clear_logs_service, admin_user):
 def cleanup():
     yield
     app.dependency_overrides = {}
+
+
+def test_get_game_stats_by_admin(admin_user):
+    app.dependency_overrides[get_current_user] = override_get_current_user_admin
+    response = client.get("/api/admin/stats/games")
+    assert response.status_code == 200
+    assert set(response.json()) == {"live_games", "owned_games", "ownership", "fencing"}
+
+
+def test_get_game_stats_by_normal_user(normal_user):
+    app.dependency_overrides[get_current_user] = override_get_current_user_normal
+    response = client.get("/api/admin/stats/games")
+    assert response.status_code == 403
+
+
+def test_get_auth_stats_by_admin(admin_user):
+    app.dependency_overrides[get_current_user] = override_get_current_user_admin
+    response = client.get("/api/admin/stats/auth")
+    assert response.status_code == 200
+    assert {"workers", "running", "waiting"} <= set(response.json())
+
+
+@patch(
+    "backend.app.routers.admin_panel.get_index_stats_service", new_callable=AsyncMock
+)
+def test_get_index_stats_by_admin(mock_get_index_stats_service, admin_user):
+    app.dependency_overrides[get_current_user] = override_get_current_user_admin
+    mock_get_index_stats_service.return_value = {
+        "users": {"missing": [], "undeclared": [], "unused": None}
+    }
+    response = client.get("/api/admin/stats/indexes")
+    assert response.status_code == 200
+    assert response.json()["users"]["missing"] == []
+
+
+@patch("backend.app.routers.admin_panel.get_id_stats_service", new_callable=AsyncMock)
+def test_get_id_stats_by_admin(mock_get_id_stats_service, admin_user):
+    app.dependency_overrides[get_current_user] = override_get_current_user_admin
+    mock_get_id_stats_service.return_value = {
+        "game": {"allocated": 3, "collisions": 1, "collision_rate": 0.25}
+    }
+    response = client.get("/api/admin/stats/ids")
+    assert response.status_code == 200
+    assert response.json()["game"]["collisions"] == 1
+
+
+@patch(
+    "backend.app.routers.admin_panel.get_gallery_stats_service", new_callable=AsyncMock
+)
+def test_get_gallery_stats_by_admin(mock_get_gallery_stats_service, admin_user):
+    app.dependency_overrides[get_current_user] = override_get_current_user_admin
+    mock_get_gallery_stats_service.return_value = {"pages": 3, "hit_ratio": 0.97}
+    response = client.get("/api/admin/stats/gallery")
+    assert response.status_code == 200
+    assert response.json()["hit_ratio"] == 0.97
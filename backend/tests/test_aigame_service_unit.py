@@ -0,0 +1,172 @@
+from datetime import datetime
+
+import pytest
+
+import backend.app.services.aigame_service as aigame_service
+from backend.app.models import AIGame
+from backend.app.services.timers import TimerScheduler
+from backend.app.services.word_lists import load_words, store_words
+
+# Seed whose order draws the words of a deck of up to three in deck order
+IN_ORDER = 1
+
+
+@pytest.fixture
+def sent(test_db, monkeypatch):
+    states: list[dict] = []
+
+    async def send_state(game_id, game_data):
+        states.append(game_data)
+
+    monkeypatch.setattr(aigame_service, "aigames", test_db.aigames)
+    monkeypatch.setattr(aigame_service, "timers", TimerScheduler())
+    monkeypatch.setattr(aigame_service.manager, "send_state", send_state)
+    return states
+
+
+async def _insert_game(test_db, game_id: str, words: list[str]) -> None:
+    await test_db.aigames.insert_one(
+        {
+            "_id": game_id,
+            "deck_ref": await store_words(words),
+            "seed": IN_ORDER,
+            "words_amount": len(words),
+            "game_state": "pending",
+            "settings": {"time_for_guessing": 30},
+            "word_index": 0,
+            "current_word": None,
+            "clues": [],
+            "score": 0,
+            "expires_at": None,
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_start_draws_first_word_and_arms_timer(test_db, sent):
+    await _insert_game(test_db, "ai_start", ["apple", "pear"])
+    await aigame_service.start_aigame_service("ai_start")
+
+    game = await test_db.aigames.find_one({"_id": "ai_start"})
+    assert game["game_state"] == "in_progress"
+    assert game["current_word"] == "apple"
+    assert game["word_index"] == 1
+    assert game["seed"] == IN_ORDER
+    assert isinstance(game["expires_at"], datetime)
+    assert game["clues"] == [""]
+    assert ("aigame", "ai_start") in aigame_service.timers
+    assert sent[-1]["current_word"] == "apple"
+
+
+@pytest.mark.asyncio
+async def test_games_share_their_stored_deck(test_db, sent):
+    settings = {"time_for_guessing": 30, "word_amount": 2}
+    game = AIGame(deck=["apple", "pear", "plum"], settings=settings)
+    first = await aigame_service.create_aigame(game)
+    second = await aigame_service.create_aigame(game)
+
+    stored = await test_db.aigames.find({}).to_list(None)
+    assert {doc["_id"] for doc in stored} == {first, second}
+    assert len({doc["deck_ref"] for doc in stored}) == 1
+    assert await test_db.word_lists.count_documents({}) == 1
+    for doc in stored:
+        assert "deck" not in doc
+        assert doc["words_amount"] == 2
+    assert stored[0]["seed"] != stored[1]["seed"]
+
+
+@pytest.mark.asyncio
+async def test_correct_guess_scores_and_advances(test_db, sent):
+    await _insert_game(test_db, "ai_guess", ["apple", "pear"])
+    await aigame_service.start_aigame_service("ai_guess")
+
+    await aigame_service.handle_guess("ai_guess", "Wrong")
+    game = await test_db.aigames.find_one({"_id": "ai_guess"})
+    assert (game["score"], game["current_word"], len(game["clues"])) == (
+        0,
+        "apple",
+        2,
+    )
+
+    await aigame_service.handle_guess("ai_guess", "APPLE")
+    game = await test_db.aigames.find_one({"_id": "ai_guess"})
+    assert (game["score"], game["current_word"], len(game["clues"])) == (
+        1,
+        "pear",
+        1,
+    )
+    assert game["word_index"] == 2
+
+
+@pytest.mark.asyncio
+async def test_last_correct_guess_finishes_game(test_db, sent):
+    await _insert_game(test_db, "ai_finish", ["apple"])
+    await aigame_service.start_aigame_service("ai_finish")
+
+    await aigame_service.handle_guess("ai_finish", "apple")
+    game = await test_db.aigames.find_one({"_id": "ai_finish"})
+    assert game["game_state"] == "finished"
+    assert game["score"] == 1
+    assert sent[-1]["game_state"] == "finished"
+    assert ("aigame", "ai_finish") not in aigame_service.timers
+    assert isinstance(game["finished_at"], datetime)
+    record = await test_db.game_history.find_one({"code": "ai_finish"})
+    assert (record["kind"], record["score"], record["words_amount"]) == (
+        "aigame",
+        1,
+        1,
+    )
+
+    await aigame_service.handle_guess("ai_finish", "apple")
+    game = await test_db.aigames.find_one({"_id": "ai_finish"})
+    assert game["score"] == 1
+
+
+class _RecordingSocket:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    async def send_json(self, data: dict) -> None:
+        self.sent.append(data)
+
+
+@pytest.mark.asyncio
+async def test_sent_state_leaves_out_server_fields(test_db, monkeypatch):
+    monkeypatch.setattr(aigame_service, "aigames", test_db.aigames)
+    monkeypatch.setattr(aigame_service, "timers", TimerScheduler())
+    manager = aigame_service.AIGameConnectionManager()
+    socket = _RecordingSocket()
+    manager.active_connections["ai_sent"] = socket  # type: ignore[assignment]
+    monkeypatch.setattr(aigame_service, "manager", manager)
+    await _insert_game(test_db, "ai_sent", ["apple", "pear"])
+
+    await aigame_service.start_aigame_service("ai_sent")
+    await aigame_service.handle_guess("ai_sent", "wrong")
+
+    assert socket.sent[-1]["current_word"] == "apple"
+    for state in socket.sent:
+        assert not {"deck_ref", "seed", "last_guess_correct"} & state.keys()
+
+
+@pytest.mark.asyncio
+async def test_backfill_keeps_order_of_embedded_decks(test_db, sent):
+    await test_db.aigames.insert_one(
+        {
+            "_id": "ai_embedded",
+            "deck": ["cat", "dog", "owl"],
+            "remaining_words": ["owl"],
+            "current_word": "dog",
+            "game_state": "in_progress",
+            "settings": {"time_for_guessing": 30},
+            "clues": [],
+            "score": 0,
+        }
+    )
+    await aigame_service.backfill_aigame_decks()
+    game = await test_db.aigames.find_one({"_id": "ai_embedded"})
+    assert "deck" not in game
+    assert (game["word_index"], game["words_amount"]) == (1, 2)
+
+    deck = await load_words(game["deck_ref"])
+    assert aigame_service.drawn_word(deck, game, 0) == "dog"
+    assert aigame_service.drawn_word(deck, game, 1) == "owl"
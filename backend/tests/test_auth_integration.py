@@ -1,5 +1,13 @@
+import asyncio
+
 import pytest
+from fastapi import HTTPException
 from httpx import AsyncClient
+from passlib.context import CryptContext  # type: ignore
+
+import backend.app.services.admin_service as admin_service
+import backend.app.services.auth_service as auth_service
+from backend.app.models import CurrentUser
 
 
 @pytest.mark.asyncio
@@ -125,3 +133,65 @@ async def test_refresh_token_expired(client: AsyncClient, test_db):
     )
     assert response.status_code == 401
     assert response.json() == {"detail": "Token has expired"}
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_with_new_cost(
+    client: AsyncClient, test_db, monkeypatch
+):
+    monkeypatch.setattr(
+        auth_service, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    )
+    register_data = {
+        "name": "Rehash",
+        "surname": "Test",
+        "email": "rehash@example.com",
+        "password": "RehashPassword1!",
+    }
+    response = await client.post("/api/auth/register", json=register_data)
+    assert response.status_code == 200
+    user = await test_db.users.find_one({"email": "rehash@example.com"})
+    assert user["hashed_password"].startswith("$2b$04$")
+
+    monkeypatch.setattr(
+        auth_service, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=5)
+    )
+    login_data = {"username": "rehash@example.com", "password": "RehashPassword1!"}
+    response = await client.post("/api/auth/login", data=login_data)
+    assert response.status_code == 200
+    await asyncio.gather(*auth_service._rehashes)
+
+    user = await test_db.users.find_one({"email": "rehash@example.com"})
+    assert user["hashed_password"].startswith("$2b$05$")
+    response = await client.post("/api/auth/login", data=login_data)
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_demoting_an_admin_revokes_their_access_tokens(test_db, monkeypatch):
+    monkeypatch.setattr(admin_service, "users", test_db.users)
+    monkeypatch.setattr(admin_service, "logs", test_db.logs)
+    await test_db.users.insert_one(
+        {"_id": "admin1", "email": "admin@example.com", "isAdmin": True}
+    )
+    admin = CurrentUser(id="admin1", email="admin@example.com", isAdmin=True)
+    token = auth_service.create_access_token(auth_service.access_token_claims(admin))
+
+    current_user = await auth_service.get_current_user(token)
+    assert (current_user.id, current_user.isAdmin) == ("admin1", True)
+
+    other_worker = auth_service.TokenRevocations()
+    assert await other_worker.min_version("admin1") == 0
+    await admin_service.remove_admin_service("admin@example.com", "root@example.com")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await auth_service.get_current_user(token)
+    assert exc_info.value.detail == "Token has been revoked"
+    await other_worker.poll()
+    assert await other_worker.min_version("admin1") == 1
+
+    user = await test_db.users.find_one({"_id": "admin1"})
+    demoted = CurrentUser(id="admin1", email="admin@example.com", token_version=1)
+    assert (user["isAdmin"], user["token_version"]) == (False, 1)
+    token = auth_service.create_access_token(auth_service.access_token_claims(demoted))
+    assert not (await auth_service.get_current_user(token)).isAdmin
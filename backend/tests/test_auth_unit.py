@@ -11,8 +11,9 @@ from backend.app.config import (
     REFRESH_TOKEN_EXPIRE_DAYS,
     SECRET_KEY,
 )
-from backend.app.models import User
+from backend.app.models import User, UserInDB
 from backend.app.services.auth_service import (
+    UserCache,
     _decode_token,
     authenticate_user,
     create_access_token,
@@ -20,6 +21,7 @@ from backend.app.services.auth_service import (
     create_user,
     get_current_user,
     get_user,
+    user_cache,
     verify_password,
     verify_refresh_token,
 )
@@ -31,6 +33,7 @@ def mock_auth_service_users():
     with patch(
         "backend.app.services.auth_service.users", new_callable=AsyncMock
     ) as mock_users:
+        user_cache.clear()
         yield mock_users
 
 
@@ -59,10 +62,7 @@ def mock_user_in_db_data():
 @pytest.mark.asyncio
 async def test_create_user(mock_auth_service_users, mock_user_data):
     mock_auth_service_users.insert_one.return_value = AsyncMock()
-    with patch(
-        "backend.app.services.auth_service.generate_user_id", new_callable=AsyncMock
-    ) as mock_generate_user_id:
-        mock_generate_user_id.return_value = "new_user_id"
+    with patch("backend.app.code_gen.new_id", return_value="new_user_id"):
         user = User(**mock_user_data)
         created_user = await create_user(user)
 
@@ -232,17 +232,59 @@ async def test_verify_refresh_token_user_not_found(mock_auth_service_users):
 async def test_get_current_user_success(mock_auth_service_users, mock_user_in_db_data):
     mock_auth_service_users.find_one.return_value = mock_user_in_db_data
     with patch(
-        "backend.app.services.auth_service._decode_token",
-        return_value="test@example.com",
+        "backend.app.services.auth_service._decode_claims",
+        return_value={"sub": "test@example.com"},
     ):
         user = await get_current_user("valid_access_token")
         assert user.email == mock_user_in_db_data["email"]
 
 
+@pytest.mark.asyncio
+async def test_get_current_user_is_cached_until_invalidated(
+    mock_auth_service_users, mock_user_in_db_data
+):
+    mock_auth_service_users.find_one.return_value = mock_user_in_db_data
+    with patch(
+        "backend.app.services.auth_service._decode_claims",
+        return_value={"sub": "test@example.com"},
+    ):
+        await get_current_user("valid_access_token")
+        await get_current_user("valid_access_token")
+        assert mock_auth_service_users.find_one.await_count == 1
+
+        user_cache.invalidate("test@example.com")
+        mock_auth_service_users.find_one.return_value = {
+            **mock_user_in_db_data,
+            "isAdmin": True,
+        }
+        user = await get_current_user("valid_access_token")
+        assert user.isAdmin
+        assert mock_auth_service_users.find_one.await_count == 2
+
+
+def test_user_cache_evicts_expired_and_least_recently_used(mock_user_in_db_data):
+    cache = UserCache(size=2, ttl=60)
+    user = UserInDB(**{**mock_user_in_db_data, "id": "user123"})
+    for email in ("a", "b"):
+        cache.put(email, user, cache.version)
+    cache.get("a")
+    cache.put("c", user, cache.version)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (user, None, user)
+
+    stale_version = cache.version
+    cache.invalidate("a")
+    cache.put("a", user, stale_version)
+    assert cache.get("a") is None
+
+    expired = UserCache(ttl=0)
+    expired.put("a", user, expired.version)
+    assert expired.get("a") is None
+
+
 @pytest.mark.asyncio
 async def test_get_current_user_invalid_token():
     with patch(
-        "backend.app.services.auth_service._decode_token",
+        "backend.app.services.auth_service._decode_claims",
         side_effect=HTTPException(status_code=401),
     ):
         with pytest.raises(HTTPException) as exc_info:
@@ -254,8 +296,8 @@ async def test_get_current_user_invalid_token():
 async def test_get_current_user_user_not_found(mock_auth_service_users):
     mock_auth_service_users.find_one.return_value = None
     with patch(
-        "backend.app.services.auth_service._decode_token",
-        return_value="nonexistent@example.com",
+        "backend.app.services.auth_service._decode_claims",
+        return_value={"sub": "nonexistent@example.com"},
     ):
         with pytest.raises(HTTPException) as exc_info:
             await get_current_user("valid_access_token")
@@ -1,28 +1,53 @@
 import pytest
+from pymongo.errors import DuplicateKeyError
 
-from backend.app.code_gen import generate_deck_id, generate_game_code, generate_user_id
+import backend.app.code_gen as code_gen
+from backend.app.code_gen import id_stats, insert_with_new_id, new_id
+from backend.app.indexes import ensure_indexes
+
+
+def test_new_id_formats():
+    game_code = new_id("game")
+    assert len(game_code) == 6 and game_code.isalnum()
+    assert game_code == game_code.upper()
+    deck_id = new_id("deck")
+    assert len(deck_id) == 10 and deck_id.isdigit()
+    user_id = new_id("user")
+    assert len(user_id) == 8 and user_id.isalnum()
+    assert user_id == user_id.lower()
 
 
 @pytest.mark.asyncio
-async def test_generate_game_code_unique(test_db):
+async def test_insert_retries_taken_id(test_db, monkeypatch):
     await test_db.games.insert_one({"_id": "AAAAAA"})
-    code = await generate_game_code()
-    assert len(code) == 6 and code.isalnum() and code.isupper()
-    assert code != "AAAAAA"
+    candidates = iter(["AAAAAA", "BBBBBB"])
+    monkeypatch.setattr(code_gen, "new_id", lambda kind: next(candidates))
+    before = id_stats()["game"]
+
+    code = await insert_with_new_id(test_db.games, {"deck": []}, "game")
+
+    assert code == "BBBBBB"
+    assert await test_db.games.find_one({"_id": "BBBBBB"}) == {
+        "_id": "BBBBBB",
+        "deck": [],
+    }
+    after = id_stats()["game"]
+    assert after["allocated"] == before["allocated"] + 1
+    assert after["collisions"] == before["collisions"] + 1
 
 
 @pytest.mark.asyncio
-async def test_generate_deck_id_digits(test_db):
+async def test_insert_gives_up_when_ids_keep_colliding(test_db, monkeypatch):
     await test_db.decks.insert_one({"_id": "1234567890"})
-    deck_id = await generate_deck_id()
-    assert len(deck_id) == 10 and deck_id.isdigit()
-    assert deck_id != "1234567890"
+    monkeypatch.setattr(code_gen, "new_id", lambda kind: "1234567890")
+    with pytest.raises(RuntimeError):
+        await insert_with_new_id(test_db.decks, {"name": "deck"}, "deck")
 
 
 @pytest.mark.asyncio
-async def test_generate_user_id_lowercase(test_db):
-    await test_db.users.insert_one({"_id": "abc12345"})
-    user_id = await generate_user_id()
-    assert len(user_id) == 8 and user_id.isalnum()
-    assert user_id != "abc12345"
-    assert user_id == user_id.lower()
+async def test_insert_raises_other_duplicate_keys(test_db):
+    await ensure_indexes(test_db)
+    await insert_with_new_id(test_db.users, {"email": "a@example.com"}, "user")
+    with pytest.raises(DuplicateKeyError):
+        await insert_with_new_id(test_db.users, {"email": "a@example.com"}, "user")
+    assert await test_db.users.count_documents({}) == 1
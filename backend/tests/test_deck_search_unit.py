@@ -0,0 +1,93 @@
+import pytest
+
+from backend.app.services.deck_search import DeckSearchIndex
+
+
+def _index(*decks):
+    index = DeckSearchIndex(index_words=True)
+    for deck in decks:
+        index.add(deck)
+    return index
+
+
+ANIMALS = {"_id": "d1", "name": "Animals", "tags": ["zoo"], "words": ["cat"]}
+ZOO = {"_id": "d2", "name": "Zoo trip", "tags": ["animals"], "words": ["lion"]}
+FOOD = {"_id": "d3", "name": "Food", "tags": ["kitchen"], "words": ["catfish"]}
+
+
+def test_search_matches_prefixes_and_typos():
+    index = _index(ANIMALS, ZOO, FOOD)
+
+    assert index.search("anim") == ["d1", "d2"]
+    assert index.search("anmals") == ["d1", "d2"]
+    assert index.search("ANIMALS!") == ["d1", "d2"]
+    assert index.search("an") == ["d1", "d2"]
+    assert index.search("a") == []
+
+
+def test_search_ranks_by_field_and_match_quality():
+    index = _index(ANIMALS, ZOO, FOOD)
+
+    # A name beats a tag, and a tag beats a deck's words.
+    assert index.search("zoo") == ["d2", "d1"]
+    # An exact word beats a longer word starting with it.
+    assert index.search("cat") == ["d1", "d3"]
+    # Every term of the query has to match.
+    assert index.search("zoo lion") == ["d2"]
+    assert index.search("zoo kitchen") == []
+
+
+def test_remove_forgets_terms():
+    index = _index(ANIMALS, FOOD)
+    index.remove("d1")
+
+    assert index.search("animals") == []
+    assert "animals" not in index.postings
+    assert len(index) == 1
+
+    index.add({**FOOD, "name": "Snacks"})
+    assert index.search("food") == []
+    assert index.search("snack") == ["d3"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_reads_changed_decks(test_db):
+    await test_db.decks.insert_one({**ANIMALS, "private": False})
+    await test_db.decks.insert_one({**FOOD, "private": True})
+    index = DeckSearchIndex()
+    await index.ready()
+    assert index.search("animals") == ["d1"]
+    assert index.search("food") == []
+
+    await test_db.decks.update_one({"_id": "d1"}, {"$set": {"private": True}})
+    await test_db.decks.update_one({"_id": "d3"}, {"$set": {"private": False}})
+    await index.refresh(["d1", "d3"])
+    assert index.search("animals") == []
+    assert index.search("food") == ["d3"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_during_build_is_applied_after_it(test_db, monkeypatch):
+    from backend.app.services import deck_search
+
+    await test_db.decks.insert_one({**ANIMALS, "private": False})
+    index = DeckSearchIndex()
+    find = deck_search.decks.find
+
+    class StaleCursor:
+        """Reads the decks, then lets a deck change before the build sees them."""
+
+        def __init__(self, *args):
+            self.cursor = find(*args)
+
+        async def to_list(self, length):
+            public = await self.cursor.to_list(length)
+            monkeypatch.setattr(deck_search.decks, "find", find)
+            await test_db.decks.update_one({"_id": "d1"}, {"$set": {"private": True}})
+            await index.refresh(["d1"])
+            return public
+
+    monkeypatch.setattr(deck_search.decks, "find", StaleCursor)
+    await index.build()
+
+    assert index.search("animals") == []
@@ -1,10 +1,15 @@
-from unittest.mock import AsyncMock, MagicMock, patch
+import json
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi import HTTPException
 
+import backend.app.services.gallery_service as gallery_service
 from backend.app.models import UserInDB
 from backend.app.services.gallery_service import (
+    GalleryCache,
+    GalleryCounts,
+    get_gallery_page_service,
     get_gallery_service,
     save_deck_from_gallery_service,
 )
@@ -61,74 +66,92 @@ def mock_gallery_service_users():
         yield mock_users
 
 
+@pytest.fixture
+def gallery_decks(test_db, monkeypatch):
+    monkeypatch.setattr(gallery_service, "decks", test_db.decks)
+    monkeypatch.setattr(gallery_service, "gallery_counts", GalleryCounts())
+    return test_db.decks
+
+
 @pytest.mark.asyncio
-async def test_get_gallery_service_success(mock_gallery_service_decks):
+async def test_get_gallery_service_success(gallery_decks):
     """Test successful retrieval of public decks."""
-    mock_cursor = AsyncMock()
-    mock_cursor.to_list.return_value = [
-        {
-            "decks": [PUBLIC_DECK_2, PUBLIC_DECK_1],
-            "total_count": [{"count": 2}],
-        }
-    ]
-    mock_gallery_service_decks.aggregate = MagicMock(return_value=mock_cursor)
+    for deck in (PUBLIC_DECK_1, PUBLIC_DECK_2, PRIVATE_DECK):
+        await gallery_decks.insert_one(dict(deck))
 
     result = await get_gallery_service(page=1, search=None)
 
     assert result["total_decks"] == 2
-    assert len(result["gallery"]) == 2
-    assert result["gallery"][0].id == PUBLIC_DECK_2["_id"]
-    assert result["gallery"][1].id == PUBLIC_DECK_1["_id"]
-    mock_gallery_service_decks.aggregate.assert_called_once()
+    assert [deck.id for deck in result["gallery"]] == ["deck1", "deck2"]
+    assert result["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_gallery_service_pagination(gallery_decks, monkeypatch):
+    """Test that cursors continue where the previous page ended."""
+    monkeypatch.setattr(gallery_service, "GALLERY_PAGE_SIZE", 2)
+    for i in range(5):
+        await gallery_decks.insert_one(
+            {"_id": f"deck{i}", "name": "Same" if i < 3 else f"Deck {i}"}
+            | {"private": False, "words": []}
+        )
+
+    seen = []
+    result = await get_gallery_service(page=1, search=None)
+    seen += [deck.id for deck in result["gallery"]]
+    while result["next_cursor"]:
+        result = await get_gallery_service(cursor=result["next_cursor"])
+        seen += [deck.id for deck in result["gallery"]]
+        assert result["total_decks"] == 5
+    assert seen == ["deck2", "deck1", "deck0", "deck4", "deck3"]
+
+    result_page_2 = await get_gallery_service(page=2, search=None)
+    assert [deck.id for deck in result_page_2["gallery"]] == ["deck0", "deck4"]
+    result_page_4 = await get_gallery_service(page=4, search=None)
+    assert result_page_4["gallery"] == []
 
 
 @pytest.mark.asyncio
-async def test_get_gallery_service_pagination(mock_gallery_service_decks):
-    """Test pagination logic."""
-    # Page 1
-    mock_cursor_page_1 = AsyncMock()
-    mock_cursor_page_1.to_list.return_value = [
-        {
-            "decks": [PUBLIC_DECK_1] * 10,
-            "total_count": [{"count": 20}],
-        }
-    ]
-    mock_gallery_service_decks.aggregate = MagicMock(return_value=mock_cursor_page_1)
-    result_page_1 = await get_gallery_service(page=1, search=None)
-    assert result_page_1["total_decks"] == 20
-    assert len(result_page_1["gallery"]) == 10
-
-    # Page 3 (empty)
-    mock_cursor_page_3 = AsyncMock()
-    mock_cursor_page_3.to_list.return_value = [
-        {"decks": [], "total_count": [{"count": 20}]}
-    ]
-    mock_gallery_service_decks.aggregate = MagicMock(return_value=mock_cursor_page_3)
-    result_page_3 = await get_gallery_service(page=3, search=None)
-    assert result_page_3["total_decks"] == 20
-    assert len(result_page_3["gallery"]) == 0
+async def test_get_gallery_service_caches_counts(gallery_decks):
+    """Test that the number of decks is not recounted for every page."""
+    await gallery_decks.insert_one(dict(PUBLIC_DECK_1))
+    assert (await get_gallery_service(page=1))["total_decks"] == 1
+
+    await gallery_decks.insert_one(dict(PUBLIC_DECK_2))
+    result = await get_gallery_service(page=1)
+    assert len(result["gallery"]) == 2
+    assert result["total_decks"] == 1
+
+    gallery_service.gallery_counts.clear()
+    assert (await get_gallery_service(page=1))["total_decks"] == 2
 
 
 @pytest.mark.asyncio
-async def test_get_gallery_service_search(mock_gallery_service_decks):
-    """Test search functionality."""
-    mock_cursor = AsyncMock()
-    mock_cursor.to_list.return_value = [
-        {
-            "decks": [PUBLIC_DECK_2],
-            "total_count": [{"count": 1}],
-        }
-    ]
-    mock_gallery_service_decks.aggregate = MagicMock(return_value=mock_cursor)
-
-    result = await get_gallery_service(page=1, search="Another")
+async def test_get_gallery_service_invalid_cursor(gallery_decks):
+    for cursor in ("not a cursor", "WzFd"):
+        with pytest.raises(HTTPException) as exc_info:
+            await get_gallery_service(cursor=cursor)
+        assert exc_info.value.status_code == 400
 
+
+@pytest.mark.asyncio
+async def test_get_gallery_service_search(gallery_decks, monkeypatch):
+    """Test that searches are ranked and paged from the search index."""
+    monkeypatch.setattr(gallery_service, "GALLERY_PAGE_SIZE", 1)
+    for deck in (PUBLIC_DECK_1, PUBLIC_DECK_2, PRIVATE_DECK):
+        await gallery_decks.insert_one(dict(deck))
+
+    result = await get_gallery_service(page=1, search="anoth")
+    assert [deck.id for deck in result["gallery"]] == ["deck2"]
     assert result["total_decks"] == 1
-    assert len(result["gallery"]) == 1
-    assert result["gallery"][0].name == "Another Public Deck"
-    # Ensure the query includes the $text search
-    call_args = mock_gallery_service_decks.aggregate.call_args[0][0]
-    assert "$search" in call_args[0]["$match"]["$text"]
+    assert result["next_cursor"] is None
+
+    result = await get_gallery_service(page=1, search="deck")
+    assert result["total_decks"] == 2
+    assert [deck.id for deck in result["gallery"]] == ["deck2"]
+    result = await get_gallery_service(search="deck", cursor=result["next_cursor"])
+    assert [deck.id for deck in result["gallery"]] == ["deck1"]
+    assert result["next_cursor"] is None
 
 
 @pytest.mark.asyncio
@@ -140,12 +163,11 @@ async def test_get_gallery_service_invalid_page():
 
 
 @pytest.mark.asyncio
-@patch("backend.app.services.gallery_service.generate_deck_id", new_callable=AsyncMock)
+@patch("backend.app.code_gen.new_id", return_value="new_deck_id")
 async def test_save_deck_from_gallery_success(
-    mock_generate_id, mock_gallery_service_decks, mock_gallery_service_users
+    mock_new_id, test_db, mock_gallery_service_decks, mock_gallery_service_users
 ):
     """Test successfully saving a public deck."""
-    mock_generate_id.return_value = "new_deck_id"
     mock_gallery_service_decks.find_one.return_value = PUBLIC_DECK_1
     mock_gallery_service_users.update_one.return_value = AsyncMock()
     mock_gallery_service_decks.insert_one.return_value = AsyncMock()
@@ -157,6 +179,10 @@ async def test_save_deck_from_gallery_success(
         {"_id": PUBLIC_DECK_1["_id"]}
     )
     mock_gallery_service_decks.insert_one.assert_called_once()
+    saved = mock_gallery_service_decks.insert_one.call_args[0][0]
+    assert "words" not in saved
+    stored = await test_db.word_lists.find_one({"_id": saved["words_ref"]})
+    assert stored["words"] == PUBLIC_DECK_1["words"]
     mock_gallery_service_users.update_one.assert_called_once_with(
         {"_id": CURRENT_USER.id}, {"$addToSet": {"deck_ids": "new_deck_id"}}
     )
@@ -190,3 +216,20 @@ async def test_save_deck_from_gallery_already_owned(mock_gallery_service_decks):
     with pytest.raises(HTTPException) as exc_info:
         await save_deck_from_gallery_service(deck_already_owned["_id"], CURRENT_USER)
     assert exc_info.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_gallery_cache_serves_pages_until_invalidated(gallery_decks, monkeypatch):
+    monkeypatch.setattr(gallery_service, "gallery_cache", GalleryCache())
+    await gallery_decks.insert_one(dict(PUBLIC_DECK_1))
+
+    body, etag = await get_gallery_page_service(page=1)
+    await gallery_decks.insert_one(dict(PUBLIC_DECK_2))
+    assert await get_gallery_page_service(page=1) == (body, etag)
+
+    gallery_service.gallery_cache.clear()
+    new_body, new_etag = await get_gallery_page_service(page=1)
+    assert json.loads(new_body)["total_decks"] == 2
+    assert new_etag != etag
+    metrics = gallery_service.gallery_cache.metrics()
+    assert (metrics["hits"], metrics["misses"], metrics["pages"]) == (1, 2, 1)
@@ -0,0 +1,149 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from backend.app.services.game_bus import GameBus, InProcessGameBus, MongoGameBus
+
+
+def _collector(received: list):
+    async def handler(game_id, message):
+        received.append((game_id, message))
+
+    return handler
+
+
+async def _relay(test_db, *buses: MongoGameBus) -> None:
+    """Feeds every stored event to the buses, as their change streams would."""
+    for event in await test_db.game_events.find().to_list(None):
+        for bus in buses:
+            await bus.receive(event)
+    await test_db.game_events.delete_many({})
+
+
+async def _expire_lease(test_db, game_id: str) -> None:
+    """Lets a lease lapse, as if its owner had stalled past a renewal."""
+    past = datetime.now(UTC) - timedelta(seconds=1)
+    await test_db.game_leases.update_one(
+        {"_id": game_id}, {"$set": {"expires_at": past}}
+    )
+
+
+def test_bus_without_ownership_cannot_be_created():
+    class HalfBus(GameBus):
+        async def publish(self, game_id, message):
+            await self.deliver(game_id, message)
+
+    with pytest.raises(TypeError):
+        HalfBus()  # type: ignore[abstract]
+
+
+@pytest.mark.asyncio
+async def test_in_process_bus_delivers_to_subscribed_games():
+    bus = InProcessGameBus()
+    received: list = []
+    bus.handler = _collector(received)
+    bus.subscribe("g1")
+
+    assert await bus.claim("g1")
+    await bus.publish("g1", {"kind": "state"})
+    await bus.publish("g2", {"kind": "state"})
+    assert received == [("g1", {"kind": "state"})]
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_holds_a_lease(test_db):
+    first = MongoGameBus(test_db, worker_id="w1")
+    second = MongoGameBus(test_db, worker_id="w2")
+
+    assert await first.claim("g1")
+    assert not await second.claim("g1")
+    assert first.owns("g1") and not second.owns("g1")
+    assert second.stats["claims_contended"] == 1
+
+    await _expire_lease(test_db, "g1")
+    assert await second.claim("g1")
+    assert (first.fence("g1"), second.fence("g1")) == (1, 2)
+    lease = await test_db.game_leases.find_one({"_id": "g1"})
+    assert lease["owner"] == "w2"
+    await first.stop()
+    await second.stop()
+
+
+@pytest.mark.asyncio
+async def test_messages_reach_other_workers_once(test_db):
+    owner = MongoGameBus(test_db, worker_id="w1")
+    follower = MongoGameBus(test_db, worker_id="w2")
+    owner_received: list = []
+    follower_received: list = []
+    owner.handler = _collector(owner_received)
+    follower.handler = _collector(follower_received)
+    owner.subscribe("g1")
+    follower.subscribe("g1")
+
+    await follower.publish("g1", {"kind": "action", "action": {"action": "sync"}})
+    await _relay(test_db, owner, follower)
+
+    message = ("g1", {"kind": "action", "action": {"action": "sync"}})
+    assert owner_received == [message]
+    assert follower_received == [message]
+    await owner.stop()
+    await follower.stop()
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_released_game(test_db):
+    owner = MongoGameBus(test_db, worker_id="w1")
+    follower = MongoGameBus(test_db, worker_id="w2")
+    received: list = []
+    follower.handler = _collector(received)
+    follower.subscribe("g1")
+
+    assert await owner.claim("g1")
+    assert not await follower.claim("g1")
+    await owner.release("g1")
+    await _relay(test_db, follower)
+
+    assert follower.owns("g1")
+    assert received == [("g1", {"kind": "claimed"})]
+    await owner.stop()
+    await follower.stop()
+
+
+@pytest.mark.asyncio
+async def test_epochs_keep_rising_across_releases(test_db):
+    first = MongoGameBus(test_db, worker_id="w1")
+    second = MongoGameBus(test_db, worker_id="w2")
+    third = MongoGameBus(test_db, worker_id="w3")
+
+    assert await first.claim("g1")
+    await _expire_lease(test_db, "g1")
+    assert await second.claim("g1")
+    await second.release("g1")
+    assert await third.claim("g1")
+
+    assert (first.fence("g1"), third.fence("g1")) == (1, 3)
+    await first.stop()
+    await second.stop()
+    await third.stop()
+
+
+@pytest.mark.asyncio
+async def test_renewal_gives_up_games_taken_over(test_db):
+    first = MongoGameBus(test_db, worker_id="w1")
+    second = MongoGameBus(test_db, worker_id="w2")
+    received: list = []
+    first.handler = _collector(received)
+    first.subscribe("g1")
+    first.subscribe("g2")
+
+    assert await first.claim("g1")
+    assert await first.claim("g2")
+    await _expire_lease(test_db, "g1")
+    assert await second.claim("g1")
+    await first.renew()
+
+    assert not first.owns("g1") and first.owns("g2")
+    assert first.stats["leases_lost"] == 1
+    assert received == [("g1", {"kind": "lost"})]
+    await first.stop()
+    await second.stop()
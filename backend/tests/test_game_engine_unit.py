@@ -0,0 +1,196 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from backend.app.services import game_events
+from backend.app.services.game_engine import GameEngine
+
+# Seed whose order draws the words of a deck of up to three in deck order
+IN_ORDER = 1
+
+
+def _game(game_id: str, **overrides):
+    game = {
+        "_id": game_id,
+        "teams": {
+            "team_1": {
+                "id": "team_1",
+                "name": "Team 1",
+                "players": [],
+                "seed": IN_ORDER,
+                "words_amount": 2,
+                "word_index": 0,
+                "current_word": None,
+                "expires_at": None,
+                "current_master": None,
+                "correct_players": [],
+                "state": "pending",
+                "scores": {},
+                "player_attempts": {},
+                "current_correct": 0,
+                "right_answers_to_advance": 1,
+            }
+        },
+        "deck": ["apple", "pear"],
+        "time_for_guessing": 60,
+        "tries_per_player": 0,
+        "rotate_masters": False,
+        "game_state": "pending",
+        "winning_team": None,
+    }
+    game.update(overrides)
+    return game
+
+
+@pytest.mark.asyncio
+async def test_actions_apply_in_memory_without_writes(test_db):
+    await test_db.games.insert_one(_game("eng_memory"))
+    engine = GameEngine(flush_interval=60)
+    await engine.load("eng_memory")
+
+    engine.join("eng_memory", "host_p", "team_1")
+    engine.join("eng_memory", "p2", "team_1")
+    assert engine.start_game("eng_memory")
+    assert engine.guess("eng_memory", "p2", "team_1", "apple")
+
+    team = engine.games["eng_memory"]["teams"]["team_1"]
+    assert team["scores"] == {"host_p": 0, "p2": 1}
+    assert team["current_word"] == "pear"
+    stored = await test_db.games.find_one({"_id": "eng_memory"})
+    assert stored["teams"]["team_1"]["players"] == []
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_dirty_paths(test_db):
+    await test_db.games.insert_one(_game("eng_flush"))
+    engine = GameEngine(flush_interval=60)
+    await engine.load("eng_flush")
+
+    engine.join("eng_flush", "p1", "team_1")
+    engine.join("eng_flush", "p2", "team_1")
+    engine.leave("eng_flush", "p1", "team_1")
+    await engine.flush()
+
+    stored = await test_db.games.find_one({"_id": "eng_flush"})
+    team = stored["teams"]["team_1"]
+    assert team["players"] == ["p2"]
+    assert team["scores"] == {"p2": 0}
+    assert team["current_master"] == "p2"
+    assert isinstance(stored["last_activity_at"], datetime)
+    assert engine.evict("eng_flush")
+    assert "eng_flush" not in engine.games
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_guess_rejected_after_tries_or_expiry(test_db):
+    await test_db.games.insert_one(_game("eng_tries", tries_per_player=1))
+    engine = GameEngine(flush_interval=60)
+    await engine.load("eng_tries")
+    engine.join("eng_tries", "master", "team_1")
+    engine.join("eng_tries", "p2", "team_1")
+    engine.start_game("eng_tries")
+
+    assert engine.guess("eng_tries", "p2", "team_1", "wrong")
+    assert not engine.guess("eng_tries", "p2", "team_1", "apple")
+    assert not engine.guess("eng_tries", "master", "team_1", "apple")
+
+    team = engine.games["eng_tries"]["teams"]["team_1"]
+    team["player_attempts"] = {}
+    team["expires_at"] = datetime.now(UTC) - timedelta(seconds=1)
+    assert not engine.guess("eng_tries", "p2", "team_1", "apple")
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_switch_team_moves_player_and_master(test_db):
+    game = _game("eng_switch")
+    game["teams"]["team_2"] = {
+        **game["teams"]["team_1"],
+        "id": "team_2",
+        "name": "Team 2",
+        "players": [],
+        "scores": {},
+    }
+    await test_db.games.insert_one(game)
+    engine = GameEngine(flush_interval=60)
+    await engine.load("eng_switch")
+    engine.join("eng_switch", "p1", "team_1")
+
+    assert engine.switch_team("eng_switch", "p1", "team_1", "team_2")
+    assert not engine.switch_team("eng_switch", "p1", "team_2", "missing")
+    await engine.flush("eng_switch")
+
+    stored = await test_db.games.find_one({"_id": "eng_switch"})
+    assert stored["teams"]["team_1"]["players"] == []
+    assert stored["teams"]["team_1"]["current_master"] is None
+    assert stored["teams"]["team_2"]["players"] == ["p1"]
+    assert stored["teams"]["team_2"]["current_master"] == "p1"
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_last_word_finishes_game(test_db):
+    await test_db.games.insert_one(_game("eng_finish"))
+    engine = GameEngine(flush_interval=60)
+    await engine.load("eng_finish")
+    engine.join("eng_finish", "master", "team_1")
+    engine.join("eng_finish", "p2", "team_1")
+    engine.start_game("eng_finish")
+
+    engine.skip("eng_finish", "master", "team_1")
+    engine.skip("eng_finish", "master", "team_1")
+    game = engine.games["eng_finish"]
+    assert game["game_state"] == "finished"
+    assert game["winning_team"] == "team_1"
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_finished_game_records_nothing_more(test_db):
+    await test_db.games.insert_one(_game("eng_done", tries_per_player=1))
+    engine = GameEngine(flush_interval=60)
+    await engine.load("eng_done")
+    engine.join("eng_done", "master", "team_1")
+    engine.join("eng_done", "p2", "team_1")
+    engine.start_game("eng_done")
+    engine.stop_game("eng_done")
+
+    engine.leave("eng_done", "p2", "team_1")
+    engine.join("eng_done", "p3", "team_1")
+    assert not engine.guess("eng_done", "p2", "team_1", "apple")
+    assert not engine.skip("eng_done", "master", "team_1")
+    await engine.stop()
+
+    team = engine.games["eng_done"]["teams"]["team_1"]
+    assert team["players"] == ["master", "p2"]
+    assert team["scores"] == {"master": 0, "p2": 0}
+    await game_events.event_log.flush()
+    events = await game_events.event_log.read("eng_done")
+    assert events[-1]["kind"] == game_events.FINISHED
+
+
+@pytest.mark.asyncio
+async def test_superseded_owner_cannot_flush(test_db):
+    await test_db.games.insert_one(_game("eng_fence"))
+    stale = GameEngine(flush_interval=60)
+    current = GameEngine(flush_interval=60)
+    assert await stale.load("eng_fence", fence=1)
+    assert await current.load("eng_fence", fence=2)
+
+    current.join("eng_fence", "p1", "team_1")
+    stale.join("eng_fence", "p2", "team_1")
+    await current.flush()
+    await stale.flush()
+
+    stored = await test_db.games.find_one({"_id": "eng_fence"})
+    assert stored["teams"]["team_1"]["players"] == ["p1"]
+    assert stored["owner_epoch"] == 2
+    assert "eng_fence" not in stale.games
+    assert stale.stats["fenced_writes"] == 1
+
+    assert await stale.load("eng_fence", fence=1) is None
+    assert stale.stats["stale_loads"] == 1
+    await current.stop()
+    await stale.stop()
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from backend.app.indexes import ensure_indexes
+from backend.app.services.game_bus import MongoGameBus
+from backend.app.services.game_events import FINISHED, GameEventLog
+
+
+@pytest.mark.asyncio
+async def test_flush_appends_events_with_consecutive_offsets(test_db):
+    log = GameEventLog()
+    log.emit("g1", "started")
+    log.emit("g1", "guess", team_id="team_1", player="p1", correct=False)
+    log.emit("g2", "started")
+    await log.stop()
+
+    events = await log.read("g1")
+    assert [(e["offset"], e["kind"]) for e in events] == [(0, "started"), (1, "guess")]
+    assert events[1]["player"] == "p1"
+    assert [e["offset"] for e in await log.read("g1", offset=1)] == [1]
+    assert [e["offset"] for e in await log.read("g2")] == [0]
+    assert log.stats["events"] == 3
+
+
+@pytest.mark.asyncio
+async def test_new_owner_continues_from_stored_offset(test_db):
+    first = GameEventLog()
+    first.emit("g1", "started")
+    await first.stop()
+
+    second = GameEventLog()
+    second.emit("g1", FINISHED, winning_team="team_1")
+    await second.stop()
+
+    assert [e["offset"] for e in await second.read("g1")] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_discarded_game_drops_unwritten_events(test_db):
+    log = GameEventLog()
+    log.emit("g1", "started")
+    log.discard("g1")
+    await log.stop()
+
+    assert await log.read("g1") == []
+
+
+@pytest.mark.asyncio
+async def test_follow_resumes_from_offset_and_ends_with_game(test_db):
+    log = GameEventLog(flush_interval=0.01)
+    log.emit("g1", "started")
+    log.emit("g1", "joined", team_id="team_1", player="p1")
+    await log.flush()
+
+    async def consume() -> list[tuple[int, str]]:
+        return [(e["offset"], e["kind"]) async for e in log.follow("g1", offset=1)]
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    log.emit("g1", FINISHED, winning_team=None)
+    seen = await asyncio.wait_for(consumer, 1)
+    await log.stop()
+
+    assert seen == [(1, "joined"), (2, FINISHED)]
+
+
+@pytest.mark.asyncio
+async def test_follow_stops_once_game_is_gone(test_db):
+    log = GameEventLog()
+    await test_db.games.insert_one({"_id": "g1", "game_state": "in_progress"})
+    log.emit("g1", "started")
+    await log.flush()
+
+    async def consume() -> list[str]:
+        return [e["kind"] async for e in log.follow("g1", poll_seconds=0.01)]
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    assert not consumer.done()
+    await test_db.games.delete_one({"_id": "g1"})
+
+    assert await asyncio.wait_for(consumer, 1) == ["started"]
+    assert not log._arrivals and not log._followers
+
+
+@pytest.mark.asyncio
+async def test_last_follower_leaving_forgets_the_game(test_db):
+    log = GameEventLog()
+    await test_db.games.insert_one({"_id": "g1", "game_state": "in_progress"})
+
+    async def consume() -> None:
+        async for _ in log.follow("g1"):
+            pass
+
+    followers = [asyncio.create_task(consume()) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    followers[0].cancel()
+    await asyncio.sleep(0.01)
+    assert "g1" in log._arrivals
+
+    followers[1].cancel()
+    await asyncio.sleep(0.01)
+    assert not log._arrivals and not log._followers
+
+
+@pytest.mark.asyncio
+async def test_log_and_bus_share_a_database(test_db):
+    await ensure_indexes(test_db)
+    bus = MongoGameBus(test_db, worker_id="w1")
+    follower = MongoGameBus(test_db, worker_id="w2")
+    follower.subscribe("g1")
+    log = GameEventLog()
+
+    log.emit("g1", "started")
+    await bus.publish("g1", {"kind": "state"})
+    await bus.publish("g1", {"kind": "state"})
+    log.emit("g1", "finished")
+    await log.stop()
+    # Every bus message is read as one by the other workers.
+    for message in await test_db.game_events.find().to_list(None):
+        await follower.receive(message)
+
+    assert log.stats["failed_batches"] == 0
+    assert [e["kind"] for e in await log.read("g1")] == ["started", "finished"]
+    assert await test_db.game_events.count_documents({}) == 2
+    await bus.stop()
+    await follower.stop()
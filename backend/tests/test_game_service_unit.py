@@ -1,33 +1,47 @@
+import asyncio
+import json
 from datetime import datetime
 
 import pytest
 
+from backend.app.services.game_engine import GameEngine
 from backend.app.services.game_service import (
-    add_player_to_game,
-    process_new_word,
-    reassign_master,
-    remove_player_from_game,
+    ConnectionManager,
+    backfill_game_decks,
+    choose_master,
+    diff_state,
 )
+from backend.app.services.word_lists import store_words
+
+
+async def _load(test_db, game: dict) -> GameEngine:
+    await test_db.games.insert_one(game)
+    engine = GameEngine()
+    await engine.load(game["_id"])
+    return engine
 
 
 @pytest.mark.asyncio
-async def test_add_player_to_game(test_db):
-    await test_db.games.insert_one(
+async def test_join_adds_player_and_first_master(test_db):
+    engine = await _load(
+        test_db,
         {
             "_id": "game_add_player",
             "teams": {"team_1": {"players": [], "scores": {}}},
             "rotate_masters": False,
-        }
+        },
     )
-    game = await add_player_to_game("game_add_player", "player1", "team_1")
-    assert "player1" in game["teams"]["team_1"]["players"]
-    assert game["teams"]["team_1"]["scores"]["player1"] == 0
-    assert game["teams"]["team_1"]["current_master"] == "player1"
+    engine.join("game_add_player", "player1", "team_1")
+    team = engine.games["game_add_player"]["teams"]["team_1"]
+    assert "player1" in team["players"]
+    assert team["scores"]["player1"] == 0
+    assert team["current_master"] == "player1"
 
 
 @pytest.mark.asyncio
-async def test_remove_player_from_game(test_db):
-    await test_db.games.insert_one(
+async def test_leave_removes_player_and_reassigns_master(test_db):
+    engine = await _load(
+        test_db,
         {
             "_id": "game_remove_player",
             "teams": {
@@ -38,108 +52,333 @@ async def test_remove_player_from_game(test_db):
                 }
             },
             "rotate_masters": False,
-        }
+            "game_state": "in_progress",
+        },
     )
-    game = await remove_player_from_game("game_remove_player", "player1", "team_1")
+    engine.leave("game_remove_player", "player1", "team_1")
+    await engine.flush()
+    game = await test_db.games.find_one({"_id": "game_remove_player"})
     assert "player1" not in game["teams"]["team_1"]["players"]
     assert "player1" not in game["teams"]["team_1"]["scores"]
     assert game["teams"]["team_1"]["current_master"] == "player2"
 
 
-@pytest.mark.asyncio
-async def test_reassign_master(test_db):
-    await test_db.games.insert_one(
-        {
-            "_id": "game_reassign_master",
-            "teams": {"team_1": {"players": ["p1", "p2"], "current_master": "p1"}},
-            "rotate_masters": True,
-        }
-    )
-    await reassign_master("game_reassign_master", "team_1")
-    game = await test_db.games.find_one({"_id": "game_reassign_master"})
-    assert game["teams"]["team_1"]["current_master"] == "p2"
+def test_choose_master_rotates_or_keeps_first_player():
+    team = {"players": ["p1", "p2", "p3"], "current_master": "p2"}
+    assert choose_master({"rotate_masters": True}, team) == "p3"
+    assert choose_master({"rotate_masters": False}, team) == "p1"
+    assert choose_master({"rotate_masters": True}, {"players": []}) is None
 
 
 @pytest.mark.asyncio
-async def test_process_new_word_finishes_game_when_all_teams_done(test_db):
-    await test_db.games.insert_one(
+async def test_advance_word_finishes_game_when_all_teams_done(test_db):
+    engine = await _load(
+        test_db,
         {
             "_id": "g1_all_finish",
             "teams": {
                 "team_1": {
                     "id": "team_1",
-                    "remaining_words": [],
+                    "seed": 0,
+                    "words_amount": 1,
+                    "word_index": 1,
                     "state": "in_progress",
                     "players": [],
                     "scores": {},
                 },
                 "team_2": {
                     "id": "team_2",
-                    "remaining_words": [],
+                    "seed": 0,
+                    "words_amount": 1,
+                    "word_index": 1,
                     "state": "finished",
                     "players": [],
                     "scores": {"p1": 5},
                 },
             },
+            "deck": ["one"],
+            "time_for_guessing": 5,
             "game_state": "in_progress",
-        }
+        },
     )
-    result = await process_new_word("g1_all_finish", "team_1", 5)
+    engine.advance_word("g1_all_finish", "team_1")
+    await engine.flush()
+    result = await test_db.games.find_one({"_id": "g1_all_finish"})
     assert result["game_state"] == "finished"
     assert result["winning_team"] == "team_2"
 
 
 @pytest.mark.asyncio
-async def test_process_new_word_sets_next_word(test_db):
-    await test_db.games.insert_one(
+async def test_advance_word_sets_next_word(test_db):
+    engine = await _load(
+        test_db,
         {
             "_id": "g2_next_word",
             "teams": {
                 "team_1": {
                     "id": "team_1",
-                    "remaining_words": ["one", "two"],
+                    "seed": 0,
+                    "words_amount": 2,
                     "scores": {},
                     "state": "pending",
                     "players": ["player1"],
                     "current_master": "player1",
                 }
             },
+            "deck_ref": await store_words(["two", "one", "three"]),
+            "seed": 1,
+            "words_amount": 2,
+            "time_for_guessing": 1,
             "game_state": "pending",
             "rotate_masters": False,
-        }
+        },
     )
-    result = await process_new_word("g2_next_word", "team_1", 1)
+    engine.advance_word("g2_next_word", "team_1")
+    await engine.flush()
+    result = await test_db.games.find_one({"_id": "g2_next_word"})
     assert result["teams"]["team_1"]["state"] == "in_progress"
     assert result["teams"]["team_1"]["current_word"] == "one"
-    assert len(result["teams"]["team_1"]["remaining_words"]) == 1
+    assert result["teams"]["team_1"]["word_index"] == 1
+    assert result["teams"]["team_1"]["seed"] == 0
+    assert "deck" not in result
     assert isinstance(result["teams"]["team_1"]["expires_at"], datetime)
 
 
 @pytest.mark.asyncio
-async def test_reassign_game_master_after_player_removed(test_db):
-    # Setup game with two players in one team
-    game_id = "game_reassign_master_on_remove"
-    team_id = "team_1"
-    player1 = "player1"
-    player2 = "player2"
-
+async def test_backfill_moves_embedded_decks_to_word_lists(test_db):
     await test_db.games.insert_one(
         {
-            "_id": game_id,
+            "_id": "g_embedded",
             "teams": {
-                team_id: {
-                    "players": [player1, player2],
-                    "scores": {player1: 0, player2: 0},
-                    "current_master": player1,
+                "team_1": {
+                    "id": "team_1",
+                    "remaining_words": ["one", "three"],
+                    "current_word": "two",
+                    "scores": {},
+                    "state": "in_progress",
+                    "players": ["player1"],
+                    "current_master": "player1",
                 }
             },
-            "rotate_masters": True,
+            "deck": ["two", "one", "three"],
+            "words_amount": 3,
+            "time_for_guessing": 1,
+            "game_state": "in_progress",
+            "rotate_masters": False,
         }
     )
+    await backfill_game_decks()
+    stored = await test_db.games.find_one({"_id": "g_embedded"})
+    assert "deck" not in stored
+    assert "remaining_words" not in stored["teams"]["team_1"]
+
+    engine = GameEngine()
+    await engine.load("g_embedded")
+    team = engine.games["g_embedded"]["teams"]["team_1"]
+    drawn = []
+    for _ in range(2):
+        engine.advance_word("g_embedded", "team_1")
+        drawn.append(team["current_word"])
+    assert drawn == ["one", "three"]
+    engine.advance_word("g_embedded", "team_1")
+    assert team["state"] == "finished"
+
+
+@pytest.mark.asyncio
+async def test_game_without_seed_keeps_stored_order(test_db):
+    engine = await _load(
+        test_db,
+        {
+            "_id": "g_stored_order",
+            "teams": {
+                "team_1": {
+                    "id": "team_1",
+                    "order": [1, 0],
+                    "scores": {},
+                    "state": "pending",
+                    "players": ["player1"],
+                    "current_master": "player1",
+                }
+            },
+            "deck_ref": await store_words(["two", "one", "three"]),
+            "picks": [2, 0],
+            "time_for_guessing": 1,
+            "game_state": "pending",
+            "rotate_masters": False,
+        },
+    )
+    engine.advance_word("g_stored_order", "team_1")
+    engine.advance_word("g_stored_order", "team_1")
+    await engine.flush()
+    result = await test_db.games.find_one({"_id": "g_stored_order"})
+    assert result["teams"]["team_1"]["current_word"] == "three"
+    assert result["teams"]["team_1"]["word_index"] == 2
+
+    engine.advance_word("g_stored_order", "team_1")
+    assert engine.games["g_stored_order"]["teams"]["team_1"]["state"] == "finished"
+
+
+def test_diff_state_reports_changed_and_removed_paths():
+    old = {
+        "game_state": "in_progress",
+        "current_word": "one",
+        "team_scores": {"p1": 0, "p2": 3},
+        "players_in_team": ["p1", "p2"],
+    }
+    new = {
+        "game_state": "in_progress",
+        "current_word": None,
+        "team_scores": {"p1": 1},
+        "players_in_team": ["p1"],
+    }
+    changes, removed = diff_state(old, new)
+    assert changes == {
+        "current_word": None,
+        "team_scores": {"p1": 1},
+        "players_in_team": ["p1"],
+    }
+    assert removed == [["team_scores", "p2"]]
+
+
+class _RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+@pytest.mark.asyncio
+async def test_broadcast_sends_snapshot_then_patches():
+    manager = ConnectionManager()
+    ws = _RecordingSocket()
+    manager.players["g_delta"] = [(ws, "p1", "team_1")]
+    game = {
+        "game_state": "pending",
+        "tries_per_player": 0,
+        "teams": {
+            "team_1": {
+                "name": "Team 1",
+                "players": ["p1"],
+                "scores": {"p1": 0},
+                "seed": 0,
+                "words_amount": 2,
+            }
+        },
+    }
+
+    await manager.broadcast_state("g_delta", game)
+    await manager.outboxes[ws].queue.join()
+    game["teams"]["team_1"]["scores"]["p1"] = 1
+    await manager.broadcast_state("g_delta", game)
+    await manager.broadcast_state("g_delta", game)
+    await manager.outboxes[ws].queue.join()
+
+    assert [m["type"] for m in ws.sent] == ["snapshot", "patch"]
+    assert ws.sent[0]["state"]["team_scores"] == {"p1": 0}
+    assert ws.sent[0]["self"] == {"tries_left": None}
+    assert ws.sent[1]["version"] == 2
+    assert ws.sent[1]["changes"] == {
+        "team_scores": {"p1": 1},
+        "all_teams_scores": {"Team 1": 1},
+    }
+
+    await manager.resync("g_delta", ws, game)
+    await manager.outboxes[ws].queue.join()
+    assert ws.sent[-1]["type"] == "snapshot"
+    assert ws.sent[-1]["state"]["team_scores"] == {"p1": 1}
+
+
+class _StalledSocket(_RecordingSocket):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, data):
+        await self.release.wait()
+        await super().send_text(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_does_not_block_and_is_resynced(monkeypatch):
+    monkeypatch.setattr("backend.app.services.game_service.WS_SEND_QUEUE_SIZE", 2)
+    manager = ConnectionManager()
+    slow, fast = _StalledSocket(), _RecordingSocket()
+    manager.players["g_slow"] = [(slow, "p1", "team_1"), (fast, "p2", "team_1")]
+    game = {
+        "game_state": "pending",
+        "tries_per_player": 0,
+        "teams": {"team_1": {"name": "Team 1", "players": [], "scores": {}}},
+    }
+
+    for i in range(5):
+        game["teams"]["team_1"]["scores"] = {"p1": i}
+        await manager.broadcast_state("g_slow", game)
+        await asyncio.sleep(0)
+    await manager.outboxes[fast].queue.join()
+    assert len(fast.sent) == 5
+
+    slow.release.set()
+    await manager.outboxes[slow].queue.join()
+    assert [m["type"] for m in slow.sent] == ["snapshot", "snapshot", "patch"]
+    assert slow.sent[1]["state"]["team_scores"] == {"p1": 3}
+    assert slow.sent[2]["changes"]["team_scores"] == {"p1": 4}
+
+
+@pytest.mark.asyncio
+async def test_socket_falling_behind_repeatedly_is_dropped(monkeypatch):
+    monkeypatch.setattr("backend.app.services.game_service.WS_SEND_QUEUE_SIZE", 1)
+    monkeypatch.setattr("backend.app.services.game_service.WS_MAX_RESYNCS", 1)
+    manager = ConnectionManager()
+    slow = _StalledSocket()
+    manager.players["g_drop"] = [(slow, "p1", "team_1")]
+    game = {
+        "game_state": "pending",
+        "tries_per_player": 0,
+        "teams": {"team_1": {"name": "Team 1", "players": [], "scores": {}}},
+    }
+
+    for i in range(6):
+        game["teams"]["team_1"]["scores"] = {"p1": i}
+        await manager.broadcast_state("g_drop", game)
+    await asyncio.sleep(0)
+    assert slow.closed_with == 1013
+    assert slow not in manager.outboxes
+
+
+@pytest.mark.asyncio
+async def test_team_view_is_shared_and_tries_left_sent_per_player():
+    manager = ConnectionManager()
+    first, second = _RecordingSocket(), _RecordingSocket()
+    manager.players["g_shared"] = [(first, "p1", "team_1"), (second, "p2", "team_1")]
+    game = {
+        "game_state": "in_progress",
+        "tries_per_player": 3,
+        "teams": {
+            "team_1": {
+                "name": "Team 1",
+                "players": ["p1", "p2"],
+                "scores": {"p1": 0, "p2": 0},
+                "player_attempts": {},
+            }
+        },
+    }
 
-    # Remove the current game master
-    await remove_player_from_game(game_id, player1, team_id)
+    await manager.broadcast_state("g_shared", game)
+    game["teams"]["team_1"]["player_attempts"] = {"p2": 1}
+    await manager.broadcast_state("g_shared", game)
+    await manager.outboxes[first].queue.join()
+    await manager.outboxes[second].queue.join()
 
-    # Verify that the game master is reassigned to the next player
-    game = await test_db.games.find_one({"_id": game_id})
-    assert game["teams"][team_id]["current_master"] == player2
+    assert first.sent[0]["state"] == second.sent[0]["state"]
+    assert len(first.sent) == 1
+    assert second.sent[1] == {
+        "type": "patch",
+        "version": 2,
+        "changes": {},
+        "self": {"tries_left": 2},
+    }
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.app.services.hashing import HashingPool
+
+
+@pytest.mark.asyncio
+async def test_calls_beyond_the_cap_wait_for_a_thread():
+    pool = HashingPool(workers=2)
+    release = threading.Event()
+    calls = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+
+    assert (pool.running, pool.waiting) == (2, 3)
+    release.set()
+    assert await asyncio.gather(*calls) == [True] * 5
+    metrics = pool.metrics()
+    assert (metrics["running"], metrics["waiting"]) == (0, 0)
+    assert (metrics["calls"], metrics["peak_waiting"]) == (5, 3)
+
+
+@pytest.mark.asyncio
+async def test_event_loop_keeps_running_during_a_call():
+    pool = HashingPool(workers=1)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await pool.run(time.sleep, 0.2)
+    ticker.cancel()
+    assert ticks >= 5
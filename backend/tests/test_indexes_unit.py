@@ -0,0 +1,25 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from backend.app.indexes import INDEXES, ensure_indexes, index_report
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_creates_every_declared_index(test_db):
+    assert await ensure_indexes(test_db) == {}
+    report = await index_report(test_db)
+
+    assert set(report) == set(INDEXES)
+    assert all(not entry["missing"] for entry in report.values())
+    with pytest.raises(DuplicateKeyError):
+        for user_id in ("u1", "u2"):
+            await test_db.users.insert_one({"_id": user_id, "email": "a@example.com"})
+
+
+@pytest.mark.asyncio
+async def test_index_report_lists_missing_and_undeclared_indexes(test_db):
+    await test_db.decks.create_index("words")
+    report = await index_report(test_db)
+
+    assert "email_1" in report["users"]["missing"]
+    assert report["decks"]["undeclared"] == ["words_1"]
@@ -1,4 +1,12 @@
+from datetime import datetime
+
 import pytest
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import backend.app.routers.game as game_router
+from backend.app.main import app
+from backend.app.shuffles import permutation
 
 
 @pytest.mark.asyncio
@@ -98,6 +106,73 @@ async def test_edit_deck_and_fetch_details(client):
     assert get_res.status_code == 200
     assert get_res.json()["words"] == ["red", "green"]
 
+    profile = await client.get("/api/profile/me", headers=headers)
+    assert profile.json()["decks"][0]["words_count"] == 2
+    await client.patch(
+        f"/api/profile/deck/{deck_id}/edit",
+        json={"words": ["red", "green", "white"]},
+        headers=headers,
+    )
+    profile = await client.get("/api/profile/me", headers=headers)
+    assert profile.json()["decks"][0]["words_count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_delete_game_drops_live_state(client, test_db):
+    res = await client.post("/api/game/create", json={"deck": ["alpha"]})
+    game_id = res.json()["id"]
+    engine = game_router.engine
+    await engine.load(game_id)
+    engine.join(game_id, "p1", "team_1")
+
+    res = await client.delete(f"/api/game/delete/{game_id}")
+    assert res.status_code == 200
+    await engine.flush()
+
+    assert game_id not in engine.games
+    assert await test_db.games.find_one({"_id": game_id}) is None
+    assert (await client.get(f"/api/game/leaderboard/{game_id}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_only_sync_and_known_actions_publish_state(client, monkeypatch):
+    res = await client.post("/api/game/create", json={"deck": ["alpha"]})
+    game_id = res.json()["id"]
+    await game_router.engine.load(game_id)
+    published: list[str] = []
+
+    async def publish_state(game_id):
+        published.append(game_id)
+
+    monkeypatch.setattr(game_router, "publish_state", publish_state)
+    await game_router.apply_action(game_id, {"action": "sync"})
+    await game_router.apply_action(game_id, {"action": "dance"})
+    await game_router.apply_action(game_id, {})
+    assert published == [game_id]
+
+
+@pytest.mark.asyncio
+async def test_release_gives_up_game_that_cannot_be_saved(client, monkeypatch):
+    res = await client.post("/api/game/create", json={"deck": ["alpha"]})
+    game_id = res.json()["id"]
+    engine = game_router.engine
+    await engine.load(game_id)
+    engine.join(game_id, "p1", "team_1")
+    released: list[str] = []
+
+    async def failed_flush(game_id=None):
+        pass
+
+    async def release(game_id):
+        released.append(game_id)
+
+    monkeypatch.setattr(engine, "flush", failed_flush)
+    monkeypatch.setattr(game_router.bus, "release", release)
+    await game_router.release_game(game_id)
+
+    assert game_id not in engine.games
+    assert released == [game_id]
+
 
 @pytest.mark.asyncio
 async def test_create_game_and_get_deck(client):
@@ -119,6 +194,25 @@ async def test_create_game_and_get_deck(client):
     assert set(deck_res.json()["words"]) == {"alpha", "beta"}
 
 
+@pytest.mark.asyncio
+async def test_games_refer_to_one_stored_deck(client, test_db):
+    payload = {"number_of_teams": 3, "deck": ["a", "b", "c", "d"], "words_amount": 3}
+    first = (await client.post("/api/game/create", json=payload)).json()["id"]
+    second = (await client.post("/api/game/create", json=payload)).json()["id"]
+
+    assert await test_db.word_lists.count_documents({}) == 1
+    for game_id in (first, second):
+        game = await test_db.games.find_one({"_id": game_id})
+        assert "deck" not in game
+        assert game["words_amount"] == 3
+        for team in game["teams"].values():
+            assert "words" not in team
+            assert team["words_amount"] == 3
+        words = (await client.get(f"/api/game/deck/{game_id}")).json()["words"]
+        order = permutation(game["seed"], 4)[:3]
+        assert words == [payload["deck"][i] for i in order]
+
+
 @pytest.mark.asyncio
 async def test_delete_deck_removes_from_profile(client, test_db):
     user = {
@@ -203,6 +297,98 @@ async def test_edit_deck_forbidden_for_non_owner(client, test_db):
     assert res.status_code == 403
 
 
+@pytest.mark.asyncio
+async def test_gallery_pages_are_cached_until_decks_change(client, test_db):
+    await client.post(
+        "/api/auth/register",
+        json={
+            "name": "Gil",
+            "surname": "Lee",
+            "email": "gil@example.com",
+            "password": "GilPassword1!",
+        },
+    )
+    login = await client.post(
+        "/api/auth/login",
+        data={"username": "gil@example.com", "password": "GilPassword1!"},
+    )
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    await client.post(
+        "/api/profile/deck/save",
+        json={"deck_name": "First", "words": ["one"]},
+        headers=headers,
+    )
+
+    first = await client.get("/api/gallery/decks?page=1")
+    assert first.status_code == 200
+    assert [deck["name"] for deck in first.json()["gallery"]] == ["First"]
+    etag = first.headers["etag"]
+    cached = await client.get(
+        "/api/gallery/decks?page=1", headers={"If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+
+    await client.post(
+        "/api/profile/deck/save",
+        json={"deck_name": "Second", "words": ["two"]},
+        headers=headers,
+    )
+    changed = await client.get(
+        "/api/gallery/decks?page=1", headers={"If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert changed.json()["total_decks"] == 2
+    assert changed.headers["etag"] != etag
+
+
+async def _login(client, name: str) -> dict:
+    email = f"{name.lower()}@example.com"
+    password = f"{name}Password1!"
+    await client.post(
+        "/api/auth/register",
+        json={"name": name, "surname": "Test", "email": email, "password": password},
+    )
+    login = await client.post(
+        "/api/auth/login", data={"username": email, "password": password}
+    )
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_gallery_copies_share_words_until_edited(client, test_db):
+    author = await _login(client, "Author")
+    saver = await _login(client, "Saver")
+    res = await client.post(
+        "/api/profile/deck/save",
+        json={"deck_name": "Fruit", "words": ["apple", "pear"]},
+        headers=author,
+    )
+    source_id = res.json()["inserted_id"]
+
+    res = await client.put(f"/api/gallery/decks/{source_id}", headers=saver)
+    copy_id = res.json()["saved_deck_id"]
+    copy = await test_db.decks.find_one({"_id": copy_id})
+    source = await test_db.decks.find_one({"_id": source_id})
+    assert "words" not in copy and "words" not in source
+    assert copy["words_ref"] == source["words_ref"]
+    assert await test_db.word_lists.count_documents({}) == 1
+
+    gallery = (await client.get("/api/gallery/decks")).json()["gallery"]
+    assert [deck["words"] for deck in gallery] == [["apple", "pear"]] * 2
+    detail = await client.get(f"/api/profile/deck/{copy_id}", headers=saver)
+    assert detail.json()["words"] == ["apple", "pear"]
+
+    await client.patch(
+        f"/api/profile/deck/{copy_id}/edit",
+        json={"words": ["plum"]},
+        headers=saver,
+    )
+    detail = await client.get(f"/api/profile/deck/{copy_id}", headers=saver)
+    assert detail.json()["words"] == ["plum"]
+    detail = await client.get(f"/api/profile/deck/{source_id}", headers=author)
+    assert detail.json()["words"] == ["apple", "pear"]
+
+
 @pytest.mark.asyncio
 async def test_get_game_leaderboard(client, test_db):
     await test_db.games.insert_one(
@@ -221,3 +407,129 @@ async def test_get_game_leaderboard(client, test_db):
     assert list(data.keys()) == ["Team 2", "Team 1"]
     assert data["Team 2"]["total_score"] == 4
     assert data["Team 1"]["players"] == {"alice": 2, "bob": 1}
+
+
+@pytest.mark.asyncio
+async def test_expired_game_results_come_from_history(client, test_db):
+    for finished_at, score in ((datetime(2025, 1, 1), 1), (datetime(2025, 2, 1), 3)):
+        await test_db.game_history.insert_one(
+            {
+                "kind": "game",
+                "code": "OLD123",
+                "finished_at": finished_at,
+                "deck": ["alpha", "beta"],
+                "teams": {"team_1": {"name": "Team 1", "scores": {"alice": score}}},
+            }
+        )
+
+    res = await client.get("/api/game/leaderboard/OLD123")
+    assert res.status_code == 200
+    assert res.json()["Team 1"]["total_score"] == 3
+    res = await client.get("/api/game/deck/OLD123")
+    assert res.json() == {"words": ["alpha", "beta"]}
+
+
+def _merge(target: dict, changes: dict) -> dict:
+    merged = dict(target)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _receive_state(ws, state: dict | None = None) -> dict:
+    message = ws.receive_json()
+    if message["type"] == "snapshot":
+        return {**message["state"], **message.get("self", {})}
+    assert state is not None
+    state = _merge(state, message["changes"])
+    for path in message.get("removed", []):
+        parent = state
+        for key in path[:-1]:
+            parent = parent[key]
+        parent.pop(path[-1], None)
+    return {**state, **message.get("self", {})}
+
+
+@pytest.mark.asyncio
+async def test_host_receives_finished_state_after_stopping(client, test_db):
+    res = await client.post("/api/game/create", json={"deck": ["alpha"]})
+    game_id = res.json()["id"]
+    ws_client = TestClient(app)
+
+    with ws_client.websocket_connect(f"/api/game/{game_id}") as host:
+        state = _receive_state(host)
+        host.send_json({"action": "stop_game"})
+        while state["game_state"] != "finished":
+            state = _receive_state(host, state)
+
+    stored = await test_db.games.find_one({"_id": game_id})
+    assert stored["game_state"] == "finished"
+
+
+@pytest.mark.asyncio
+async def test_websocket_game_round(client, test_db):
+    res = await client.post(
+        "/api/game/create",
+        json={"deck": ["alpha"], "number_of_teams": 1, "time_for_guessing": 30},
+    )
+    game_id = res.json()["id"]
+    ws_client = TestClient(app)
+
+    with (
+        ws_client.websocket_connect(f"/api/game/{game_id}") as host,
+        ws_client.websocket_connect(
+            f"/api/game/player/{game_id}?name=master&team_id=team_1"
+        ),
+        ws_client.websocket_connect(
+            f"/api/game/player/{game_id}?name=guesser&team_id=team_1"
+        ) as guesser,
+    ):
+        host.send_json({"action": "start_game"})
+        state = _receive_state(guesser)
+        while state["game_state"] != "in_progress":
+            state = _receive_state(guesser, state)
+        assert state["current_master"] == "master"
+
+        guesser.send_json({"action": "guess", "guess": "Alpha"})
+        while state["game_state"] != "finished":
+            state = _receive_state(guesser, state)
+        assert state["team_scores"]["guesser"] == 1
+        assert state["winning_team"] == "team_1"
+
+        stored = await test_db.games.find_one({"_id": game_id})
+        assert stored["game_state"] == "finished"
+        assert stored["teams"]["team_1"]["scores"]["guesser"] == 1
+        assert stored["finished_at"] >= stored["created_at"]
+
+        record = await test_db.game_history.find_one({"code": game_id})
+        assert record["teams"]["team_1"]["scores"]["guesser"] == 1
+        assert record["deck_ref"] == stored["deck_ref"]
+        assert record["seed"] == stored["seed"]
+        assert "seed" not in record["teams"]["team_1"]
+
+        res = await client.get(f"/api/game/events/{game_id}")
+        events = res.json()["events"]
+        assert [event["kind"] for event in events] == [
+            "joined",
+            "joined",
+            "started",
+            "word_advanced",
+            "guess",
+            "word_advanced",
+            "finished",
+        ]
+        assert [event["offset"] for event in events] == list(range(7))
+        assert events[4] == {**events[4], "player": "guesser", "correct": True}
+        assert "alpha" not in str(events)
+        assert res.json()["next_offset"] == 7
+
+        with ws_client.websocket_connect(
+            f"/api/game/events/{game_id}?offset=5"
+        ) as stream:
+            assert stream.receive_json()["offset"] == 5
+            assert stream.receive_json()["kind"] == "finished"
+            with pytest.raises(WebSocketDisconnect):
+                stream.receive_json()
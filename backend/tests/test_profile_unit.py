@@ -0,0 +1,66 @@
+import pytest
+
+from backend.app.models import CurrentUser, ProfileResponse
+from backend.app.services.profile_cache import ProfileCache, profile_cache
+from backend.app.services.profile_service import (
+    backfill_deck_summaries,
+    get_profile_service,
+)
+
+CURRENT_USER = CurrentUser(id="u1", email="u1@example.com", isAdmin=False)
+
+
+@pytest.mark.asyncio
+async def test_backfill_adds_words_count(test_db):
+    await test_db.decks.insert_one({"_id": "d1", "name": "Old", "words": ["a", "b"]})
+    await test_db.decks.insert_one({"_id": "d2", "name": "Empty"})
+    await backfill_deck_summaries()
+
+    assert (await test_db.decks.find_one({"_id": "d1"}))["words_count"] == 2
+    assert (await test_db.decks.find_one({"_id": "d2"}))["words_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_profile_listing_is_cached_until_invalidated(test_db):
+    await test_db.users.insert_one(
+        {
+            "_id": "u1",
+            "name": "U",
+            "surname": "One",
+            "email": "u1@example.com",
+            "deck_ids": ["d1"],
+        }
+    )
+    await test_db.decks.insert_one(
+        {"_id": "d1", "name": "Deck", "words": ["a"], "words_count": 1}
+    )
+
+    profile = await get_profile_service(CURRENT_USER)
+    assert [deck.words_count for deck in profile.decks] == [1]
+
+    await test_db.decks.update_one({"_id": "d1"}, {"$set": {"name": "Renamed"}})
+    assert await get_profile_service(CURRENT_USER) is profile
+
+    profile_cache.invalidate("u1")
+    profile = await get_profile_service(CURRENT_USER)
+    assert profile.decks[0].name == "Renamed"
+
+
+def test_profile_cache_invalidates_every_listing_of_a_user():
+    cache = ProfileCache(size=2, ttl=60)
+    profile = ProfileResponse(
+        id="u1", name="U", surname="One", email="u1@example.com", isAdmin=False
+    )
+    cache.put("u1", (None, 0, 10), profile, cache.version)
+    cache.put("u1", ("a", 0, 10), profile, cache.version)
+    stale_version = cache.version
+    cache.invalidate("u2")
+    # Read before the invalidation, so it may be out of date
+    cache.put("u1", ("b", 0, 10), profile, stale_version)
+
+    assert cache.get("u1", (None, 0, 10)) is profile
+    assert cache.get("u1", ("b", 0, 10)) is None
+
+    cache.invalidate("u1")
+    assert cache.get("u1", (None, 0, 10)) is None
+    assert cache.get("u1", ("a", 0, 10)) is None
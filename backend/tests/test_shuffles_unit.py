@@ -0,0 +1,22 @@
+import pytest
+
+from backend.app.shuffles import new_seed, permutation, permuted
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 16, 17, 1000])
+def test_permutation_covers_every_position_once(size):
+    for seed in (0, 1, new_seed()):
+        assert sorted(permutation(seed, size)) == list(range(size))
+
+
+def test_order_only_depends_on_seed():
+    # Games in progress rely on every worker drawing the same words, so the
+    # order of a seed must never change.
+    assert permutation(42, 10) == [2, 4, 3, 5, 1, 8, 9, 6, 0, 7]
+    assert permutation(42, 10) != permutation(43, 10)
+    assert [permuted(42, 10, i) for i in range(10)] == permutation(42, 10)
+
+
+def test_permuted_rejects_out_of_range_index():
+    with pytest.raises(IndexError):
+        permuted(1, 3, 3)
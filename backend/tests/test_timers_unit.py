@@ -0,0 +1,115 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+import backend.app.routers.game as game_router
+from backend.app.services.timers import TimerScheduler
+
+# Seed whose order draws the words of a deck of up to three in deck order
+IN_ORDER = 1
+
+
+def _in(seconds: float) -> datetime:
+    return datetime.now(UTC) + timedelta(seconds=seconds)
+
+
+@pytest.mark.asyncio
+async def test_fires_at_deadline_and_once():
+    scheduler = TimerScheduler()
+    fired: list[str] = []
+
+    async def callback():
+        fired.append("a")
+
+    scheduler.schedule("a", _in(0.05), callback)
+    await asyncio.sleep(0.01)
+    assert fired == []
+    await asyncio.sleep(0.1)
+    assert fired == ["a"]
+    assert "a" not in scheduler
+
+
+@pytest.mark.asyncio
+async def test_reschedule_replaces_and_cancel_drops():
+    scheduler = TimerScheduler()
+    fired: list[str] = []
+
+    async def first():
+        fired.append("first")
+
+    async def second():
+        fired.append("second")
+
+    scheduler.schedule("a", _in(0.02), first)
+    scheduler.schedule("a", _in(0.05), second)
+    scheduler.schedule("b", _in(0.02), first)
+    scheduler.cancel("b")
+    await asyncio.sleep(0.1)
+    assert fired == ["second"]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_naive_past_deadline_fires_immediately():
+    scheduler = TimerScheduler()
+    fired = asyncio.Event()
+
+    async def callback():
+        fired.set()
+
+    past = datetime.now(UTC).replace(tzinfo=None) - timedelta(seconds=5)
+    scheduler.schedule("a", past, callback)
+    await asyncio.wait_for(fired.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_team_timer_advances_word_without_db_reads(test_db):
+    await test_db.games.insert_one(
+        {
+            "_id": "timer_game",
+            "teams": {
+                "team_1": {
+                    "id": "team_1",
+                    "name": "Team 1",
+                    "players": ["master"],
+                    "seed": IN_ORDER,
+                    "words_amount": 2,
+                    "word_index": 0,
+                    "current_word": None,
+                    "expires_at": None,
+                    "current_master": "master",
+                    "state": "pending",
+                    "scores": {"master": 0},
+                    "right_answers_to_advance": 1,
+                }
+            },
+            "deck": ["apple", "pear"],
+            "time_for_guessing": 60,
+            "tries_per_player": 0,
+            "rotate_masters": False,
+            "game_state": "pending",
+            "winning_team": None,
+        }
+    )
+    engine = game_router.engine
+    await engine.load("timer_game")
+    engine.start_game("timer_game")
+    team = engine.games["timer_game"]["teams"]["team_1"]
+    assert team["current_word"] == "apple"
+
+    key = ("game", "timer_game", "team_1")
+    team["expires_at"] = _in(0.02)
+    await game_router.publish_state("timer_game")
+    assert key in game_router.timers
+    await asyncio.sleep(0.1)
+    assert team["current_word"] == "pear"
+    assert game_router.timers.deadline(key) == team["expires_at"]
+    # A callback fired for the previous word leaves the new one alone.
+    await game_router.expire_word("timer_game", "team_1")
+    assert team["current_word"] == "pear"
+
+    engine.stop_game("timer_game")
+    await game_router.publish_state("timer_game")
+    assert len(game_router.timers) == 0
+    await engine.stop()
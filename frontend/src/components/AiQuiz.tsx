@@ -65,7 +65,7 @@ function AiQuiz() {
   useEffect(() => {
     const stopGame = (data: config.AiGameState) => {
       if (!gameState) { return; }
-      alert(`You have guessed ${data.score} out of ${data.deck.length - data.remaining_words.length}!`);
+      alert(`You have guessed ${data.score} out of ${data.word_index}!`);
       config.navigateTo(config.Page.Home);
     };
     const ws = config.connectSocketAi(config.getArgs().code);
@@ -106,10 +106,10 @@ function AiQuiz() {
       <div className="text-xl mb-2">
         Words remaining:
         {' '}
-        {gameState.remaining_words.length}
+        {gameState.words_amount - gameState.word_index}
       </div>
       <div className="text-xl mb-2">
-        {`Score: ${gameState.score}/${gameState.deck.length - gameState.remaining_words.length - (gameState.game_state === 'pending' ? 0 : 1)}`}
+        {`Score: ${gameState.score}/${gameState.word_index - (gameState.game_state === 'pending' ? 0 : 1)}`}
       </div>
       <div className="text-xl mb-6">
         {gameState.current_word !== null ? `Time left: ${timeStr}` : 'Waiting...'}
@@ -15,10 +15,12 @@ interface Deck {
 interface GalleryResponse {
   gallery: Deck[]
   total_decks: number
+  next_cursor: string | null
 }
 
-async function fetchGallery(page: number = 1): Promise<GalleryResponse> {
-  const response = await fetch(`${config.HTTP_URL}/gallery/decks?page=${page}`, {
+async function fetchGallery(cursor: string | null = null): Promise<GalleryResponse> {
+  const query = cursor ? `cursor=${encodeURIComponent(cursor)}` : 'page=1';
+  const response = await fetch(`${config.HTTP_URL}/gallery/decks?${query}`, {
     method: 'GET',
     headers: { 'Content-Type': 'application/json' },
   });
@@ -34,6 +36,7 @@ function Home() {
   const [searchTerm, setSearchTerm] = useState<string>('');
   const [page, setPage] = useState<number>(1);
   const [hasMore, setHasMore] = useState<boolean>(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [showGallery, setShowGallery] = useState<boolean>(false);
   const [selectedDeck, setSelectedDeck] = useState<Deck | null>(null);
@@ -73,9 +76,10 @@ function Home() {
   const loadGallery = useCallback(async (pageToLoad: number = 1, append = false): Promise<void> => {
     try {
       setLoadingMore(true);
-      const data = await fetchGallery(pageToLoad);
+      const data = await fetchGallery(pageToLoad > 1 ? nextCursor : null);
       const decks = data.gallery as Deck[];
-      setHasMore((decks.length > 0) && ((apiGallery.length + decks.length) < data.total_decks));
+      setNextCursor(data.next_cursor);
+      setHasMore(data.next_cursor !== null);
       setApiGallery((prev) => (append ? [...prev, ...decks] : decks));
     } catch (error) {
       setHasMore(false);
@@ -83,7 +87,7 @@ function Home() {
     } finally {
       setLoadingMore(false);
     }
-  }, [searchTerm, apiGallery.length]);
+  }, [searchTerm, nextCursor]);
 
   // Инфинити скрол
   useEffect(() => {
@@ -9,9 +9,11 @@ function Host() {
     const initialState = config.getInitialHostState();
     if (!initialState) { return; }
     setTeams(initialState.teams);
-    ws.current = config.connectSocketHost(config.getArgs().name, config.getArgs().code);
-    ws.current.onmessage = async (event) => {
-      const data: config.HostGameState = await JSON.parse(event.data);
+    const socket = config.connectSocketHost(config.getArgs().name, config.getArgs().code);
+    ws.current = socket;
+    socket.onmessage = (event) => {
+      const data = config.readGameMessage<config.HostGameState>(socket, event);
+      if (!data) return;
       setTeams(data.teams);
 
       if (data.game_state === 'finished') {
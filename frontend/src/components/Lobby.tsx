@@ -30,7 +30,8 @@ function Lobby() {
     ws.onopen = () => {};
     ws.onmessage = (message) => {
       if (isHost) {
-        const data: config.HostGameState = JSON.parse(message.data);
+        const data = config.readGameMessage<config.HostGameState>(ws, message);
+        if (!data) return;
         const sup: Player[] = [];
         const teamIds: string[] = Object.keys(data.teams);
         for (let i = 0; i < teamIds.length; i += 1) {
@@ -51,7 +52,8 @@ function Lobby() {
           config.navigateTo(config.Page.Host, args.current);
         }
       } else {
-        const data: config.PlayerGameState = JSON.parse(message.data);
+        const data = config.readGameMessage<config.PlayerGameState>(ws, message);
+        if (!data) return;
         setPlayers(Object.keys(data.team_scores).map((playerName) => ({ name: playerName, team: '' })));
         setTeams(Object.keys(data.all_teams_scores));
         if (data.game_state === 'in_progress') {
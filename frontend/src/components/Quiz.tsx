@@ -95,7 +95,8 @@ function Quiz() {
 
     // Stuff kinda self-explanatory
     websocket.onmessage = (event) => {
-      const data: config.PlayerGameState = JSON.parse(event.data);
+      const data = config.readGameMessage<config.PlayerGameState>(websocket, event);
+      if (!data) return;
       setGameState(data);
 
       if (data.expires_at && data.expires_at !== expiresAt.current) {
@@ -56,15 +56,27 @@ export interface HostGameState {
   winning_team: string;
 }
 
+// Game sockets send a full snapshot first and then patches with changed fields only
+type StateObject = { [key: string]: unknown };
+
+export interface GameStateMessage {
+  type: 'snapshot' | 'patch';
+  version: number;
+  state?: StateObject;
+  changes?: StateObject;
+  removed?: string[][];
+  self?: StateObject; // Fields only this player gets, such as tries_left
+}
+
 export interface AiGameState {
   _id: string;
-  deck: string[];
+  words_amount: number;
   game_state: 'pending' | 'in_progress' | 'finished';
   settings: {
     time_for_guessing: number,
     word_amount: number,
   };
-  remaining_words: string[];
+  word_index: number;
   current_word: string | null;
   clues: string[];
   score: number;
@@ -130,6 +142,9 @@ let initialHostGameState: HostGameState | null = null;
 let initialPlayerGameState: PlayerGameState | null = null;
 let initialAiGameState: AiGameState | null = null;
 
+// Last state assembled from snapshots and patches, per socket
+const socketStates = new WeakMap<WebSocket, { version: number, state: StateObject }>();
+
 // Supplementary variables to help with page management
 let rotation = false;
 let deckChoice = false;
@@ -189,6 +204,55 @@ export function closeConnection() {
   initialPlayerGameState = null;
 }
 
+// Game state patches
+function isStateObject(value: unknown): value is StateObject {
+  return typeof value === 'object' && value !== null && !Array.isArray(value);
+}
+
+function mergeChanges(target: StateObject, changes: StateObject): StateObject {
+  const merged: StateObject = { ...target };
+  Object.keys(changes).forEach((key) => {
+    const value = changes[key];
+    const current = merged[key];
+    merged[key] = isStateObject(value) && isStateObject(current)
+      ? mergeChanges(current, value)
+      : value;
+  });
+  return merged;
+}
+
+function removePath(target: StateObject, path: string[]): StateObject {
+  const [key, ...rest] = path;
+  if (!(key in target)) return target;
+  const copy: StateObject = { ...target };
+  if (rest.length === 0) {
+    delete copy[key];
+  } else if (isStateObject(copy[key])) {
+    copy[key] = removePath(copy[key] as StateObject, rest);
+  }
+  return copy;
+}
+
+// Applies a game socket message and returns the full state,
+// or null (after asking the server for a snapshot) if the patch has no base
+export function readGameMessage<T>(socket: WebSocket, event: MessageEvent): T | null {
+  const message: GameStateMessage = JSON.parse(event.data);
+  const known = socketStates.get(socket);
+  let state: StateObject;
+  if (message.type === 'snapshot' && message.state) {
+    state = { ...message.state, ...message.self };
+  } else if (known && message.version > known.version) {
+    state = mergeChanges(known.state, message.changes ?? {});
+    (message.removed ?? []).forEach((path) => { state = removePath(state, path); });
+    state = { ...state, ...message.self };
+  } else {
+    if (!known) socket.send(JSON.stringify({ action: 'resync' }));
+    return null;
+  }
+  socketStates.set(socket, { version: message.version, state });
+  return state as unknown as T;
+}
+
 // Page navigation
 let setCurrentPage: ((page: Page) => void) | null = null;
 